@@ -1,6 +1,9 @@
+import random
 import time
 from abc import ABC, abstractmethod
 import logging
+from .circuit_breaker import CircuitBreaker, OPEN, CLOSED, HALF_OPEN
+from src.metrics.registry import MetricsRegistry
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -20,27 +23,271 @@ class BaseLoadBalancer(ABC):
         self.servers = servers
         self.healthy_servers = set(servers)
         self.logger = logging.getLogger(self.__class__.__name__)
+        # Monotonic time source, replaced by a virtual clock in simulations
+        self.clock = time.monotonic
 
         # Metrics tracking
         self.request_count = 0
         self.error_count = 0
         self.total_response_time = 0
         self.start_time = time.time()
+        self.backend_metrics = MetricsRegistry()
+
+        # Passive health tracking
+        self.breaker_options = {}
+        self.breakers = {server: CircuitBreaker() for server in servers}
+        # Servers ejected by their breaker, mapped to when they may be probed again
+        self.open_breakers = {}
+        self.next_breaker_retry = float("inf")
+        # Servers taking no new requests while their in-flight requests finish
+        self.draining = set()
+
+        # Slow start: servers back in rotation ramp up their share of traffic
+        self.slow_start_duration = 0
+        self.slow_start_min_factor = 0.1
+        self.slow_start_aggression = 1.0
+        # Warming servers mapped to when their ramp started
+        self.warming = {}
 
         self.logger.info(f"Initialized with servers: {servers}")
 
+    def configure_circuit_breakers(self, **options):
+        """
+        Replace every server's circuit breaker with one using the given options.
+
+        Args:
+            **options: Keyword arguments for CircuitBreaker.
+        """
+        self.breaker_options = options
+        self.breakers = {server: CircuitBreaker(**options) for server in self.servers}
+        self.open_breakers = {}
+        self.next_breaker_retry = float("inf")
+
+    def configure_slow_start(self, duration, min_factor=0.1, aggression=1.0):
+        """
+        Ramp up traffic to servers that recover or join, instead of sending them a full share at once.
+
+        Args:
+            duration (float): Seconds over which a server ramps up, or 0 to disable.
+            min_factor (float): Share of its normal traffic a server gets at the start.
+            aggression (float): Shape of the ramp. 1 is linear, higher values ramp faster early on.
+        """
+        self.slow_start_duration = duration
+        self.slow_start_min_factor = min_factor
+        self.slow_start_aggression = aggression
+        if not duration:
+            self.warming = {}
+
+    def start_slow_start(self, server):
+        """Start a server's ramp, if slow start is enabled."""
+        if self.slow_start_duration > 0:
+            self.warming[server] = self.clock()
+            self.logger.info(
+                f"Slow start for {server} over {self.slow_start_duration}s"
+            )
+
+    def slow_start_factor(self, server):
+        """
+        Get the share of its normal traffic a server should currently get.
+
+        Returns:
+            float: A factor between min_factor and 1, or 1 if the server is not warming up.
+        """
+        start = self.warming.get(server)
+        if start is None:
+            return 1.0
+        elapsed = self.clock() - start
+        if elapsed >= self.slow_start_duration:
+            self.warming.pop(server, None)
+            return 1.0
+        ramp = (max(elapsed, 0) / self.slow_start_duration) ** (
+            1 / self.slow_start_aggression
+        )
+        return max(ramp, self.slow_start_min_factor)
+
+    def admit(self, server):
+        """Admit a pick of a server with its slow start factor as the probability."""
+        factor = self.slow_start_factor(server)
+        return factor >= 1.0 or random.random() < factor
+
+    def add_to_rotation(self, server):
+        """
+        Make a server selectable by the algorithm.
+
+        Returns:
+            bool: True if the server was not selectable before.
+        """
+        if server in self.healthy_servers or server in self.draining:
+            return False
+        self.healthy_servers.add(server)
+        return True
+
+    def remove_from_rotation(self, server):
+        """
+        Stop the algorithm from selecting a server.
+
+        Returns:
+            bool: True if the server was selectable before.
+        """
+        if server not in self.healthy_servers:
+            return False
+        self.healthy_servers.discard(server)
+        return True
+
     def mark_healthy(self, server):
         """Mark a server as healthy."""
-        if server not in self.healthy_servers:
-            self.healthy_servers.add(server)
+        breaker = self.breakers.get(server)
+        if breaker is not None:
+            if breaker.state != CLOSED and not breaker.forced:
+                # Opened by live traffic, it recovers through its own half-open probes
+                return
+            breaker.reset()
+        self.open_breakers.pop(server, None)
+        if self.add_to_rotation(server):
+            self.start_slow_start(server)
             self.logger.info(f"Marked server {server} as healthy")
 
     def mark_unhealthy(self, server):
         """Mark a server as unhealthy."""
-        if server in self.healthy_servers:
-            self.healthy_servers.discard(server)
+        breaker = self.breakers.get(server)
+        if breaker is not None:
+            breaker.force_open()
+        self.open_breakers.pop(server, None)
+        self.warming.pop(server, None)
+        if self.remove_from_rotation(server):
             self.logger.info(f"Marked server {server} as unhealthy")
 
+    def add_server(self, server):
+        """
+        Add a server at runtime, or bring a draining server back into rotation.
+
+        Args:
+            server (str): URL of the server.
+
+        Returns:
+            bool: True if the server was not known before.
+        """
+        self.draining.discard(server)
+        added = server not in self.breakers
+        if added:
+            self.servers.append(server)
+            self.breakers[server] = CircuitBreaker(**self.breaker_options)
+            self.logger.info(f"Added server {server}")
+        if self.add_to_rotation(server) and added:
+            self.start_slow_start(server)
+        return added
+
+    def drain_server(self, server):
+        """Stop sending new requests to a server, letting in-flight ones finish."""
+        self.draining.add(server)
+        self.open_breakers.pop(server, None)
+        if self.remove_from_rotation(server):
+            self.logger.info(f"Draining server {server}")
+
+    def remove_server(self, server):
+        """
+        Forget a server entirely.
+
+        Subclasses drop their per-server state here. Call drain_server first
+        and wait for in-flight requests to finish.
+
+        Args:
+            server (str): URL of the server.
+        """
+        self.drain_server(server)
+        self.draining.discard(server)
+        if server in self.servers:
+            self.servers.remove(server)
+        self.breakers.pop(server, None)
+        self.warming.pop(server, None)
+        self.logger.info(f"Removed server {server}")
+
+    def refresh_breakers(self):
+        """Move servers whose breaker open period has elapsed to half-open."""
+        if not self.open_breakers:
+            return
+        now = self.clock()
+        if now < self.next_breaker_retry:
+            return
+        for server, retry_at in list(self.open_breakers.items()):
+            if retry_at <= now:
+                del self.open_breakers[server]
+                self.breakers[server].half_open()
+                self.add_to_rotation(server)
+                self.logger.info(f"Circuit half-open for {server}, admitting probes")
+        self.next_breaker_retry = min(self.open_breakers.values(), default=float("inf"))
+
+    def allow_request(self, server):
+        """
+        Ask the server's circuit breaker to admit a request.
+
+        A half-open server leaves rotation once all its probe slots are in use.
+
+        Args:
+            server (str): The server selected by the algorithm.
+
+        Returns:
+            bool: True if the request may be sent to the server.
+        """
+        breaker = self.breakers.get(server)
+        if breaker is None:
+            return True
+        allowed = breaker.allow_request()
+        if breaker.saturated:
+            self.remove_from_rotation(server)
+        return allowed
+
+    def cancel_request(self, server):
+        """
+        Forget an admitted request that was cancelled before it completed.
+
+        Nothing is recorded, but a half-open probe slot it held is freed.
+
+        Args:
+            server (str): The server the request was sent to.
+        """
+        breaker = self.breakers.get(server)
+        if breaker is None or breaker.state != HALF_OPEN:
+            return
+        breaker.cancel()
+        if not breaker.saturated:
+            self.add_to_rotation(server)
+
+    def _on_breaker_state(self, server, previous, state):
+        breaker = self.breakers[server]
+        if state == OPEN and not breaker.forced:
+            self.remove_from_rotation(server)
+            self.open_breakers[server] = breaker.retry_at
+            self.next_breaker_retry = min(self.next_breaker_retry, breaker.retry_at)
+            if previous != OPEN:
+                self.logger.warning(f"Circuit opened for {server}, ejecting it")
+        elif state == CLOSED and previous != CLOSED:
+            self.add_to_rotation(server)
+            self.start_slow_start(server)
+            self.logger.info(f"Circuit closed for {server}")
+        elif not breaker.saturated and state != OPEN:
+            # A half-open probe finished, so a slot is free again
+            self.add_to_rotation(server)
+
+    def local_load(self, server):
+        """
+        Get this process's load on a server, for sharing with other workers.
+
+        Returns:
+            tuple: (connections, latency_sum, latency_count).
+        """
+        return 0, 0.0, 0
+
+    def apply_cluster_load(self, loads):
+        """
+        Use the load reported by all workers of a multi-process proxy.
+
+        Args:
+            loads (dict): Server to (connections, latency_sum, latency_count),
+                summed over every worker including this one.
+        """
+        pass
+
     @abstractmethod
     def assign_server(self, request=None):
         """
@@ -54,7 +301,7 @@ class BaseLoadBalancer(ABC):
         """
         pass
 
-    def record_request_metrics(self, server, response_time, error=False):
+    def record_request_metrics(self, server, response_time, error=False, status=None):
         """
         Record metrics for a request.
 
@@ -62,11 +309,20 @@ class BaseLoadBalancer(ABC):
             server (str): The server that handled the request.
             response_time (float): The time taken to process the request.
             error (bool): Whether the request resulted in an error.
+            status (int): Upstream status code, or None if there was no response.
         """
         self.request_count += 1
         self.total_response_time += response_time
         if error:
             self.error_count += 1
+        self.backend_metrics.record_request(server, response_time, status, error)
+
+        breaker = self.breakers.get(server)
+        if breaker is not None:
+            previous = breaker.state
+            state = breaker.record(response_time, error, now=self.clock())
+            if state != previous or state != CLOSED:
+                self._on_breaker_state(server, previous, state)
 
     def get_metrics(self):
         """
@@ -91,4 +347,29 @@ class BaseLoadBalancer(ABC):
             "requests_per_second": self.request_count / uptime if uptime > 0 else 0,
             "healthy_servers": len(self.healthy_servers),
             "total_servers": len(self.servers),
+            "backends": self.backend_metrics.summary(),
+            "circuit_breakers": {
+                server: breaker.get_metrics()
+                for server, breaker in self.breakers.items()
+            },
+            "slow_start": self.slow_start_metrics(),
         }
+
+    def slow_start_metrics(self):
+        """
+        Get the ramp of every warming server.
+
+        Returns:
+            dict: Per-server factor, seconds since the ramp started and ramp duration.
+        """
+        now = self.clock()
+        metrics = {}
+        for server, start in list(self.warming.items()):
+            factor = self.slow_start_factor(server)
+            if server in self.warming:
+                metrics[server] = {
+                    "factor": factor,
+                    "elapsed": now - start,
+                    "duration": self.slow_start_duration,
+                }
+        return metrics
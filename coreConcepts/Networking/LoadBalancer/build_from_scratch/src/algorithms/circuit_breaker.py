@@ -0,0 +1,231 @@
+# Circuit breaker for passive health tracking.
+# Every completed request is recorded in a fixed-size rolling window of outcomes and latencies.
+# The breaker moves through three states:
+# CLOSED: traffic flows normally. Trips to OPEN when the error rate or the share of slow requests
+#         in the window crosses its threshold, or after too many consecutive failures.
+# OPEN: the backend is ejected from rotation. After open_duration it moves to HALF_OPEN.
+#       Repeated trips double the open duration up to max_open_duration.
+# HALF_OPEN: only a few probe requests are admitted. If they all succeed the breaker closes,
+#            a single failure opens it again.
+
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Per-backend circuit breaker driven by live traffic."""
+
+    def __init__(
+        self,
+        window_size=100,
+        min_requests=20,
+        error_threshold=0.5,
+        consecutive_failures=5,
+        slow_threshold=None,
+        slow_ratio=0.5,
+        open_duration=1.0,
+        max_open_duration=30.0,
+        half_open_requests=3,
+    ):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            window_size (int): Number of recent requests in the rolling window.
+            min_requests (int): Requests needed in the window before rates are evaluated.
+            error_threshold (float): Error rate that trips the breaker.
+            consecutive_failures (int): Consecutive failures that trip the breaker.
+            slow_threshold (float): Latency in seconds above which a request counts
+                as slow, or None to disable latency-based tripping.
+            slow_ratio (float): Share of slow requests that trips the breaker.
+            open_duration (float): Seconds to stay open after the first trip.
+            max_open_duration (float): Upper bound for the open duration.
+            half_open_requests (int): Probe requests admitted while half-open.
+        """
+        self.window_size = window_size
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.consecutive_failures = consecutive_failures
+        self.slow_threshold = slow_threshold
+        self.slow_ratio = slow_ratio
+        self.open_duration = open_duration
+        self.max_open_duration = max_open_duration
+        self.half_open_requests = half_open_requests
+
+        # Rolling window, stored as preallocated ring buffers with running totals
+        self.errors = [0] * window_size
+        self.slow = [0] * window_size
+        self.latencies = [0.0] * window_size
+        self.index = 0
+        self.filled = 0
+        self.error_total = 0
+        self.slow_total = 0
+        self.latency_total = 0.0
+
+        self.state = CLOSED
+        self.failures = 0  # consecutive failures
+        self.trips = 0  # consecutive trips without closing, for open backoff
+        self.forced = False  # opened by mark_unhealthy, stays open until reset
+        self.retry_at = 0
+        self.half_open_inflight = 0
+        self.half_open_successes = 0
+
+    def _clear_window(self):
+        for i in range(self.window_size):
+            self.errors[i] = 0
+            self.slow[i] = 0
+            self.latencies[i] = 0.0
+        self.index = 0
+        self.filled = 0
+        self.error_total = 0
+        self.slow_total = 0
+        self.latency_total = 0.0
+
+    def record(self, response_time, error=False, now=None):
+        """
+        Record the outcome of a completed request.
+
+        Args:
+            response_time (float): The time taken to process the request.
+            error (bool): Whether the request failed.
+            now (float): Current monotonic time, defaults to time.monotonic().
+
+        Returns:
+            str: The breaker state after the request is recorded.
+        """
+        now = time.monotonic() if now is None else now
+        is_slow = (
+            self.slow_threshold is not None and response_time > self.slow_threshold
+        )
+
+        # Slide the window by one slot
+        i = self.index
+        if self.filled == self.window_size:
+            self.error_total -= self.errors[i]
+            self.slow_total -= self.slow[i]
+            self.latency_total -= self.latencies[i]
+        else:
+            self.filled += 1
+        self.errors[i] = 1 if error else 0
+        self.slow[i] = 1 if is_slow else 0
+        self.latencies[i] = response_time
+        self.error_total += self.errors[i]
+        self.slow_total += self.slow[i]
+        self.latency_total += response_time
+        self.index = (i + 1) % self.window_size
+
+        self.failures = self.failures + 1 if error else 0
+
+        if self.state == HALF_OPEN:
+            self.half_open_inflight = max(self.half_open_inflight - 1, 0)
+            if error or is_slow:
+                self.trip(now)
+            else:
+                self.half_open_successes += 1
+                if self.half_open_successes >= self.half_open_requests:
+                    self.close()
+        elif self.state == CLOSED and self.should_trip():
+            self.trip(now)
+
+        return self.state
+
+    def should_trip(self):
+        """Check whether the current window crosses a tripping threshold."""
+        if self.failures >= self.consecutive_failures:
+            return True
+        if self.filled < self.min_requests:
+            return False
+        if self.error_total / self.filled >= self.error_threshold:
+            return True
+        return (
+            self.slow_threshold is not None
+            and self.slow_total / self.filled >= self.slow_ratio
+        )
+
+    def trip(self, now=None):
+        """Open the breaker, backing off the open duration on repeated trips."""
+        now = time.monotonic() if now is None else now
+        duration = min(self.open_duration * (2**self.trips), self.max_open_duration)
+        self.trips = min(self.trips + 1, 16)
+        self.state = OPEN
+        self.retry_at = now + duration
+        self.half_open_inflight = 0
+        self.half_open_successes = 0
+
+    def force_open(self):
+        """Open the breaker until reset() is called."""
+        self.state = OPEN
+        self.forced = True
+        self.retry_at = float("inf")
+
+    def half_open(self):
+        """Start admitting probe requests."""
+        self.state = HALF_OPEN
+        self.half_open_inflight = 0
+        self.half_open_successes = 0
+
+    def close(self):
+        """Close the breaker and start a fresh window."""
+        self.state = CLOSED
+        self.forced = False
+        self.failures = 0
+        self.trips = 0
+        self.half_open_inflight = 0
+        self.half_open_successes = 0
+        self._clear_window()
+
+    def reset(self):
+        """Close the breaker, e.g. after an active health check succeeds."""
+        if self.state != CLOSED:
+            self.close()
+
+    def cancel(self):
+        """Give back the probe slot of a request that was abandoned without an outcome."""
+        if self.state == HALF_OPEN:
+            self.half_open_inflight = max(self.half_open_inflight - 1, 0)
+
+    def allow_request(self):
+        """
+        Admit a request to the backend.
+
+        Returns:
+            bool: True if the request may be sent.
+        """
+        if self.state == CLOSED:
+            return True
+        if (
+            self.state == HALF_OPEN
+            and self.half_open_inflight < self.half_open_requests
+        ):
+            self.half_open_inflight += 1
+            return True
+        return False
+
+    @property
+    def saturated(self):
+        """Whether all half-open probe slots are in use."""
+        return (
+            self.state == HALF_OPEN
+            and self.half_open_inflight >= self.half_open_requests
+        )
+
+    def get_metrics(self):
+        """
+        Get the breaker state and rolling window statistics.
+
+        Returns:
+            dict: Dictionary containing breaker metrics.
+        """
+        return {
+            "state": self.state,
+            "window_requests": self.filled,
+            "error_rate": self.error_total / self.filled if self.filled else 0,
+            "slow_rate": self.slow_total / self.filled if self.filled else 0,
+            "avg_response_time": (
+                self.latency_total / self.filled if self.filled else 0
+            ),
+            "consecutive_failures": self.failures,
+        }
@@ -0,0 +1,180 @@
+# Consistent hashing load balancing algorithm with bounded loads.
+# Requests carrying the same key (a header, a cookie or a path prefix) go to the same server,
+# so the server's local cache keeps serving that key.
+#
+# Algorithm Steps
+# Place every server on a hash ring many times ("virtual nodes") to even out the share of keys per server.
+# Hash the request key and find the first virtual node clockwise from it with a binary search.
+# Walk clockwise past servers that are unhealthy or already over capacity.
+# Capacity is load_factor times the average number of in-flight requests per healthy server,
+# so a hot key spills over to the next server on the ring instead of melting one node.
+#
+# Unhealthy servers are skipped during the walk rather than removed from the ring,
+# so when a server goes down only the keys it owned move, which is about 1/n of all keys.
+
+import bisect
+import hashlib
+import math
+import threading
+from .base import BaseLoadBalancer
+
+
+def hash_key(value):
+    """Hash a string to a stable 64-bit integer, identical across processes."""
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class ConsistentHashLoadBalancer(BaseLoadBalancer):
+    """Consistent hashing on a ring of virtual nodes, with bounded loads."""
+
+    def __init__(
+        self, servers, key="header:x-user-id", virtual_nodes=100, load_factor=1.25
+    ):
+        """
+        Initialize the consistent hash load balancer.
+
+        Args:
+            servers (list): List of server URLs.
+            key (str): Where to read the hash key from: "header:<name>",
+                "cookie:<name>" or "path:<segments>". Requests without the key
+                are hashed on the client address.
+            virtual_nodes (int): Ring positions per server.
+            load_factor (float): Allowed load of a server relative to the average,
+                or 0 to disable load bounding.
+        """
+        super().__init__(servers)
+        self.key_source, _, self.key_name = key.partition(":")
+        self.key_name = self.key_name.lower()
+        if self.key_source not in ("header", "cookie", "path"):
+            raise ValueError(f"Unknown hash key source: {key}")
+        self.virtual_nodes = virtual_nodes
+        self.load_factor = load_factor
+        self.lock = threading.Lock()
+
+        # Sorted ring positions and the server owning each position
+        self.ring_hashes = []
+        self.ring_servers = []
+        self.in_ring = set()
+        for server in servers:
+            self._add_to_ring(server)
+
+        self.inflight = {server: 0 for server in servers}
+        self.total_inflight = 0
+
+    def _add_to_ring(self, server):
+        for replica in range(self.virtual_nodes):
+            position = hash_key(f"{server}#{replica}")
+            i = bisect.bisect_left(self.ring_hashes, position)
+            self.ring_hashes.insert(i, position)
+            self.ring_servers.insert(i, server)
+        self.in_ring.add(server)
+
+    def _remove_from_ring(self, server):
+        for replica in range(self.virtual_nodes):
+            position = hash_key(f"{server}#{replica}")
+            i = bisect.bisect_left(self.ring_hashes, position)
+            # Positions shared with other servers sit next to each other
+            while self.ring_servers[i] != server:
+                i += 1
+            del self.ring_hashes[i]
+            del self.ring_servers[i]
+        self.in_ring.discard(server)
+
+    def add_to_rotation(self, server):
+        changed = super().add_to_rotation(server)
+        if changed and server not in self.in_ring:
+            with self.lock:
+                self._add_to_ring(server)
+                self.inflight.setdefault(server, 0)
+        return changed
+
+    def remove_server(self, server):
+        super().remove_server(server)
+        with self.lock:
+            if server in self.in_ring:
+                self._remove_from_ring(server)
+            self.total_inflight -= self.inflight.pop(server, 0)
+
+    def request_key(self, request):
+        """
+        Extract the hash key from a request.
+
+        Args:
+            request: The incoming request, or a plain string key.
+
+        Returns:
+            str: The key, or None if the request carries none.
+        """
+        if request is None or isinstance(request, str):
+            return request
+        if self.key_source == "header":
+            value = request.headers.get(self.key_name)
+        elif self.key_source == "cookie":
+            value = request.cookies.get(self.key_name)
+        else:
+            segments = int(self.key_name or 1)
+            value = "/".join(request.url.path.split("/")[: segments + 1])
+        if not value and request.client:
+            value = request.client.host
+        return value
+
+    def assign_server(self, request=None):
+        """
+        Assign the server owning the request's key on the hash ring.
+
+        Args:
+            request: The request to be handled, or a plain string key.
+
+        Returns:
+            str: URL of the selected server or None if no healthy servers.
+        """
+        healthy_count = len(self.healthy_servers)
+        if healthy_count == 0:
+            self.logger.warning("No healthy servers available")
+            return None
+
+        key = self.request_key(request) or ""
+        with self.lock:
+            size = len(self.ring_hashes)
+            start = bisect.bisect_left(self.ring_hashes, hash_key(key)) % size
+            capacity = (
+                math.ceil(self.load_factor * (self.total_inflight + 1) / healthy_count)
+                if self.load_factor
+                else math.inf
+            )
+
+            selected_server = None
+            fallback = None
+            for step in range(size):
+                server = self.ring_servers[(start + step) % size]
+                if server not in self.healthy_servers:
+                    continue
+                if fallback is None:
+                    fallback = server
+                if self.warming and not self.admit(server):
+                    # Keys of a warming server spill over until its ramp admits them
+                    continue
+                if self.inflight[server] < capacity:
+                    selected_server = server
+                    break
+            if selected_server is None:
+                selected_server = fallback
+
+            self.inflight[selected_server] += 1
+            self.total_inflight += 1
+
+        self.logger.debug(f"Selected server: {selected_server} for key {key!r}")
+        return selected_server
+
+    def release_connection(self, server):
+        """Mark a request to the server as finished."""
+        with self.lock:
+            if self.inflight.get(server, 0) > 0:
+                self.inflight[server] -= 1
+                self.total_inflight -= 1
+
+    def get_metrics(self):
+        metrics = super().get_metrics()
+        metrics["inflight"] = dict(self.inflight)
+        return metrics
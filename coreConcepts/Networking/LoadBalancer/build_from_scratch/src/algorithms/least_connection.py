@@ -9,7 +9,14 @@
 # Update the active connection count for the selected server.
 # In case of a tie (multiple servers with the same least connections), use additional criteria like server weights or Round Robin to break the tie.
 
-from .round_robin import RoundRobinLoadBalancer
+# Implementation
+# The healthy servers live in an indexed binary min-heap ordered by (active connections, last selected),
+# with a position map so any server can be found in O(1) and moved in O(log n).
+# Acquiring takes the root, releasing sifts the server back up. Among servers with equal connections,
+# the one selected least recently wins, which gives round-robin fairness for ties.
+
+import itertools
+import threading
 from .base import BaseLoadBalancer
 
 
@@ -24,84 +31,159 @@ class LeastConnectionsLoadBalancer(BaseLoadBalancer):
             servers (list): List of server URLs.
         """
         super().__init__(servers)
-        # Track active connections for each server
+        # Track active connections for each server, including servers out of rotation
         self.connections = {server: 0 for server in servers}
-        # Create a RoundRobinLoadBalancer for use when multiple servers have equal connections
-        self.round_robin = RoundRobinLoadBalancer(servers)
-
-    # def mark_unhealthy(self, server):
-    #     """Mark a server as unhealthy."""
-    #     if server in self.healthy_servers:
-    #         self.healthy_servers.discard(server)
-    #         self.connections.pop(server, None)  # Remove from connections tracking
-    #         self.round_robin_load_balancer.mark_unhealthy(
-    #             server
-    #         )  # Update LoadBalancer health status
-
-    # def mark_healthy(self, server):
-    #     """Mark a server as healthy."""
-    #     if server not in self.healthy_servers:
-    #         self.healthy_servers.add(server)
-    #         self.connections[server] = 0  # Reset connection count for the server
-
-    def assign_server(self, request):
-        """Assign a request to the server with the least connections."""
-        if not self.healthy_servers:
-            self.logger.warning("No healthy servers available")
-            return None
-
-        # Get connections for healthy servers
-        healthy_connections = {
-            server: self.connections.get(server, 0) for server in self.healthy_servers
+        # Connections held by other worker processes, when running as a cluster
+        self.remote_connections = {}
+        # Selection tick of each server, used to break ties fairly
+        self.ticks = itertools.count()
+        self.last_selected = {
+            server: i - len(servers) for i, server in enumerate(servers)
         }
+        # Indexed heap of servers in rotation and each server's index in it
+        self.heap = []
+        self.position = {}
+        self.lock = threading.RLock()
+        for server in servers:
+            self._push(server)
+
+    def _key(self, server):
+        return (
+            self.connections[server] + self.remote_connections.get(server, 0),
+            self.last_selected[server],
+        )
 
-        if not healthy_connections:
-            return None
-
-        # Find servers with minimum connections
-        min_connections = min(healthy_connections.values())
-        candidates = [
-            server
-            for server, connections in healthy_connections.items()
-            if connections == min_connections
-        ]
-
-        selected_server = None
-
-        # If multiple servers have the same number of connections, use round robin
-        if len(candidates) > 1:
-            # Update the round_robin's healthy_servers to only include our candidates
-            original_healthy_servers = self.round_robin.healthy_servers
-            self.round_robin.healthy_servers = set(candidates)
-
-            # Use the round robin algorithm to select among equal candidates
-            selected_server = self.round_robin.assign_server(request)
-
-            # Restore the original healthy_servers
-            self.round_robin.healthy_servers = original_healthy_servers
-
-            self.logger.debug(
-                f"Multiple servers with {min_connections} connections, using round-robin"
-            )
-        else:
-            # Only one server with minimum connections
-            selected_server = candidates[0]
-
-        # Increment the connection counter for the selected server
-        self.connections[selected_server] = self.connections.get(selected_server, 0) + 1
-
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.position[heap[i]] = i
+        self.position[heap[j]] = j
+
+    def _sift_up(self, i):
+        while i > 0:
+            parent = (i - 1) // 2
+            if self._key(self.heap[i]) >= self._key(self.heap[parent]):
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i):
+        size = len(self.heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and self._key(self.heap[child]) < self._key(
+                    self.heap[smallest]
+                ):
+                    smallest = child
+            if smallest == i:
+                break
+            self._swap(i, smallest)
+            i = smallest
+
+    def _push(self, server):
+        self.connections.setdefault(server, 0)
+        self.last_selected.setdefault(server, next(self.ticks))
+        self.heap.append(server)
+        self.position[server] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def _remove(self, server):
+        i = self.position.pop(server)
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.position[last] = i
+            self._sift_up(i)
+            self._sift_down(self.position[last])
+
+    def add_to_rotation(self, server):
+        with self.lock:
+            changed = super().add_to_rotation(server)
+            if changed:
+                self._push(server)
+        return changed
+
+    def remove_from_rotation(self, server):
+        with self.lock:
+            changed = super().remove_from_rotation(server)
+            if changed:
+                self._remove(server)
+        return changed
+
+    def remove_server(self, server):
+        super().remove_server(server)
+        with self.lock:
+            self.connections.pop(server, None)
+            self.remote_connections.pop(server, None)
+            self.last_selected.pop(server, None)
+
+    def assign_server(self, request=None):
+        """Assign a request to the server with the least connections."""
+        with self.lock:
+            if not self.heap:
+                self.logger.warning("No healthy servers available")
+                return None
+
+            # A warming root yields, unless its slow start admits the pick,
+            # to the next least loaded server, which is one of its children
+            i = 0
+            if self.warming and not self.admit(self.heap[0]):
+                children = [
+                    child
+                    for child in (1, 2)
+                    if child < len(self.heap) and self.admit(self.heap[child])
+                ]
+                if children:
+                    i = min(children, key=lambda child: self._key(self.heap[child]))
+            selected_server = self.heap[i]
+
+            # Increment the connection counter for the selected server
+            self.connections[selected_server] += 1
+            connections = self.connections[selected_server]
+            self.last_selected[selected_server] = next(self.ticks)
+            self._sift_down(i)
+
+        # Formatted only when debug logging is on, this runs for every request
         self.logger.debug(
-            f"Selected server: {selected_server} (connections: {self.connections[selected_server]})"
+            "Selected server: %s (connections: %s)", selected_server, connections
         )
         return selected_server
 
-    def complete_request(self, server):
+    def release_connection(self, server):
         """Decrement the connection count when a request is completed."""
-        if server in self.connections and self.connections[server] > 0:
+        with self.lock:
+            if self.connections.get(server, 0) <= 0:
+                return
             self.connections[server] -= 1
-            self.logger.debug(
-                f"Released connection from {server} (connections: {self.connections[server]})"
-            )
+            connections = self.connections[server]
+            if server in self.position:
+                self._sift_up(self.position[server])
+        self.logger.debug(
+            "Released connection from %s (connections: %s)", server, connections
+        )
+
+    def local_load(self, server):
+        return self.connections.get(server, 0), 0.0, 0
+
+    def apply_cluster_load(self, loads):
+        """Count other workers' connections and restore the heap order."""
+        with self.lock:
+            for server, (connections, _, _) in loads.items():
+                local = self.connections.get(server, 0)
+                self.remote_connections[server] = max(connections - local, 0)
+            # A sorted list is a valid heap
+            self.heap.sort(key=self._key)
+            for i, server in enumerate(self.heap):
+                self.position[server] = i
+
+    # Kept for callers written against the original name
+    complete_request = release_connection
+
+    def get_metrics(self):
+        metrics = super().get_metrics()
+        metrics["connections"] = dict(self.connections)
+        return metrics
 
 
 # # Example usage
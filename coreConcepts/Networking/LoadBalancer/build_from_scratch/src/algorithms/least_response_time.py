@@ -31,6 +31,8 @@ class LeastResponseTimeLoadBalancer(BaseLoadBalancer):
         self.last_ping_time = {server: 0 for server in servers}
         # How often to ping servers (in seconds)
         self.ping_interval = 5
+        # Average response times over all worker processes, when running as a cluster
+        self.cluster_average = {}
     
     def record_response_time(self, server, response_time):
         """
@@ -50,6 +52,20 @@ class LeastResponseTimeLoadBalancer(BaseLoadBalancer):
         if len(self.response_times[server]) > self.window_size:
             self.response_times[server] = self.response_times[server][:self.window_size]
     
+    def mark_healthy(self, server):
+        recovering = server not in self.healthy_servers
+        super().mark_healthy(server)
+        if recovering and server in self.healthy_servers:
+            # Samples from before the outage are stale, keep only the newest one
+            self.response_times[server] = self.response_times.get(server, [])[:1]
+            self.cluster_average.pop(server, None)
+
+    def remove_server(self, server):
+        super().remove_server(server)
+        self.response_times.pop(server, None)
+        self.last_ping_time.pop(server, None)
+        self.cluster_average.pop(server, None)
+
     def get_average_response_time(self, server):
         """
         Get the average response time for a server.
@@ -60,6 +76,8 @@ class LeastResponseTimeLoadBalancer(BaseLoadBalancer):
         Returns:
             float: The average response time or float('inf') if no data.
         """
+        if self.cluster_average.get(server) is not None:
+            return self.cluster_average[server]
         times = self.response_times.get(server, [])
         if not times:
             # If we have no data, return infinity so this server isn't selected
@@ -86,31 +104,60 @@ class LeastResponseTimeLoadBalancer(BaseLoadBalancer):
             for server in self.healthy_servers
         }
         
-        if not avg_response_times:
-            return None
-        
-        # Find the minimum response time
-        min_time = min(avg_response_times.values())
+        # Find the server with the minimum response time, ties go to the lowest
+        # URL so that every process picks the same server
+        selected_server, min_time = min(
+            avg_response_times.items(), key=lambda item: (item[1], item[0])
+        )
         
         # If min_time is infinity, it means we have no data for any server
         # In this case, choose randomly
         if min_time == float('inf'):
-            selected_server = random.choice(list(self.healthy_servers))
+            # Drawn from the ordered server list so a seeded random picks the same server in every process
+            selected_server = random.choice(
+                [server for server in self.servers if server in self.healthy_servers]
+            )
+            selected_server = self.pass_over_warming(selected_server, avg_response_times)
             self.logger.debug(f"No response time data, randomly selected server: {selected_server}")
             return selected_server
         
-        # Find all servers with the minimum response time
-        candidates = [
-            server for server, time in avg_response_times.items()
-            if time == min_time
-        ]
-        
-        # If multiple servers have the same response time, choose randomly
-        selected_server = random.choice(candidates)
+        selected_server = self.pass_over_warming(selected_server, avg_response_times)
         
         self.logger.debug(f"Selected server: {selected_server} (avg response time: {min_time:.4f}s)")
         return selected_server
     
+    def pass_over_warming(self, selected_server, avg_response_times):
+        """
+        Replace a warming server with the next best one unless its slow start admits the pick.
+
+        Args:
+            selected_server (str): The server picked by response time.
+            avg_response_times (dict): Average response time of every healthy server.
+
+        Returns:
+            str: The server to use.
+        """
+        if not self.warming or self.admit(selected_server):
+            return selected_server
+        others = {
+            server: time for server, time in avg_response_times.items()
+            if server != selected_server
+        }
+        if not others:
+            return selected_server
+        return min(others.items(), key=lambda item: (item[1], item[0]))[0]
+
+    def local_load(self, server):
+        times = self.response_times.get(server, [])
+        return 0, sum(times), len(times)
+
+    def apply_cluster_load(self, loads):
+        """Average the response time windows of all workers."""
+        self.cluster_average = {
+            server: latency_sum / latency_count if latency_count else None
+            for server, (_, latency_sum, latency_count) in loads.items()
+        }
+
     def should_ping_server(self, server):
         """
         Determine if we should ping a server to update its response time.
@@ -0,0 +1,290 @@
+# Locality-aware routing with priority failover tiers
+# Every backend has a zone, a priority tier and a capacity. The backends of each (tier, zone)
+# pair form a pool that is balanced by its own instance of any other algorithm.
+
+# Algorithm Steps
+# Tiers: tier 0 takes all traffic while at least `health_threshold` of its capacity is healthy.
+# Below that it keeps a share of health / health_threshold and the rest spills over to the next tier,
+# like the priority levels of Envoy.
+
+# Zones: within a tier, the local zone takes all of the tier's traffic while it is healthy enough
+# by the same rule, and the spill-over is spread over the other zones by their healthy capacity.
+
+# The share of every pool is recomputed when a backend enters or leaves rotation, so a selection
+# is one random draw over a handful of pools followed by the pool's own algorithm.
+import bisect
+import random
+import threading
+from .base import BaseLoadBalancer
+
+
+class LocalityAwareLoadBalancer(BaseLoadBalancer):
+    def __init__(
+        self,
+        servers,
+        factory,
+        metadata=None,
+        local_zone=None,
+        health_threshold=0.7,
+    ):
+        """
+        Initialize the locality-aware load balancer.
+
+        Args:
+            servers (list): List of server URLs.
+            factory (callable): Creates the load balancer of a pool from its server list.
+            metadata (dict): Server to a dict with its "zone", "priority" (lower is
+                preferred) and "capacity". Missing servers are in the local zone,
+                tier 0, with capacity 1.
+            local_zone (str): Zone of this proxy, or None to spread traffic by capacity.
+            health_threshold (float): Healthy share of capacity below which a tier or
+                the local zone starts to spill traffic over.
+        """
+        super().__init__(servers)
+        self.factory = factory
+        self.local_zone = local_zone
+        self.health_threshold = health_threshold
+        self.metadata = {}
+        # Pools keyed by (priority, zone) and the pool of every server
+        self.pools = {}
+        self.pool_of = {}
+        self.lock = threading.Lock()
+        # Shares of the pools with healthy servers, replaced as a whole on changes
+        self.plan = ((), ())
+        self.shares = {}
+
+        metadata = metadata or {}
+        grouped = {}
+        for server in servers:
+            self.metadata[server] = self._describe(metadata.get(server))
+            grouped.setdefault(self._pool_key(server), []).append(server)
+        for key, members in grouped.items():
+            self._create_pool(key, members)
+        self.rebuild_plan()
+
+        self.logger.info(f"Initialized pools: {sorted(self.pools)}")
+
+    def _describe(self, meta):
+        meta = meta or {}
+        return {
+            "zone": meta.get("zone", self.local_zone),
+            "priority": int(meta.get("priority", 0)),
+            "capacity": float(meta.get("capacity", 1)),
+        }
+
+    def _pool_key(self, server):
+        meta = self.metadata[server]
+        return meta["priority"], meta["zone"]
+
+    def _create_pool(self, key, members):
+        pool = self.factory(list(members))
+        # Passive health is tracked once, by this load balancer
+        pool.breakers = {}
+        # Pools created after configure_slow_start ramp up like the others
+        pool.configure_slow_start(
+            self.slow_start_duration,
+            self.slow_start_min_factor,
+            self.slow_start_aggression,
+        )
+        self.pools[key] = pool
+        for server in members:
+            self.pool_of[server] = pool
+        return pool
+
+    @staticmethod
+    def _sort_key(item):
+        (priority, zone), _ = item
+        return priority, str(zone)
+
+    def rebuild_plan(self):
+        """Recompute the share of traffic of every pool from the healthy capacity."""
+        with self.lock:
+            capacity = {}
+            healthy = {}
+            for server, meta in self.metadata.items():
+                key = self._pool_key(server)
+                capacity[key] = capacity.get(key, 0) + meta["capacity"]
+                if server in self.healthy_servers:
+                    healthy[key] = healthy.get(key, 0) + meta["capacity"]
+
+            shares = {}
+            remaining = 1.0
+            for tier in sorted({priority for priority, _ in capacity}):
+                keys = [key for key in capacity if key[0] == tier]
+                tier_capacity = sum(capacity[key] for key in keys)
+                tier_healthy = sum(healthy.get(key, 0) for key in keys)
+                if tier_healthy <= 0:
+                    continue
+                load = min(
+                    remaining, tier_healthy / tier_capacity / self.health_threshold
+                )
+                remaining -= load
+                for key, share in self._zone_shares(keys, capacity, healthy).items():
+                    shares[key] = load * share
+                if remaining <= 0:
+                    break
+
+            total = sum(shares.values())
+            pools = []
+            cumulative = []
+            running = 0.0
+            for key, share in sorted(shares.items(), key=self._sort_key):
+                if share <= 0:
+                    continue
+                running += share / total
+                pools.append(self.pools[key])
+                cumulative.append(running)
+            self.plan = (tuple(cumulative), tuple(pools))
+            self.shares = {key: share / total for key, share in shares.items()}
+
+    def _zone_shares(self, keys, capacity, healthy):
+        """Split a tier's traffic between its zones, preferring the local one."""
+        local = next((key for key in keys if key[1] == self.local_zone), None)
+        others = {
+            key: healthy[key] for key in keys if key != local and healthy.get(key)
+        }
+        if local is None or not healthy.get(local):
+            total = sum(others.values())
+            return {key: value / total for key, value in others.items()}
+        local_share = min(1.0, healthy[local] / capacity[local] / self.health_threshold)
+        if not others:
+            return {local: 1.0}
+        total = sum(others.values())
+        shares = {
+            key: (1 - local_share) * value / total for key, value in others.items()
+        }
+        shares[local] = local_share
+        return shares
+
+    def add_to_rotation(self, server):
+        changed = super().add_to_rotation(server)
+        if changed:
+            self.pool_of[server].add_to_rotation(server)
+            self.rebuild_plan()
+        return changed
+
+    def remove_from_rotation(self, server):
+        changed = super().remove_from_rotation(server)
+        if changed:
+            self.pool_of[server].remove_from_rotation(server)
+            self.rebuild_plan()
+        return changed
+
+    def add_server(self, server, metadata=None):
+        """
+        Add a server at runtime, to the pool of its zone and tier.
+
+        Args:
+            server (str): URL of the server.
+            metadata (dict): The server's zone, priority and capacity.
+
+        Returns:
+            bool: True if the server was not known before.
+        """
+        if server not in self.pool_of:
+            self.metadata[server] = self._describe(metadata)
+            key = self._pool_key(server)
+            pool = self.pools.get(key)
+            if pool is None:
+                pool = self._create_pool(key, [server])
+                # Enters rotation below, with the other load balancer's bookkeeping
+                pool.remove_from_rotation(server)
+            else:
+                pool.add_server(server)
+                pool.breakers.pop(server, None)
+                pool.remove_from_rotation(server)
+                self.pool_of[server] = pool
+        return super().add_server(server)
+
+    def remove_server(self, server):
+        super().remove_server(server)
+        pool = self.pool_of.pop(server, None)
+        if pool is not None:
+            pool.remove_server(server)
+            self.metadata.pop(server, None)
+            self.rebuild_plan()
+
+    def update_weight(self, server, weight):
+        """
+        Pass a weight change on to the server's pool.
+
+        Raises:
+            ValueError: If the pools' algorithm does not use weights.
+        """
+        pool = self.pool_of.get(server)
+        if pool is None or not hasattr(pool, "update_weight"):
+            raise ValueError("The load balancing algorithm does not use weights")
+        pool.update_weight(server, weight)
+
+    def configure_slow_start(self, duration, min_factor=0.1, aggression=1.0):
+        super().configure_slow_start(duration, min_factor, aggression)
+        for pool in self.pools.values():
+            pool.configure_slow_start(duration, min_factor, aggression)
+
+    def start_slow_start(self, server):
+        super().start_slow_start(server)
+        pool = self.pool_of.get(server)
+        if pool is not None:
+            pool.start_slow_start(server)
+
+    def assign_server(self, request=None):
+        cumulative, pools = self.plan
+        if not pools:
+            self.logger.warning("No healthy servers available")
+            return None
+
+        if len(pools) == 1:
+            pool = pools[0]
+        else:
+            index = bisect.bisect_right(cumulative, random.random())
+            pool = pools[min(index, len(pools) - 1)]
+        selected_server = pool.assign_server(request)
+
+        self.logger.debug(f"Selected server: {selected_server}")
+        return selected_server
+
+    def release_connection(self, server):
+        """Pass the end of a request on to the server's pool."""
+        pool = self.pool_of.get(server)
+        if pool is not None and hasattr(pool, "release_connection"):
+            pool.release_connection(server)
+
+    def record_response_time(self, server, response_time):
+        """Pass a response time on to the server's pool."""
+        pool = self.pool_of.get(server)
+        if pool is not None and hasattr(pool, "record_response_time"):
+            pool.record_response_time(server, response_time)
+
+    def record_request_metrics(self, server, response_time, error=False, status=None):
+        super().record_request_metrics(server, response_time, error, status)
+        pool = self.pool_of.get(server)
+        if pool is not None:
+            pool.record_request_metrics(server, response_time, error, status)
+
+    def local_load(self, server):
+        pool = self.pool_of.get(server)
+        return pool.local_load(server) if pool is not None else (0, 0.0, 0)
+
+    def apply_cluster_load(self, loads):
+        for pool in self.pools.values():
+            pool.apply_cluster_load(
+                {server: loads[server] for server in pool.servers if server in loads}
+            )
+
+    def get_metrics(self):
+        metrics = super().get_metrics()
+        metrics["locality"] = {
+            "local_zone": self.local_zone,
+            "pools": {
+                f"{priority}/{zone}": {
+                    "share": round(self.shares.get((priority, zone), 0.0), 4),
+                    "servers": list(pool.servers),
+                    "healthy": len(pool.healthy_servers),
+                }
+                for (priority, zone), pool in sorted(
+                    self.pools.items(), key=self._sort_key
+                )
+            },
+            "servers": dict(self.metadata),
+        }
+        return metrics
@@ -0,0 +1,159 @@
+# Peak EWMA load balancing algorithm, in the style of Finagle and Linkerd.
+# Each server keeps an exponentially weighted moving average of its response time.
+# The average decays with wall-clock time rather than per sample, and it jumps straight up to any sample
+# above it ("peak"), so a server that suddenly slows down is penalised at once and only forgiven gradually.
+#
+# Algorithm Steps
+# Pick two distinct healthy servers at random (power of two choices).
+# Score each as its decayed latency estimate times (outstanding requests + 1).
+# Send the request to the server with the lower score and count it as outstanding.
+# When the response arrives, fold its latency into the server's estimate and release the request.
+#
+# Comparing two random candidates instead of taking the global minimum avoids herding all traffic
+# onto the single fastest server, and every sample update and pick is O(1).
+
+import math
+import random
+import threading
+from .base import BaseLoadBalancer
+
+
+class PeakEwmaLoadBalancer(BaseLoadBalancer):
+    """Peak EWMA load balancing with power-of-two-choices selection."""
+
+    def __init__(self, servers, decay_time=10.0, default_rtt=0.1):
+        """
+        Initialize the Peak EWMA load balancer.
+
+        Args:
+            servers (list): List of server URLs.
+            decay_time (float): Time constant in seconds of the latency average.
+            default_rtt (float): Latency assumed for a server without samples.
+        """
+        super().__init__(servers)
+        self.decay_time = decay_time
+        self.default_rtt = default_rtt
+        self.cost = {server: default_rtt for server in servers}
+        now = self.clock()
+        self.last_update = {server: now for server in servers}
+        self.outstanding = {server: 0 for server in servers}
+        # Healthy servers in a list for O(1) random access, with each server's index
+        self.healthy_list = list(servers)
+        self.position = {server: i for i, server in enumerate(servers)}
+        self.lock = threading.Lock()
+
+    def add_to_rotation(self, server):
+        with self.lock:
+            changed = super().add_to_rotation(server)
+            if changed:
+                self.position[server] = len(self.healthy_list)
+                self.healthy_list.append(server)
+                self.cost.setdefault(server, self.default_rtt)
+                self.last_update.setdefault(server, self.clock())
+                self.outstanding.setdefault(server, 0)
+        return changed
+
+    def remove_from_rotation(self, server):
+        with self.lock:
+            changed = super().remove_from_rotation(server)
+            if changed:
+                # Swap the last server into the freed slot
+                i = self.position.pop(server)
+                last = self.healthy_list.pop()
+                if i < len(self.healthy_list):
+                    self.healthy_list[i] = last
+                    self.position[last] = i
+        return changed
+
+    def remove_server(self, server):
+        super().remove_server(server)
+        with self.lock:
+            self.cost.pop(server, None)
+            self.last_update.pop(server, None)
+            self.outstanding.pop(server, None)
+
+    def current_cost(self, server, now):
+        """Get a server's latency estimate decayed to the current time."""
+        elapsed = max(now - self.last_update[server], 0)
+        return self.cost[server] * math.exp(-elapsed / self.decay_time)
+
+    def score(self, server, now):
+        """Get a server's load score, lower is better."""
+        return self.current_cost(server, now) * (self.outstanding[server] + 1)
+
+    def assign_server(self, request=None):
+        """
+        Assign a server by comparing two random healthy candidates.
+
+        Args:
+            request: The request to be handled (not used in this algorithm).
+
+        Returns:
+            str: URL of the selected server or None if no healthy servers.
+        """
+        with self.lock:
+            servers = self.healthy_list
+            count = len(servers)
+            if count == 0:
+                self.logger.warning("No healthy servers available")
+                return None
+
+            if count == 1:
+                selected_server = servers[0]
+            else:
+                i = random.randrange(count)
+                j = random.randrange(count - 1)
+                if j >= i:
+                    j += 1
+                first, second = servers[i], servers[j]
+                now = self.clock()
+                if self.score(first, now) > self.score(second, now):
+                    first, second = second, first
+                # A warming winner only takes the share its slow start admits
+                if self.warming and not self.admit(first):
+                    first = second
+                selected_server = first
+
+            self.outstanding[selected_server] += 1
+
+        self.logger.debug(f"Selected server: {selected_server}")
+        return selected_server
+
+    def record_response_time(self, server, response_time):
+        """
+        Fold a response time into a server's latency estimate.
+
+        Args:
+            server (str): The server that handled the request.
+            response_time (float): The time taken to process the request.
+        """
+        with self.lock:
+            if server not in self.cost:
+                # Removed while the request was in flight
+                return
+            now = self.clock()
+            if response_time > self.cost[server]:
+                # Peak sensitivity: jump straight to a slower sample
+                self.cost[server] = response_time
+            else:
+                w = math.exp(-max(now - self.last_update[server], 0) / self.decay_time)
+                self.cost[server] = self.cost[server] * w + response_time * (1 - w)
+            self.last_update[server] = now
+
+    def release_connection(self, server):
+        """Mark a request to the server as finished."""
+        with self.lock:
+            if self.outstanding.get(server, 0) > 0:
+                self.outstanding[server] -= 1
+
+    def get_metrics(self):
+        metrics = super().get_metrics()
+        now = self.clock()
+        metrics["peak_ewma"] = {
+            server: {
+                "cost": self.current_cost(server, now),
+                "outstanding": self.outstanding[server],
+            }
+            for server in self.cost
+        }
+        return metrics
@@ -10,36 +10,58 @@
 # Use an index to keep track of the next server to assign a request.
 
 # Cycle through the list of servers in a circular manner.
+# The healthy servers are kept as an ordered tuple that is only rebuilt when membership changes,
+# so a selection is a single counter increment and an index lookup.
+import itertools
+import threading
 from .base import BaseLoadBalancer
 
 
 class RoundRobinLoadBalancer(BaseLoadBalancer):
     def __init__(self, servers):
         super().__init__(servers)
-        self.current_index = (
-            0  # index to keep track of the next server to assign a request
+        # itertools.count is advanced atomically, so concurrent callers never share an index
+        self.counter = itertools.count()
+        # ordered snapshot of healthy servers, replaced as a whole on membership changes
+        self.healthy_list = tuple(servers)
+        self.rebuild_lock = threading.Lock()
+
+    def rebuild_healthy_list(self):
+        """Rebuild the healthy server snapshot in configured server order."""
+        self.healthy_list = tuple(
+            server for server in self.servers if server in self.healthy_servers
         )
 
-    def assign_server(self, request=None):
-        # assigning request to the current server
+    def add_to_rotation(self, server):
+        with self.rebuild_lock:
+            changed = super().add_to_rotation(server)
+            if changed:
+                self.rebuild_healthy_list()
+        return changed
 
-        if not self.healthy_servers:
-            self.logger.warning("No healthy servers available")
-            return None
+    def remove_from_rotation(self, server):
+        with self.rebuild_lock:
+            changed = super().remove_from_rotation(server)
+            if changed:
+                self.rebuild_healthy_list()
+        return changed
 
-        server_list = list(self.healthy_servers)
+    def assign_server(self, request=None):
+        # assigning request to the current server
+        server_list = self.healthy_list
 
         if not server_list:
+            self.logger.warning("No healthy servers available")
             return None
 
-        # Ensure index is valid for the current server list
-        self.current_index = self.current_index % len(server_list)
-
         # Get the next server in rotation
-        selected_server = server_list[self.current_index]
-
-        # Move to the next server for the next request
-        self.current_index = (self.current_index + 1) % len(server_list)
+        selected_server = server_list[next(self.counter) % len(server_list)]
+        if self.warming:
+            # Pass over a warming server unless its slow start admits the pick
+            for _ in range(len(server_list) - 1):
+                if self.admit(selected_server):
+                    break
+                selected_server = server_list[next(self.counter) % len(server_list)]
 
         self.logger.debug(f"Selected server: {selected_server}")
         return selected_server
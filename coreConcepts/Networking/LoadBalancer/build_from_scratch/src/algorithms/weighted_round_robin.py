@@ -11,114 +11,176 @@
 # Combined list: [A, A, A, B, B, C]
 # Distribute requests in a cyclic manner using this list.
 
+# Implementation (smooth weighted round robin, as in nginx)
+# Every server has a configured weight, an effective weight and a current weight.
+# On each request, add every healthy server's effective weight to its current weight,
+# pick the server with the highest current weight and subtract the total effective weight from it.
+# This spreads a heavy server's turns out instead of sending them back to back:
+# weights A=5, B=1, C=1 give A A B A C A A rather than A A A A A B C.
+# The effective weight drops when a server fails and climbs back by one per selection,
+# so a failing server gets fewer requests without its configured weight being touched.
+
+import threading
 from .base import BaseLoadBalancer
 
 
 class WeightedRoundRobinLoadBalancer(BaseLoadBalancer):
-    def __init__(self, servers, weights=None):
+    def __init__(self, servers, weights=None, max_fails=10):
         super().__init__(servers)
 
         if weights is None:
             weights = {server: 1 for server in servers}
 
-        self.weights = weights
-
-        self.current_weight = 0
-
-        self.current_index = 0
-        self.max_weight = max(weights.values()) if weights else 0
-
-        self.logger.info(f"Initialized with weights: {weights}")
-
-    # def _create_weighted_list(self):
-    #     # create a list of servers based on their weights
-    #     weighted_list = []
-    #     for server, weight in zip(self.servers, self.weights):
-    #         if server in self.healthy_servers:
-    #             weighted_list.extend([server] * weight)
-    #     return weighted_list
-
-    # def mark_unhealthy(self, server):
-    #     # mark a server as unhealthy
-    #     if server in self.healthy_servers:
-    #         self.healthy_servers.discard(server)
-    #         self.weighted_list = (
-    #             self._create_weighted_list()
-    #         )  # rebuild the weighted list
-
-    # def mark_healthy(self, server):
-    #     # mark a server as healthy
-    #     if server not in self.healthy_servers:
-    #         self.healthy_servers.add(server)
-    #         self.weighted_list = (
-    #             self._create_weighted_list()
-    #         )  # rebuild the weighted list
+        self.weights = dict(weights)
+        # Effective weight lost per failure, as a share of the configured weight
+        self.max_fails = max_fails
+        self.lock = threading.Lock()
+
+        # Compact per-server slots: parallel lists indexed by slot number
+        self.slot_of = {}
+        self.slot_servers = []
+        self.weight = []
+        self.effective = []
+        self.current = []
+        self.active = []
+        for server in servers:
+            self._add_slot(server)
+
+        self.logger.info(f"Initialized with weights: {self.weights}")
+
+    def _add_slot(self, server):
+        weight = self.weights.setdefault(server, 1)
+        self.slot_of[server] = len(self.slot_servers)
+        self.slot_servers.append(server)
+        self.weight.append(weight)
+        self.effective.append(weight)
+        self.current.append(0)
+        self.active.append(server in self.healthy_servers)
+
+    def add_to_rotation(self, server):
+        with self.lock:
+            changed = super().add_to_rotation(server)
+            if changed:
+                if server not in self.slot_of:
+                    self._add_slot(server)
+                self.active[self.slot_of[server]] = True
+        return changed
+
+    def remove_from_rotation(self, server):
+        with self.lock:
+            changed = super().remove_from_rotation(server)
+            if changed:
+                slot = self.slot_of[server]
+                self.active[slot] = False
+                self.current[slot] = 0
+        return changed
+
+    def remove_server(self, server):
+        super().remove_server(server)
+        with self.lock:
+            slot = self.slot_of.pop(server, None)
+            if slot is None:
+                return
+            # Move the last slot into the freed one
+            last = len(self.slot_servers) - 1
+            for values in (
+                self.slot_servers,
+                self.weight,
+                self.effective,
+                self.current,
+                self.active,
+            ):
+                values[slot] = values[last]
+                values.pop()
+            if slot < last:
+                self.slot_of[self.slot_servers[slot]] = slot
+            self.weights.pop(server, None)
 
     def assign_server(self, request=None):
         # assigning request to the current server
-        if not self.healthy_servers:
-            print(f"No healthy servers available for request {request}")
-            return None
-
-        # Filter servers to only include healthy ones
-        healthy_weights = {
-            server: self.weights.get(server, 1) for server in self.healthy_servers
-        }
-
-        if not healthy_weights:
-            return None
-
-        # Implementation of Smooth Weighted Round Robin
-        # This ensures more even distribution over time
-        server_list = list(healthy_weights.keys())
-
-        # If only one server, return it
-        if len(server_list) == 1:
-            return server_list[0]
-
-        # Get highest weight server
-        selected_server = None
-        highest_weight = 0
-
-        for server, weight in healthy_weights.items():
-            # We use a modifiable weight that gets updated each time
-            current_effective_weight = weight
-
-            if current_effective_weight > highest_weight:
-                highest_weight = current_effective_weight
-                selected_server = server
-
-        # Update weights for next selection
-        # This ensures that servers with higher weights get selected more often,
-        # but in a more distributed way over time
-        new_weights = {}
-        for server, weight in healthy_weights.items():
-            if server == selected_server:
-                new_weights[server] = weight - sum(healthy_weights.values()) + weight
-            else:
-                new_weights[server] = weight + weight
-
-        self.weights.update(new_weights)
+        with self.lock:
+            total = 0
+            best = -1
+            best_current = 0
+            current = self.current
+            effective = self.effective
+            active = self.active
+            # Warming servers run at a fraction of their effective weight
+            ramp = self.warming and {
+                self.slot_of[server]: self.slow_start_factor(server)
+                for server in list(self.warming)
+                if server in self.slot_of
+            }
+            for slot in range(len(current)):
+                if not active[slot] or effective[slot] <= 0:
+                    continue
+                weight = (
+                    effective[slot] * ramp.get(slot, 1) if ramp else effective[slot]
+                )
+                current[slot] += weight
+                total += weight
+                if best < 0 or current[slot] > best_current:
+                    best = slot
+                    best_current = current[slot]
+
+            if best < 0:
+                self.logger.warning("No healthy servers available")
+                return None
+
+            current[best] -= total
+            # A server recovers its effective weight gradually after failures
+            if effective[best] < self.weight[best]:
+                effective[best] = min(effective[best] + 1, self.weight[best])
+            selected_server = self.slot_servers[best]
 
         self.logger.debug(f"Selected server: {selected_server}")
         return selected_server
 
+    def record_request_metrics(self, server, response_time, error=False, status=None):
+        super().record_request_metrics(server, response_time, error, status)
+        if error and server in self.slot_of:
+            with self.lock:
+                slot = self.slot_of[server]
+                self.effective[slot] = max(
+                    self.effective[slot] - self.weight[slot] / self.max_fails, 0
+                )
+
     def update_weight(self, server, weight):
         """
         Update the weight of a server.
 
+        The server's current weight is kept, so the rotation continues
+        smoothly with the new weight instead of starting over.
+
         Args:
             server (str): The server to update.
             weight (int): The new weight.
         """
-        self.weights[server] = weight
-        self.max_weight = max(self.weights.values())
+        with self.lock:
+            if server not in self.slot_of:
+                self.weights[server] = weight
+                self._add_slot(server)
+            slot = self.slot_of[server]
+            self.weights[server] = weight
+            self.weight[slot] = weight
+            self.effective[slot] = weight
         self.logger.info(f"Updated weight for {server} to {weight}")
 
+    def get_metrics(self):
+        metrics = super().get_metrics()
+        metrics["weights"] = {
+            server: {
+                "weight": self.weight[slot],
+                "effective_weight": self.effective[slot],
+            }
+            for server, slot in self.slot_of.items()
+        }
+        return metrics
+
 
 # # Example usage
 # servers = ["Server A", "Server B", "Server C"]
-# weights = [3, 2, 1]  # Corresponding weights
+# weights = {"Server A": 3, "Server B": 2, "Server C": 1}
 # load_balancer = WeightedRoundRobinLoadBalancer(servers, weights)
 
 # # Simulate incoming requests
@@ -144,35 +206,3 @@ class WeightedRoundRobinLoadBalancer(BaseLoadBalancer):
 # requests = ["Req13", "Req14", "Req15", "Req16", "Req17", "Req18"]
 # for req in requests:
 #     load_balancer.assign_server(req)
-
-## test
-# Example usage
-servers = ["Server A", "Server B", "Server C"]
-weights = {"Server A": 3, "Server B": 2, "Server C": 1}
-load_balancer = WeightedRoundRobinLoadBalancer(servers, weights)
-
-# Simulate incoming requests
-requests = ["Req1", "Req2", "Req3", "Req4", "Req5", "Req6", "Req7"]
-for req in requests:
-    selected_server = load_balancer.assign_server(req)
-    print(f"Request {req} assigned to {selected_server}")
-
-# Mark Server B as unhealthy
-print("\nMarking Server B as unhealthy...")
-load_balancer.mark_unhealthy("Server B")
-
-# Simulate more requests
-requests = ["Req8", "Req9", "Req10", "Req11", "Req12"]
-for req in requests:
-    selected_server = load_balancer.assign_server(req)
-    print(f"Request {req} assigned to {selected_server}")
-
-# Mark Server B as healthy again
-print("\nMarking Server B as healthy...")
-load_balancer.mark_healthy("Server B")
-
-# Simulate more requests
-requests = ["Req13", "Req14", "Req15", "Req16", "Req17", "Req18"]
-for req in requests:
-    selected_server = load_balancer.assign_server(req)
-    print(f"Request {req} assigned to {selected_server}")
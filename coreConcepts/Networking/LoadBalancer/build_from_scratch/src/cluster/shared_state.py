@@ -0,0 +1,166 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+# Every slot is 8 bytes, so the same buffer can be viewed as int64 and float64
+SLOT = 8
+# Bytes reserved for a server URL, zero padded
+URL_SIZE = 256
+
+
+class SharedState:
+    """
+    Balancer state shared by all workers through a shared-memory segment.
+
+    Layout, one 8-byte slot per value:
+        health[server]          1 if the leader's health checks pass, else 0
+        health_version[server]  bumped on every health change
+        per worker row:
+            connections[server]     in-flight requests from this worker
+            latency_sum[server]     sum of the worker's recent response times
+            latency_count[server]   number of those response times
+        url[server]             the server's URL, URL_SIZE bytes
+
+    Each worker only writes its own row and only the leader writes health,
+    so no cross-process lock is needed: aligned 8-byte stores are atomic.
+    The one exception is giving a slot to a server added at runtime, which
+    takes a lock so that every worker agrees on the server's slot.
+    """
+
+    def __init__(self, servers, workers, capacity=None, name=None):
+        """
+        Create or attach to the shared segment.
+
+        Args:
+            servers (list): Initial server URLs, in index order.
+            workers (int): Number of worker processes.
+            capacity (int): Maximum number of servers, defaults to len(servers).
+            name (str): Attach to an existing segment instead of creating one.
+        """
+        self.workers = workers
+        self.capacity = capacity or len(servers)
+        self.index = {server: i for i, server in enumerate(servers[: self.capacity])}
+        self.row_size = 3 * self.capacity
+        self.url_offset = SLOT * (2 * self.capacity + workers * self.row_size)
+        size = self.url_offset + URL_SIZE * self.capacity
+        # Inherited by the forked workers
+        self.lock = multiprocessing.Lock()
+
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.ints = self.memory.buf.cast("q")
+        self.floats = self.memory.buf.cast("d")
+        if self.owner:
+            for server, i in self.index.items():
+                self.ints[i] = 1
+                self._write_url(i, server)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def server_index(self, server):
+        """
+        Get a server's slot, assigning the next free one to new servers.
+
+        Returns:
+            int: The slot, or None if the segment is full.
+        """
+        if server in self.index:
+            return self.index[server]
+        with self.lock:
+            # Another worker may have given the server a slot already
+            for i in range(self.capacity):
+                url = self._read_url(i)
+                if not url:
+                    break
+                if url == server:
+                    self.index[server] = i
+                    return i
+            else:
+                # Full, remembered so the segment is not scanned again
+                self.index[server] = None
+                return None
+            if len(server.encode("utf-8")) > URL_SIZE:
+                self.index[server] = None
+                return None
+            self.ints[i] = 1
+            self._write_url(i, server)
+            self.index[server] = i
+            return i
+
+    def _read_url(self, i):
+        start = self.url_offset + i * URL_SIZE
+        return (
+            bytes(self.memory.buf[start : start + URL_SIZE])
+            .rstrip(b"\0")
+            .decode("utf-8")
+        )
+
+    def _write_url(self, i, server):
+        start = self.url_offset + i * URL_SIZE
+        url = server.encode("utf-8")[:URL_SIZE].ljust(URL_SIZE, b"\0")
+        self.memory.buf[start : start + URL_SIZE] = url
+
+    def set_healthy(self, server, healthy):
+        i = self.server_index(server)
+        value = 1 if healthy else 0
+        if i is not None and self.ints[i] != value:
+            self.ints[i] = value
+            self.ints[self.capacity + i] += 1
+
+    def health(self, server):
+        """
+        Get a server's cluster health.
+
+        Returns:
+            tuple: (healthy, version) or None if the server has no slot.
+        """
+        i = self.server_index(server)
+        if i is None:
+            return None
+        return self.ints[i] == 1, self.ints[self.capacity + i]
+
+    def _row(self, worker):
+        return 2 * self.capacity + worker * self.row_size
+
+    def publish(self, worker, server, connections, latency_sum, latency_count):
+        """Write one worker's load for a server."""
+        i = self.server_index(server)
+        if i is None:
+            return
+        base = self._row(worker)
+        self.ints[base + i] = connections
+        self.floats[base + self.capacity + i] = latency_sum
+        self.ints[base + 2 * self.capacity + i] = latency_count
+
+    def totals(self, server):
+        """
+        Sum a server's load over all workers.
+
+        Returns:
+            tuple: (connections, latency_sum, latency_count) across the cluster.
+        """
+        i = self.server_index(server)
+        if i is None:
+            return 0, 0.0, 0
+        connections = 0
+        latency_sum = 0.0
+        latency_count = 0
+        for worker in range(self.workers):
+            base = self._row(worker)
+            connections += self.ints[base + i]
+            latency_sum += self.floats[base + self.capacity + i]
+            latency_count += self.ints[base + 2 * self.capacity + i]
+        return connections, latency_sum, latency_count
+
+    def close(self):
+        """Detach from the segment, removing it if this process created it."""
+        self.ints.release()
+        self.floats.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
@@ -0,0 +1,97 @@
+import os
+import signal
+import socket
+import logging
+from src.cluster.shared_state import SharedState
+from src.cluster.sync import ClusterSync
+
+
+class ClusterSupervisor:
+    """
+    Runs a proxy in several forked worker processes sharing one listening socket.
+
+    The kernel spreads incoming connections over the workers, so throughput
+    scales with cores. Balancer health and load live in a shared-memory
+    segment created before forking. Workers that die are restarted.
+    """
+
+    def __init__(self, proxy, workers, sync_interval=0.05, capacity=None, backlog=2048):
+        """
+        Initialize the supervisor.
+
+        Args:
+            proxy (LoadBalancerProxy): The proxy to run in every worker.
+            workers (int): Number of worker processes.
+            sync_interval (float): Seconds between shared state syncs in each worker.
+            capacity (int): Maximum number of servers in the shared segment.
+            backlog (int): Listen backlog of the shared socket.
+        """
+        self.proxy = proxy
+        self.workers = workers
+        self.sync_interval = sync_interval
+        self.capacity = capacity
+        self.backlog = backlog
+        self.children = {}
+        self.stopping = False
+        self.logger = logging.getLogger("ClusterSupervisor")
+
+    def bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.proxy.host, self.proxy.port))
+        sock.listen(self.backlog)
+        sock.set_inheritable(True)
+        return sock
+
+    def spawn(self, worker_id, sock, shared):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                self.proxy.cluster = ClusterSync(
+                    shared, worker_id, self.proxy.load_balancer, self.sync_interval
+                )
+                self.proxy.serve(sock)
+            except Exception:
+                self.logger.exception(f"Worker {worker_id} crashed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.children[pid] = worker_id
+        self.logger.info(f"Started worker {worker_id} (pid {pid})")
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        """Fork the workers and supervise them until a shutdown signal arrives."""
+        sock = self.bind()
+        shared = SharedState(
+            self.proxy.load_balancer.servers, self.workers, capacity=self.capacity
+        )
+        self.logger.info(
+            f"Starting {self.workers} workers on {self.proxy.host}:{self.proxy.port}"
+        )
+        try:
+            for worker_id in range(self.workers):
+                self.spawn(worker_id, sock, shared)
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+            while self.children:
+                pid, status = os.wait()
+                worker_id = self.children.pop(pid, None)
+                if worker_id is None or self.stopping:
+                    continue
+                self.logger.warning(
+                    f"Worker {worker_id} exited with status {status}, restarting"
+                )
+                self.spawn(worker_id, sock, shared)
+        finally:
+            sock.close()
+            shared.close()
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+
+
+class ClusterSync:
+    """
+    Keeps one worker's balancer in step with the rest of the cluster.
+
+    Worker 0 is the leader: it is the only worker that runs active health
+    checks, and it publishes every health change to shared memory. The other
+    workers apply those changes to their own balancer and to the pools of
+    the routes. Every worker publishes its own per-server load and feeds the
+    cluster-wide totals back into its algorithm, so load-aware algorithms
+    decide on global counts.
+    """
+
+    def __init__(self, shared, worker_id, load_balancer, interval=0.05):
+        """
+        Initialize the cluster sync.
+
+        Args:
+            shared (SharedState): Shared-memory state of the cluster.
+            worker_id (int): Index of this worker.
+            load_balancer: This worker's load balancer.
+            interval (float): Seconds between syncs.
+        """
+        self.shared = shared
+        self.worker_id = worker_id
+        self.leader = worker_id == 0
+        self.load_balancer = load_balancer
+        self.interval = interval
+        self.versions = {}
+        # Route pools whose health follows the leader, with their applied versions
+        self.followed = []
+        self.task = None
+        self.logger = logging.getLogger(f"ClusterSync[{worker_id}]")
+
+    def attach(self, health_checker, load_balancer=None):
+        """
+        Share a health checker's results with the cluster.
+
+        Args:
+            health_checker (HealthChecker): Checker whose transitions the leader publishes.
+            load_balancer: Pool the followers apply them to, if not this worker's
+                own balancer, e.g. a route's pool.
+        """
+        if self.leader:
+            health_checker.on_transition = self.shared.set_healthy
+        elif load_balancer is not None:
+            self.followed.append((load_balancer, {}))
+
+    async def start(self):
+        self.task = asyncio.create_task(self.sync_loop())
+        role = "leader" if self.leader else "follower"
+        self.logger.info(f"Started cluster sync as {role}")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    async def sync_loop(self):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                self.logger.error(f"Cluster sync failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def sync(self):
+        """Publish this worker's load and apply the cluster's health and load."""
+        load_balancer = self.load_balancer
+        for server in load_balancer.servers:
+            self.shared.publish(
+                self.worker_id, server, *load_balancer.local_load(server)
+            )
+
+        loads = {}
+        for server in load_balancer.servers:
+            if not self.leader:
+                self.follow_health(load_balancer, server, self.versions)
+            loads[server] = self.shared.totals(server)
+        load_balancer.apply_cluster_load(loads)
+
+        # Route pools share health only, their load stays per worker
+        for pool, versions in self.followed:
+            for server in list(pool.servers):
+                self.follow_health(pool, server, versions)
+
+    def follow_health(self, load_balancer, server, versions):
+        """Apply the leader's latest health change of a server, if not applied yet."""
+        state = self.shared.health(server)
+        if state is None:
+            return
+        healthy, version = state
+        if versions.get(server, 0) != version:
+            versions[server] = version
+            if healthy:
+                load_balancer.mark_healthy(server)
+            else:
+                load_balancer.mark_unhealthy(server)
@@ -1,11 +1,27 @@
 # src/main.py
 import os
+import json
 import logging
 from src.proxy.http_proxy import LoadBalancerProxy
+from src.proxy.raw_proxy import RawHttpProxy, TcpPassthroughProxy
+from src.proxy.upstream import UpstreamClient
+from src.proxy.health import HealthChecker
+from src.proxy.retry import RetryPolicy, RetryBudget
+from src.proxy.membership import MembershipManager
+from src.proxy.cache import ResponseCache
+from src.proxy.singleflight import Singleflight
+from src.proxy.admission import AdmissionController, GradientLimit
+from src.proxy.routing import RoutingTable, Route
+from src.proxy.headers import HeaderPipeline
+from src.proxy.access_log import AccessLog
+from src.cluster.supervisor import ClusterSupervisor
 from src.algorithms.round_robin import RoundRobinLoadBalancer
 from src.algorithms.weighted_round_robin import WeightedRoundRobinLoadBalancer
 from src.algorithms.least_connection import LeastConnectionsLoadBalancer
 from src.algorithms.least_response_time import LeastResponseTimeLoadBalancer
+from src.algorithms.peak_ewma import PeakEwmaLoadBalancer
+from src.algorithms.consistent_hash import ConsistentHashLoadBalancer
+from src.algorithms.locality import LocalityAwareLoadBalancer
 
 # Configure logging
 logging.basicConfig(
@@ -44,11 +60,80 @@ def create_load_balancer(algorithm, servers):
         logger.info("Entering rleast response time")
         
         return LeastResponseTimeLoadBalancer(servers)
+    elif algorithm == "peak_ewma":
+        logger.info("Entering peak EWMA")
+
+        return PeakEwmaLoadBalancer(
+            servers,
+            decay_time=float(os.environ.get("PEAK_EWMA_DECAY_TIME", 10)),
+            default_rtt=float(os.environ.get("PEAK_EWMA_DEFAULT_RTT", 0.1)),
+        )
+    elif algorithm == "consistent_hash":
+        logger.info("Entering consistent hash")
+
+        return ConsistentHashLoadBalancer(
+            servers,
+            key=os.environ.get("HASH_KEY", "header:x-user-id"),
+            virtual_nodes=int(os.environ.get("HASH_VIRTUAL_NODES", 100)),
+            load_factor=float(os.environ.get("HASH_LOAD_FACTOR", 1.25)),
+        )
     else:
         logger.warning(f"Unknown algorithm: {algorithm}, defaulting to round_robin")
         return RoundRobinLoadBalancer(servers)
 
 
+def create_routes(
+    path, algorithm, upstream, breaker_options, slow_start_options, health_options
+):
+    """
+    Create the routing table described by a JSON file.
+
+    The file lists routes, each with its own backends and optionally its own
+    algorithm, health check path and read timeout:
+
+        {"routes": [{"name": "api", "prefix": "/api", "host": "example.com",
+                     "backends": ["http://api1:5000"], "algorithm": "least_connections",
+                     "health_path": "/health", "timeout": 5}]}
+
+    Args:
+        path (str): Path of the routes file.
+        algorithm (str): Algorithm of routes that do not name one.
+        upstream (UpstreamClient): Shared upstream connection pools.
+        breaker_options (dict): Circuit breaker settings for every route.
+        slow_start_options (dict): Slow start settings for every route.
+        health_options (dict): Health check settings for every route.
+
+    Returns:
+        RoutingTable: The routes.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    routes = RoutingTable()
+    for entry in config["routes"]:
+        route_balancer = create_load_balancer(
+            entry.get("algorithm", algorithm), entry["backends"]
+        )
+        route_balancer.configure_circuit_breakers(**breaker_options)
+        route_balancer.configure_slow_start(**slow_start_options)
+        health_checker = HealthChecker(
+            route_balancer,
+            upstream,
+            path=entry.get("health_path", "/health"),
+            **health_options,
+        )
+        routes.add(
+            Route(
+                entry["name"],
+                route_balancer,
+                host=entry.get("host"),
+                prefix=entry.get("prefix", "/"),
+                health_checker=health_checker,
+                timeout=entry.get("timeout"),
+            )
+        )
+    return routes
+
+
 def main():
     # Get configuration from environment
     algorithm = os.environ.get("ALGORITHM", "round_robin")
@@ -65,11 +150,214 @@ def main():
     logger.info(f"Backend servers: {backend_servers}")
 
     # Create the load balancer
-    load_balancer = create_load_balancer(algorithm, backend_servers)
+    local_zone = os.environ.get("LOCAL_ZONE")
+    backend_metadata = os.environ.get("BACKEND_METADATA")
+    if local_zone or backend_metadata:
+        # Each zone and priority tier is balanced by its own instance of the algorithm
+        load_balancer = LocalityAwareLoadBalancer(
+            backend_servers,
+            lambda servers: create_load_balancer(algorithm, servers),
+            metadata=json.loads(backend_metadata) if backend_metadata else None,
+            local_zone=local_zone,
+            health_threshold=float(os.environ.get("LOCALITY_HEALTH_THRESHOLD", 0.7)),
+        )
+    else:
+        load_balancer = create_load_balancer(algorithm, backend_servers)
+    slow_threshold = os.environ.get("CB_SLOW_THRESHOLD")
+    breaker_options = dict(
+        window_size=int(os.environ.get("CB_WINDOW_SIZE", 100)),
+        min_requests=int(os.environ.get("CB_MIN_REQUESTS", 20)),
+        error_threshold=float(os.environ.get("CB_ERROR_THRESHOLD", 0.5)),
+        consecutive_failures=int(os.environ.get("CB_CONSECUTIVE_FAILURES", 5)),
+        slow_threshold=float(slow_threshold) if slow_threshold else None,
+        open_duration=float(os.environ.get("CB_OPEN_DURATION", 1)),
+        half_open_requests=int(os.environ.get("CB_HALF_OPEN_REQUESTS", 3)),
+    )
+    load_balancer.configure_circuit_breakers(**breaker_options)
+    slow_start_options = dict(
+        duration=float(os.environ.get("SLOW_START_DURATION", 0)),
+        min_factor=float(os.environ.get("SLOW_START_MIN_FACTOR", 0.1)),
+        aggression=float(os.environ.get("SLOW_START_AGGRESSION", 1)),
+    )
+    load_balancer.configure_slow_start(**slow_start_options)
+
+    # Shared upstream connection pools
+    upstream = UpstreamClient(
+        pool_size=int(os.environ.get("UPSTREAM_POOL_SIZE", 100)),
+        keepalive_pool_size=int(os.environ.get("UPSTREAM_KEEPALIVE_POOL_SIZE", 20)),
+        idle_timeout=float(os.environ.get("UPSTREAM_IDLE_TIMEOUT", 30)),
+        connect_timeout=float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", 2)),
+        read_timeout=float(os.environ.get("UPSTREAM_READ_TIMEOUT", 10)),
+        http2=os.environ.get("UPSTREAM_HTTP2", "false").lower() == "true",
+        max_streams=int(os.environ.get("UPSTREAM_MAX_STREAMS", 100)),
+        h2_connections=int(os.environ.get("UPSTREAM_H2_CONNECTIONS", 2)),
+    )
+
+    # Active health checks
+    health_options = dict(
+        interval=float(os.environ.get("HEALTH_CHECK_INTERVAL", 5)),
+        timeout=float(os.environ.get("HEALTH_CHECK_TIMEOUT", 2)),
+        rise=int(os.environ.get("HEALTH_CHECK_RISE", 2)),
+        fall=int(os.environ.get("HEALTH_CHECK_FALL", 3)),
+        max_backoff=float(os.environ.get("HEALTH_CHECK_MAX_BACKOFF", 60)),
+    )
+    health_checker = HealthChecker(load_balancer, upstream, **health_options)
+
+    # Per-route backend pools
+    routes = None
+    if os.environ.get("ROUTES_CONFIG"):
+        routes = create_routes(
+            os.environ["ROUTES_CONFIG"],
+            algorithm,
+            upstream,
+            breaker_options,
+            slow_start_options,
+            health_options,
+        )
+
+    # Retries and hedging for idempotent requests
+    retry_policy = RetryPolicy(
+        max_retries=int(os.environ.get("RETRY_MAX", 2)),
+        budget=RetryBudget(
+            ratio=float(os.environ.get("RETRY_BUDGET_RATIO", 0.1)),
+            min_per_second=float(os.environ.get("RETRY_MIN_PER_SECOND", 10)),
+        ),
+        hedging=os.environ.get("HEDGING", "false").lower() == "true",
+        hedge_quantile=float(os.environ.get("HEDGE_QUANTILE", 0.95)),
+        hedge_min_delay=float(os.environ.get("HEDGE_MIN_DELAY", 0.01)),
+    )
+
+    # Runtime changes to the backend pool
+    membership = MembershipManager(
+        load_balancer,
+        health_checker,
+        upstream,
+        config_path=os.environ.get("BACKEND_CONFIG"),
+        watch_interval=float(os.environ.get("BACKEND_CONFIG_INTERVAL", 2)),
+        drain_timeout=float(os.environ.get("DRAIN_TIMEOUT", 30)),
+    )
 
     # Create and run the proxy
-    proxy = LoadBalancerProxy(load_balancer, host, port)
-    proxy.run()
+    cache = None
+    if os.environ.get("CACHE", "false").lower() == "true":
+        cache = ResponseCache(
+            max_bytes=int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+            max_entry_bytes=int(os.environ.get("CACHE_MAX_ENTRY_BYTES", 1024 * 1024)),
+            default_ttl=float(os.environ.get("CACHE_DEFAULT_TTL", 0)),
+            stale_while_revalidate=os.environ.get(
+                "CACHE_STALE_WHILE_REVALIDATE", "true"
+            ).lower()
+            == "true",
+        )
+
+    singleflight = None
+    if os.environ.get("SINGLEFLIGHT", "false").lower() == "true":
+        singleflight_routes = os.environ.get("SINGLEFLIGHT_ROUTES")
+        singleflight = Singleflight(
+            key_headers=[
+                name.strip()
+                for name in os.environ.get(
+                    "SINGLEFLIGHT_KEY_HEADERS",
+                    "accept,accept-encoding,authorization,cookie",
+                ).split(",")
+                if name.strip()
+            ],
+            routes=[route.strip() for route in singleflight_routes.split(",")]
+            if singleflight_routes
+            else None,
+            max_flights=int(os.environ.get("SINGLEFLIGHT_MAX_FLIGHTS", 10000)),
+            max_waiters=int(os.environ.get("SINGLEFLIGHT_MAX_WAITERS", 1000)),
+        )
+
+    admission = None
+    if os.environ.get("ADMISSION", "false").lower() == "true":
+        admission = AdmissionController(
+            GradientLimit(
+                initial_limit=float(os.environ.get("ADMISSION_INITIAL_LIMIT", 20)),
+                min_limit=float(os.environ.get("ADMISSION_MIN_LIMIT", 4)),
+                max_limit=float(os.environ.get("ADMISSION_MAX_LIMIT", 1000)),
+                tolerance=float(os.environ.get("ADMISSION_TOLERANCE", 1.5)),
+            ),
+            max_queue=int(os.environ.get("ADMISSION_QUEUE_SIZE", 100)),
+            queue_timeout=float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 1)),
+            priority_header=os.environ.get("ADMISSION_PRIORITY_HEADER", "x-priority"),
+        )
+    backend_max_inflight = os.environ.get("BACKEND_MAX_INFLIGHT")
+
+    # Access log: "-" for standard output, a file path, or "off"
+    access_log = None
+    access_log_target = os.environ.get("ACCESS_LOG", "-")
+    if access_log_target.lower() != "off":
+        slow_threshold = os.environ.get("ACCESS_LOG_SLOW_THRESHOLD")
+        access_log = AccessLog(
+            path=access_log_target if access_log_target != "-" else None,
+            sample_rate=float(os.environ.get("ACCESS_LOG_SAMPLE_RATE", 1)),
+            always_log_errors=os.environ.get(
+                "ACCESS_LOG_ALWAYS_LOG_ERRORS", "true"
+            ).lower()
+            == "true",
+            slow_threshold=float(slow_threshold) if slow_threshold else None,
+            max_buffer=int(os.environ.get("ACCESS_LOG_BUFFER", 8192)),
+        )
+
+    header_pipeline = HeaderPipeline(
+        request_id_header=os.environ.get("REQUEST_ID_HEADER", "x-request-id")
+    )
+    engine = os.environ.get("ENGINE", "fastapi").lower()
+    if engine in ("http", "tcp"):
+        # Lean asyncio engines: raw HTTP/1.1 forwarding or TCP passthrough
+        engine_class = RawHttpProxy if engine == "http" else TcpPassthroughProxy
+        if routes is not None:
+            logger.warning("ROUTES_CONFIG is only used by the fastapi engine")
+        proxy = engine_class(
+            load_balancer,
+            host,
+            port,
+            upstream=upstream,
+            health_checker=health_checker,
+            connect_timeout=float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", 2)),
+            max_idle_per_backend=int(
+                os.environ.get("UPSTREAM_KEEPALIVE_POOL_SIZE", 20)
+            ),
+            membership=membership,
+            header_pipeline=header_pipeline,
+        )
+    else:
+        proxy = LoadBalancerProxy(
+            load_balancer,
+            host,
+            port,
+            upstream=upstream,
+            streaming=os.environ.get("STREAMING", "false").lower() == "true",
+            chunk_size=int(os.environ.get("STREAM_CHUNK_SIZE", 64 * 1024)),
+            health_checker=health_checker,
+            retry_policy=retry_policy,
+            membership=membership,
+            admin_token=os.environ.get("ADMIN_TOKEN"),
+            cache=cache,
+            singleflight=singleflight,
+            admission=admission,
+            max_inflight_per_backend=(
+                int(backend_max_inflight) if backend_max_inflight else None
+            ),
+            routes=routes,
+            header_pipeline=header_pipeline,
+            access_log=access_log,
+        )
+    logger.info(f"Using {engine} engine")
+    workers = int(os.environ.get("WORKERS", 1))
+    if workers > 1:
+        ClusterSupervisor(
+            proxy,
+            workers,
+            sync_interval=float(os.environ.get("CLUSTER_SYNC_INTERVAL", 0.05)),
+            # Room in the shared segment for backends added at runtime
+            capacity=max(
+                len(backend_servers), int(os.environ.get("CLUSTER_MAX_SERVERS", 64))
+            ),
+        ).run()
+    else:
+        proxy.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+from bisect import bisect_left
+
+# Upper bounds (in seconds) for latency buckets, Prometheus style
+DEFAULT_LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram with a preallocated count per bucket."""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """
+        Initialize the histogram.
+
+        Args:
+            buckets (tuple): Sorted bucket upper bounds. Values above the last
+                bound fall into an implicit +Inf bucket.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Record a single value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    @classmethod
+    def merged(cls, histograms):
+        """
+        Combine histograms with identical buckets into a new one.
+
+        Args:
+            histograms (list): Histograms to combine.
+
+        Returns:
+            Histogram: Histogram holding every recorded value.
+        """
+        result = cls(histograms[0].buckets)
+        for histogram in histograms:
+            for i, bucket_count in enumerate(histogram.counts):
+                result.counts[i] += bucket_count
+            result.count += histogram.count
+            result.sum += histogram.sum
+            result.max = max(result.max, histogram.max)
+        return result
+
+    def quantile(self, q):
+        """
+        Estimate a quantile as the upper bound of the bucket containing it.
+
+        Args:
+            q (float): Quantile between 0 and 1.
+
+        Returns:
+            float: Bucket upper bound, the largest recorded value for the
+                overflow bucket, or 0 if nothing has been recorded.
+        """
+        if self.count == 0:
+            return 0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self):
+        """
+        Get a snapshot of the histogram.
+
+        Returns:
+            dict: Cumulative bucket counts keyed by upper bound, plus totals.
+        """
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
@@ -0,0 +1,220 @@
+from src.metrics.histogram import Histogram, DEFAULT_LATENCY_BUCKETS
+
+# Connection errors and timeouts have no status code and are counted as "error"
+STATUS_CLASSES = ("error", "1xx", "2xx", "3xx", "4xx", "5xx")
+# Why the algorithm's pick was used: first attempt, retry after a failure, or hedge
+DECISIONS = ("primary", "retry", "hedge")
+
+
+def status_class_index(status, error=False):
+    """Map a status code to its index in STATUS_CLASSES."""
+    if status is None:
+        return 0 if error else 2
+    return min(max(status // 100, 1), 5)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class BackendMetrics:
+    """Preallocated counters and latency histograms for one backend."""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.requests = [0] * len(STATUS_CLASSES)
+        self.latency = [Histogram(buckets) for _ in STATUS_CLASSES]
+        self.selections = [0] * len(DECISIONS)
+
+    def quantile(self, q):
+        """Estimate a latency quantile across all status classes."""
+        return Histogram.merged(self.latency).quantile(q)
+
+
+class MetricsRegistry:
+    """
+    Per-backend request metrics.
+
+    Everything a request touches is allocated when the backend is first
+    seen, so recording a request only increments existing counters.
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """
+        Initialize the registry.
+
+        Args:
+            buckets (tuple): Latency histogram bucket upper bounds in seconds.
+        """
+        self.buckets = tuple(buckets)
+        self.backends = {}
+
+    def backend(self, server):
+        """Get the metrics of a backend, creating them on first use."""
+        metrics = self.backends.get(server)
+        if metrics is None:
+            metrics = BackendMetrics(self.buckets)
+            self.backends[server] = metrics
+        return metrics
+
+    def record_request(self, server, response_time, status=None, error=False):
+        """
+        Record a completed request.
+
+        Args:
+            server (str): The server that handled the request.
+            response_time (float): The time taken to process the request.
+            status (int): Upstream status code, or None if there was no response.
+            error (bool): Whether the request resulted in an error.
+        """
+        metrics = self.backend(server)
+        i = status_class_index(status, error)
+        metrics.requests[i] += 1
+        metrics.latency[i].observe(response_time)
+
+    def record_selection(self, server, decision="primary"):
+        """
+        Record that the algorithm picked a server.
+
+        Args:
+            server (str): The selected server.
+            decision (str): One of DECISIONS.
+        """
+        self.backend(server).selections[DECISIONS.index(decision)] += 1
+
+    def summary(self):
+        """
+        Get per-backend totals and latency quantiles.
+
+        Returns:
+            dict: Requests per status class and p50/p99 latency per backend.
+        """
+        return {
+            server: {
+                "requests": dict(zip(STATUS_CLASSES, metrics.requests)),
+                "selections": dict(zip(DECISIONS, metrics.selections)),
+                "p50": metrics.quantile(0.5),
+                "p99": metrics.quantile(0.99),
+            }
+            for server, metrics in self.backends.items()
+        }
+
+    def render(self, load_balancer, extra=None, routes=()):
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Args:
+            load_balancer: The load balancer, for health and breaker state.
+            extra (dict): Additional gauge or counter values by metric name.
+            routes (iterable): Routes whose pools are rendered too, with a `route`
+                label, from their own load balancer's registry.
+
+        Returns:
+            str: Metrics text.
+        """
+        pools = [("", load_balancer, self)] + [
+            (
+                f'route="{escape_label(route.name)}",',
+                route.load_balancer,
+                route.load_balancer.backend_metrics,
+            )
+            for route in routes
+        ]
+
+        lines = [
+            "# HELP lb_info Load balancing algorithm in use.",
+            "# TYPE lb_info gauge",
+        ]
+        for pool, balancer, _ in pools:
+            lines.append(
+                f'lb_info{{{pool}algorithm="{balancer.__class__.__name__}"}} 1'
+            )
+
+        lines.append("# HELP lb_backend_healthy Whether the backend is in rotation.")
+        lines.append("# TYPE lb_backend_healthy gauge")
+        for pool, balancer, registry in pools:
+            servers = list(balancer.servers)
+            servers += [server for server in registry.backends if server not in servers]
+            for server in servers:
+                healthy = 1 if server in balancer.healthy_servers else 0
+                lines.append(
+                    f'lb_backend_healthy{{{pool}backend="{escape_label(server)}"}} {healthy}'
+                )
+
+        lines.append(
+            "# HELP lb_circuit_breaker_state Breaker state (0 closed, 1 half-open, 2 open)."
+        )
+        lines.append("# TYPE lb_circuit_breaker_state gauge")
+        states = {"closed": 0, "half_open": 1, "open": 2}
+        for pool, balancer, _ in pools:
+            for server, breaker in balancer.breakers.items():
+                lines.append(
+                    f'lb_circuit_breaker_state{{{pool}backend="{escape_label(server)}"}} {states[breaker.state]}'
+                )
+
+        lines.append(
+            "# HELP lb_backend_slow_start_factor Share of its normal traffic the backend gets while ramping up."
+        )
+        lines.append("# TYPE lb_backend_slow_start_factor gauge")
+        for pool, balancer, _ in pools:
+            for server in balancer.servers:
+                lines.append(
+                    f'lb_backend_slow_start_factor{{{pool}backend="{escape_label(server)}"}} {balancer.slow_start_factor(server)}'
+                )
+
+        lines.append(
+            "# HELP lb_backend_selections_total Times the algorithm picked the backend."
+        )
+        lines.append("# TYPE lb_backend_selections_total counter")
+        for pool, _, registry in pools:
+            for server, metrics in registry.backends.items():
+                label = escape_label(server)
+                for decision, value in zip(DECISIONS, metrics.selections):
+                    lines.append(
+                        f'lb_backend_selections_total{{{pool}backend="{label}",decision="{decision}"}} {value}'
+                    )
+
+        lines.append(
+            "# HELP lb_requests_total Proxied requests by backend and status class."
+        )
+        lines.append("# TYPE lb_requests_total counter")
+        for pool, _, registry in pools:
+            for server, metrics in registry.backends.items():
+                label = escape_label(server)
+                for status_class, value in zip(STATUS_CLASSES, metrics.requests):
+                    lines.append(
+                        f'lb_requests_total{{{pool}backend="{label}",status_class="{status_class}"}} {value}'
+                    )
+
+        lines.append(
+            "# HELP lb_request_duration_seconds Upstream latency by backend and status class."
+        )
+        lines.append("# TYPE lb_request_duration_seconds histogram")
+        for pool, _, registry in pools:
+            for server, metrics in registry.backends.items():
+                label = escape_label(server)
+                for status_class, histogram in zip(STATUS_CLASSES, metrics.latency):
+                    if histogram.count == 0:
+                        continue
+                    labels = f'{pool}backend="{label}",status_class="{status_class}"'
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(
+                            f'lb_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                        )
+                    lines.append(
+                        f'lb_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}'
+                    )
+                    lines.append(
+                        f"lb_request_duration_seconds_sum{{{labels}}} {histogram.sum}"
+                    )
+                    lines.append(
+                        f"lb_request_duration_seconds_count{{{labels}}} {histogram.count}"
+                    )
+
+        for name, value in (extra or {}).items():
+            metric_type = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,181 @@
+import json
+import logging
+import random
+import sys
+import threading
+from collections import deque
+
+# Fields of an access log record, in the order they are passed to `log`
+FIELDS = (
+    "time",
+    "request_id",
+    "method",
+    "path",
+    "status",
+    "duration_ms",
+    "backend",
+    "route",
+    "client",
+)
+
+
+class AccessLog:
+    """
+    Structured access log written off the event loop.
+
+    Serving a request only decides whether to keep its record and appends a
+    tuple to a bounded buffer. A writer thread takes the buffer in batches,
+    encodes each record as one line of compact JSON and writes the batch at
+    once. When the buffer is full, new records are dropped and counted
+    instead of making requests wait for the disk.
+
+    A `sample_rate` share of requests is logged. Requests answered with a
+    5xx status and requests slower than `slow_threshold` are always logged.
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        path=None,
+        sample_rate=1.0,
+        always_log_errors=True,
+        slow_threshold=None,
+        max_buffer=8192,
+        flush_interval=0.2,
+    ):
+        """
+        Initialize the access log.
+
+        Args:
+            stream: Text stream to write to, standard output if neither it nor
+                `path` is given.
+            path (str): File to append to.
+            sample_rate (float): Share of requests to log, between 0 and 1.
+            always_log_errors (bool): Log every request answered with a 5xx status.
+            slow_threshold (float): Seconds above which a request is always logged,
+                or None.
+            max_buffer (int): Most records waiting for the writer.
+            flush_interval (float): Seconds the writer waits for more records.
+        """
+        self.stream = stream
+        self.path = path
+        self.sample_rate = sample_rate
+        self.always_log_errors = always_log_errors
+        self.slow_threshold = slow_threshold
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        # Appended by the event loop and consumed by the writer, both thread-safe on a deque
+        self.buffer = deque()
+        self.stopped = threading.Event()
+        self.writer = None
+        self.logger = logging.getLogger("AccessLog")
+
+        self.written = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def log(
+        self, start, request_id, method, path, status, duration, backend, route, client
+    ):
+        """
+        Record a finished request, unless it is sampled out or the buffer is full.
+
+        Args:
+            start (float): Epoch time the request arrived.
+            request_id (bytes): ID of the request.
+            method (str): HTTP method.
+            path (str): Request path.
+            status (int): Status of the response.
+            duration (float): Seconds until the response was ready.
+            backend (str): Backend that answered, or None.
+            route (str): Name of the matched route, or None.
+            client (str): Client address, or None.
+        """
+        if not (
+            (self.always_log_errors and status >= 500)
+            or (self.slow_threshold is not None and duration >= self.slow_threshold)
+            or self.sample_rate >= 1
+            or random.random() < self.sample_rate
+        ):
+            self.sampled_out += 1
+            return
+        if len(self.buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self.buffer.append(
+            (start, request_id, method, path, status, duration, backend, route, client)
+        )
+
+    def encode(self, record):
+        """Encode a record as a line of compact JSON."""
+        values = dict(zip(FIELDS, record))
+        values["time"] = round(values["time"], 3)
+        values["request_id"] = values["request_id"].decode("latin-1")
+        values["duration_ms"] = round(values["duration_ms"] * 1000, 2)
+        return json.dumps(
+            {key: value for key, value in values.items() if value is not None},
+            separators=(",", ":"),
+        )
+
+    def flush(self, output):
+        """Write every buffered record as one batch."""
+        buffer = self.buffer
+        lines = []
+        while buffer:
+            lines.append(self.encode(buffer.popleft()))
+        if not lines:
+            return
+        try:
+            output.write("\n".join(lines) + "\n")
+            output.flush()
+            self.written += len(lines)
+        except (OSError, ValueError) as e:
+            self.write_errors += 1
+            self.logger.error(f"Could not write {len(lines)} access log records: {e}")
+
+    def run(self, output):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush(output)
+        self.flush(output)
+        if self.path is not None:
+            output.close()
+
+    def start(self):
+        """Start the writer thread."""
+        if self.writer is not None:
+            return
+        if self.path is not None:
+            output = open(self.path, "a", buffering=1024 * 1024)
+        else:
+            output = self.stream or sys.stdout
+        self.stopped.clear()
+        self.writer = threading.Thread(
+            target=self.run, args=(output,), name="access-log", daemon=True
+        )
+        self.writer.start()
+        self.logger.info(f"Writing access log to {self.path or 'stream'}")
+
+    def stop(self):
+        """Write the remaining records and stop the writer thread."""
+        if self.writer is None:
+            return
+        self.stopped.set()
+        self.writer.join()
+        self.writer = None
+
+    def get_metrics(self):
+        """
+        Get access log statistics.
+
+        Returns:
+            dict: Records written, sampled out, dropped on a full buffer and waiting.
+        """
+        return {
+            "written": self.written,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "buffered": len(self.buffer),
+            "write_errors": self.write_errors,
+            "sample_rate": self.sample_rate,
+        }
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import math
+from collections import deque
+
+# Priority classes, most important first
+PRIORITIES = ("critical", "normal", "low")
+NORMAL = PRIORITIES.index("normal")
+
+
+class GradientLimit:
+    """
+    Concurrency limit that follows the latency of upstream requests.
+
+    A long-term average of the round trip time stands in for the latency
+    without queueing. While recent requests are as fast as that, the limit
+    grows by about the square root of itself per sample; once they get
+    slower, it shrinks in proportion, down to half per sample. Failed
+    requests cut the limit by `backoff`. This is the gradient algorithm of
+    Netflix's concurrency-limits library with an AIMD style backoff on drops.
+    """
+
+    def __init__(
+        self,
+        initial_limit=20,
+        min_limit=4,
+        max_limit=1000,
+        tolerance=1.5,
+        smoothing=0.2,
+        long_window=600,
+        short_window=10,
+        backoff=0.9,
+    ):
+        """
+        Initialize the limit.
+
+        Args:
+            initial_limit (float): Limit before any request has finished.
+            min_limit (float): Lowest limit.
+            max_limit (float): Highest limit.
+            tolerance (float): How much slower than the long-term average requests
+                may get before the limit shrinks.
+            smoothing (float): Weight of each new limit estimate.
+            long_window (int): Samples in the long-term latency average.
+            short_window (int): Samples in the recent latency average.
+            backoff (float): Factor applied to the limit when a request fails.
+        """
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.long_window = long_window
+        self.short_window = short_window
+        self.backoff = backoff
+        self.long_rtt = None
+        self.short_rtt = None
+
+    def update(self, rtt, inflight, dropped=False):
+        """
+        Adjust the limit for a finished request.
+
+        Args:
+            rtt (float): Seconds the request took.
+            inflight (int): Requests in flight when it finished, itself included.
+            dropped (bool): Whether the request failed without a response.
+        """
+        if dropped:
+            self.limit = max(self.limit * self.backoff, self.min_limit)
+            return
+        if self.long_rtt is None:
+            self.long_rtt = self.short_rtt = rtt
+            return
+        self.short_rtt += (rtt - self.short_rtt) / self.short_window
+        self.long_rtt += (rtt - self.long_rtt) / self.long_window
+        if self.long_rtt / self.short_rtt > 2:
+            # Latency dropped a lot, let the baseline catch up
+            self.long_rtt *= 0.95
+
+        # Too little traffic to learn anything about the limit
+        if inflight < self.limit / 2:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+        estimate = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - self.smoothing) + estimate * self.smoothing
+        self.limit = max(self.min_limit, min(limit, self.max_limit))
+
+
+class AdmissionController:
+    """
+    Bounds the requests in flight to the backends.
+
+    Requests over the adaptive limit wait in a bounded queue, the most
+    important priority class first. When the queue is full, a queued request
+    of a lower class is shed to make room, otherwise the new request is.
+    Requests that wait longer than `queue_timeout` are shed too, so that
+    overload turns into fast 503s instead of timeouts.
+    """
+
+    def __init__(
+        self,
+        limit=None,
+        max_queue=100,
+        queue_timeout=1.0,
+        priority_header="x-priority",
+    ):
+        """
+        Initialize the admission controller.
+
+        Args:
+            limit (GradientLimit): Adaptive concurrency limit.
+            max_queue (int): Most requests waiting for a slot.
+            queue_timeout (float): Longest wait for a slot in seconds.
+            priority_header (str): Request header naming the priority class,
+                one of critical, normal and low.
+        """
+        self.limit = limit or GradientLimit()
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.priority_header = priority_header
+        self.inflight = 0
+        self.queues = [deque() for _ in PRIORITIES]
+        self.queued = 0
+        self.logger = logging.getLogger("AdmissionController")
+
+        self.admitted = 0
+        self.waited = 0
+        self.shed = [0 for _ in PRIORITIES]
+        self.timeouts = 0
+
+    def priority(self, headers):
+        """Get the priority class of a request from its headers."""
+        value = (headers.get(self.priority_header) or "").strip().lower()
+        return PRIORITIES.index(value) if value in PRIORITIES else NORMAL
+
+    async def acquire(self, priority):
+        """
+        Wait for a slot to send a request upstream.
+
+        Args:
+            priority (int): Index of the request's priority class.
+
+        Returns:
+            bool: True if the request was admitted, False if it was shed.
+        """
+        if self.inflight < self.limit.limit and not self.queued:
+            self.inflight += 1
+            self.admitted += 1
+            return True
+
+        if self.queued >= self.max_queue:
+            lowest = next(
+                (i for i in range(len(PRIORITIES) - 1, -1, -1) if self.queues[i]),
+                None,
+            )
+            if lowest is None or lowest <= priority:
+                self.shed[priority] += 1
+                return False
+            # Shed the newest request of the least important class instead
+            victim = self.queues[lowest].pop()
+            self.queued -= 1
+            if not victim.done():
+                self.shed[lowest] += 1
+                victim.set_result(False)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queues[priority].append(future)
+        self.queued += 1
+        self.waited += 1
+        timer = loop.call_later(self.queue_timeout, self.expire, priority, future)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # The client went away while waiting
+            if not self.dequeue(priority, future) and future.done():
+                if not future.cancelled() and future.result():
+                    self.free()
+            raise
+        finally:
+            timer.cancel()
+
+    def dequeue(self, priority, future):
+        try:
+            self.queues[priority].remove(future)
+        except ValueError:
+            return False
+        self.queued -= 1
+        return True
+
+    def expire(self, priority, future):
+        """Shed a request that waited too long for a slot."""
+        if not future.done() and self.dequeue(priority, future):
+            self.timeouts += 1
+            self.shed[priority] += 1
+            future.set_result(False)
+
+    def release(self, rtt, dropped=False):
+        """
+        Free the slot of a finished request and admit queued ones.
+
+        Args:
+            rtt (float): Seconds the request took upstream.
+            dropped (bool): Whether the request failed without a response.
+        """
+        self.limit.update(rtt, self.inflight, dropped)
+        self.free()
+
+    def free(self):
+        self.inflight -= 1
+        while self.queued and self.inflight < self.limit.limit:
+            queue = next(queue for queue in self.queues if queue)
+            future = queue.popleft()
+            self.queued -= 1
+            if future.done():
+                continue
+            self.inflight += 1
+            self.admitted += 1
+            future.set_result(True)
+
+    def get_metrics(self):
+        """
+        Get admission control statistics.
+
+        Returns:
+            dict: Current limit, requests in flight and queued, and shed requests per class.
+        """
+        return {
+            "limit": round(self.limit.limit, 2),
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "waited": self.waited,
+            "timeouts": self.timeouts,
+            "shed": dict(zip(PRIORITIES, self.shed)),
+            "latency": {
+                "long_term": self.limit.long_rtt,
+                "recent": self.limit.short_rtt,
+            },
+        }
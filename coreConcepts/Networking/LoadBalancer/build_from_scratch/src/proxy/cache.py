@@ -0,0 +1,442 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+# Statuses a shared cache may store, RFC 9110 section 15.1
+CACHEABLE_STATUSES = frozenset({200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501})
+# Request headers the cache answers itself instead of forwarding them
+CONDITIONAL_HEADERS = frozenset({"if-none-match", "if-modified-since"})
+# Response headers that describe one connection or one response, never stored
+UNSTORED_HEADERS = frozenset(
+    {
+        "connection",
+        "keep-alive",
+        "proxy-authenticate",
+        "proxy-connection",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+        "age",
+    }
+)
+
+HIT = "HIT"
+STALE = "STALE"
+REVALIDATED = "REVALIDATED"
+MISS = "MISS"
+
+
+def parse_cache_control(value):
+    """
+    Parse a Cache-Control header.
+
+    Args:
+        value (str): The header value, or None.
+
+    Returns:
+        dict: Lowercase directive names mapped to their value, or True if they have none.
+    """
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else True
+    return directives
+
+
+def seconds(directives, name):
+    """Get a delta-seconds directive, or None if it is missing or malformed."""
+    try:
+        return max(int(directives[name]), 0)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def http_date(value):
+    """Parse an HTTP date into a timestamp, or None if it is malformed."""
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def weak(tag):
+    """Strip the weak marker from an entity tag, for weak comparison."""
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+class CacheEntry:
+    """A stored response and its freshness."""
+
+    __slots__ = (
+        "key",
+        "status",
+        "headers",
+        "body",
+        "stored_at",
+        "fresh_until",
+        "stale_until",
+        "initial_age",
+        "etag",
+        "last_modified",
+        "size",
+    )
+
+    def __init__(self, key, status, headers, body):
+        self.key = key
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.stored_at = 0.0
+        self.fresh_until = 0.0
+        self.stale_until = 0.0
+        self.initial_age = 0
+        self.etag = None
+        self.last_modified = None
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers)
+
+
+class ResponseCache:
+    """
+    In-memory HTTP cache for GET responses, shared by all requests of a proxy.
+
+    Freshness follows Cache-Control (s-maxage, max-age, no-cache, no-store,
+    private, stale-while-revalidate) and Expires. Responses vary on the
+    request headers named in their Vary header. Stale entries with an ETag
+    or Last-Modified are revalidated with a conditional request, and
+    concurrent misses for the same key share one upstream fetch.
+
+    Entries are evicted least recently used first once the stored bodies
+    and headers exceed `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        max_bytes=64 * 1024 * 1024,
+        max_entry_bytes=1024 * 1024,
+        default_ttl=0,
+        stale_while_revalidate=True,
+        clock=time.monotonic,
+    ):
+        """
+        Initialize the response cache.
+
+        Args:
+            max_bytes (int): Largest total size of the stored responses.
+            max_entry_bytes (int): Largest response that is stored.
+            default_ttl (float): Seconds a response without freshness information
+                stays fresh, or 0 to not store such responses.
+            stale_while_revalidate (bool): Serve stale entries within their
+                stale-while-revalidate window while they are refreshed in the background.
+            clock (callable): Monotonic time source.
+        """
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.default_ttl = default_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.clock = clock
+        # Entries in least recently used order
+        self.entries = OrderedDict()
+        # Request headers each URL's responses vary on
+        self.vary = {}
+        self.size = 0
+        # Upstream fetches in progress, shared by concurrent misses
+        self.inflight = {}
+        self.background = set()
+        self.logger = logging.getLogger("ResponseCache")
+
+        self.requests = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    def cacheable_request(self, method, headers):
+        """
+        Check whether a request may be answered from the cache.
+
+        Args:
+            method (str): HTTP method.
+            headers: Request headers with lowercase names.
+
+        Returns:
+            bool: True for GET requests without credentials or no-store.
+        """
+        if method != "GET" or "authorization" in headers:
+            return False
+        return "no-store" not in parse_cache_control(headers.get("cache-control"))
+
+    def key(self, base, headers):
+        """Get the cache key of a request, including the headers its URL varies on."""
+        names = self.vary.get(base)
+        if not names:
+            return (base,)
+        return (base,) + tuple(headers.get(name, "") for name in names)
+
+    def age(self, entry):
+        """Get the age in seconds of a stored response."""
+        return entry.initial_age + max(self.clock() - entry.stored_at, 0)
+
+    def not_modified(self, entry, headers):
+        """
+        Check whether a client's conditional request matches a response.
+
+        Returns:
+            bool: True if the client can be answered with 304 Not Modified.
+        """
+        if entry.status != 200:
+            return False
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            if entry.etag is None:
+                return False
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or weak(entry.etag) in map(weak, tags)
+        if_modified_since = http_date(headers.get("if-modified-since"))
+        last_modified = http_date(entry.last_modified)
+        return (
+            if_modified_since is not None
+            and last_modified is not None
+            and last_modified <= if_modified_since
+        )
+
+    def freshen(self, entry, headers):
+        """
+        Set an entry's freshness from response headers.
+
+        Returns:
+            bool: True if the response may be stored.
+        """
+        values = dict(headers)
+        directives = parse_cache_control(values.get("cache-control"))
+        if "no-store" in directives or "private" in directives:
+            return False
+        if "set-cookie" in values or values.get("vary", "").strip() == "*":
+            return False
+
+        ttl = seconds(directives, "s-maxage")
+        if ttl is None:
+            ttl = seconds(directives, "max-age")
+        if ttl is None and "expires" in values:
+            expires = http_date(values["expires"])
+            date = http_date(values.get("date")) or time.time()
+            ttl = max(expires - date, 0) if expires is not None else 0
+        if ttl is None:
+            ttl = self.default_ttl
+        if "no-cache" in directives:
+            ttl = 0
+
+        entry.etag = values.get("etag")
+        entry.last_modified = values.get("last-modified")
+        swr = seconds(directives, "stale-while-revalidate") or 0
+        if not self.stale_while_revalidate or "must-revalidate" in directives:
+            swr = 0
+        if ttl <= 0 and swr <= 0 and entry.etag is None and entry.last_modified is None:
+            return False
+
+        entry.initial_age = seconds({"age": values.get("age")}, "age") or 0
+        entry.stored_at = self.clock()
+        entry.fresh_until = entry.stored_at + ttl - entry.initial_age
+        entry.stale_until = entry.fresh_until + swr
+        return True
+
+    def store(self, base, request_headers, status, headers, body):
+        """
+        Store a response if its status, size and headers allow it.
+
+        Returns:
+            CacheEntry: The response, whether or not it was stored.
+        """
+        names = tuple(
+            sorted(
+                {
+                    name.strip().lower()
+                    for value in (v for k, v in headers if k == "vary")
+                    for name in value.split(",")
+                    if name.strip()
+                }
+            )
+        )
+        headers = [(k, v) for k, v in headers if k not in UNSTORED_HEADERS]
+        entry = CacheEntry(None, status, headers, body)
+        if (
+            status not in CACHEABLE_STATUSES
+            or entry.size > self.max_entry_bytes
+            or not self.freshen(entry, headers)
+        ):
+            return entry
+
+        if self.vary.get(base, ()) != names:
+            # The variants stored under the old Vary are no longer reachable
+            self.purge(base)
+            self.vary[base] = names
+        entry.key = self.key(base, request_headers)
+        self.discard(entry.key)
+        self.entries[entry.key] = entry
+        self.size += entry.size
+        self.stores += 1
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+        return entry
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def purge(self, base):
+        """Drop every stored variant of a URL."""
+        for key in [key for key in self.entries if key[0] == base]:
+            self.discard(key)
+
+    async def fetch(self, base, headers, fetcher):
+        """
+        Answer a request from the cache or through one shared upstream fetch.
+
+        Args:
+            base (str): Host and URL of the request.
+            headers: Request headers with lowercase names.
+            fetcher (callable): Coroutine function taking extra request headers
+                and returning the upstream (status, headers, body).
+
+        Returns:
+            tuple: The CacheEntry to send and how it was obtained (HIT, STALE,
+                REVALIDATED or MISS).
+        """
+        self.requests += 1
+        key = self.key(base, headers)
+        directives = parse_cache_control(headers.get("cache-control"))
+        must_revalidate = (
+            "no-cache" in directives or headers.get("pragma") == "no-cache"
+        )
+        entry = self.entries.get(key)
+        if entry is not None and not must_revalidate:
+            now = self.clock()
+            if now < entry.fresh_until:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.bytes_saved += len(entry.body)
+                return entry, HIT
+            if now < entry.stale_until:
+                self.entries.move_to_end(key)
+                self.stale_hits += 1
+                self.bytes_saved += len(entry.body)
+                if key not in self.inflight:
+                    task = asyncio.ensure_future(
+                        self.shared_fetch(key, base, headers, entry, fetcher)
+                    )
+                    self.background.add(task)
+                    task.add_done_callback(self.revalidation_done)
+                return entry, STALE
+
+        future = self.inflight.get(key)
+        if future is not None:
+            try:
+                shared, state = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The request that was fetching went away, fetch for this one instead
+                return await self.shared_fetch(key, base, headers, entry, fetcher)
+            # Only a stored response is shared. One that was not stored may be private
+            # or set a cookie, and one stored under another key varies on a header this
+            # request sent differently.
+            if shared.key is not None and shared.key == self.key(base, headers):
+                self.coalesced += 1
+                self.bytes_saved += len(shared.body)
+                return shared, state
+        return await self.shared_fetch(key, base, headers, entry, fetcher)
+
+    async def shared_fetch(self, key, base, headers, entry, fetcher):
+        """Fetch a response upstream, letting concurrent misses wait for it."""
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result = await self.refresh(base, headers, entry, fetcher)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when no other request was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+
+    async def refresh(self, base, headers, entry, fetcher):
+        """Fetch a response, revalidating the stored one if it has a validator."""
+        conditional = {}
+        if entry is not None:
+            if entry.etag is not None:
+                conditional["if-none-match"] = entry.etag
+            if entry.last_modified is not None:
+                conditional["if-modified-since"] = entry.last_modified
+
+        status, response_headers, body = await fetcher(conditional)
+        if status == 304 and entry is not None:
+            # Keep the stored body with the freshness of the new response
+            updated = dict(entry.headers)
+            updated.update(
+                (k, v) for k, v in response_headers if k not in UNSTORED_HEADERS
+            )
+            headers_list = list(updated.items())
+            if self.freshen(entry, headers_list):
+                entry.headers = headers_list
+                if entry.key in self.entries:
+                    self.entries.move_to_end(entry.key)
+            else:
+                self.discard(entry.key)
+            self.revalidated += 1
+            self.bytes_saved += len(entry.body)
+            return entry, REVALIDATED
+
+        self.misses += 1
+        if entry is not None and entry.key in self.entries:
+            self.discard(entry.key)
+        return self.store(base, headers, status, response_headers, body), MISS
+
+    def revalidation_done(self, task):
+        self.background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(f"Background revalidation failed: {task.exception()}")
+
+    def get_metrics(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Request counts by outcome, hit rate, bytes saved and current size.
+        """
+        served = self.hits + self.stale_hits + self.revalidated + self.coalesced
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (
+                (self.hits + self.stale_hits) / self.requests if self.requests else 0
+            ),
+            "upstream_saved_rate": served / self.requests if self.requests else 0,
+            "bytes_saved": self.bytes_saved,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+        }
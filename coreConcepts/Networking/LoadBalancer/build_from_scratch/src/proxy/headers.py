@@ -0,0 +1,196 @@
+import importlib.util
+import itertools
+import os
+
+# Headers that describe one connection and are never forwarded, RFC 7230 section 6.1
+HOP_BY_HOP_HEADERS = frozenset(
+    {
+        b"connection",
+        b"keep-alive",
+        b"proxy-authenticate",
+        b"proxy-authorization",
+        b"proxy-connection",
+        b"te",
+        b"trailer",
+        b"transfer-encoding",
+        b"upgrade",
+    }
+)
+# Dropped from responses whose body the proxy frames itself
+REFRAMED_HEADERS = HOP_BY_HOP_HEADERS | {b"content-length"}
+# Dropped from responses whose body was decompressed on the way
+DECODED_HEADERS = REFRAMED_HEADERS | {b"content-encoding"}
+
+# Connection options that name no header
+CONNECTION_OPTIONS = frozenset({b"close", b"keep-alive"})
+
+# Content codings that httpx decompresses, Brotli only with a Brotli package installed
+DECODED_ENCODINGS = frozenset({"gzip", "deflate"}) | (
+    {"br"}
+    if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi")
+    else set()
+)
+
+
+def connection_tokens(value):
+    """Get the header names listed in a Connection header, which are hop-by-hop too."""
+    return {token.strip().lower() for token in value.split(b",")} - CONNECTION_OPTIONS
+
+
+class HeaderPipeline:
+    """
+    Rewrites request and response headers as lists of raw byte pairs.
+
+    Headers are taken from the ASGI scope and from the upstream response as
+    they are, and every header that is forwarded keeps its original pair, so
+    a request costs one pass and one new list per direction. Repeated headers
+    such as Cookie and Set-Cookie stay separate. Hop-by-hop headers, and any
+    header named in Connection, are dropped both ways.
+    """
+
+    def __init__(self, request_id_header="x-request-id"):
+        """
+        Initialize the header pipeline.
+
+        Args:
+            request_id_header (str): Header carrying the request ID, kept from the
+                client if present and generated otherwise.
+        """
+        self.request_id_name = request_id_header.lower()
+        self.request_id_header = self.request_id_name.encode("latin-1")
+        # Request IDs are a random prefix per process and a counter
+        self.id_prefix = os.urandom(6).hex()
+        self.ids = itertools.count(1)
+
+    def request_id(self, headers):
+        """
+        Get the ID of a request, generating one if the client sent none.
+
+        Args:
+            headers: Request headers with lowercase names.
+
+        Returns:
+            bytes: The request ID.
+        """
+        value = headers.get(self.request_id_name)
+        if value:
+            return value.encode("latin-1")
+        return self.new_request_id()
+
+    def raw_request_id(self, raw):
+        """
+        Get the ID of a request from its raw headers, generating one if the client sent none.
+
+        Args:
+            raw (list): (name, value) byte pairs with lowercase names.
+
+        Returns:
+            bytes: The request ID.
+        """
+        for name, value in raw:
+            if name == self.request_id_header and value:
+                return value
+        return self.new_request_id()
+
+    def new_request_id(self):
+        return f"{self.id_prefix}-{next(self.ids)}".encode("latin-1")
+
+    def request_headers(self, scope, request_id, skip=frozenset()):
+        """
+        Build the headers to forward for a request.
+
+        The client address is appended to X-Forwarded-For, X-Forwarded-Proto
+        is set unless a proxy in front already set it, and the request ID is
+        sent in place of any the client sent.
+
+        Args:
+            scope (dict): ASGI scope of the request.
+            request_id (bytes): ID of the request.
+            skip (frozenset): More lowercase header names to leave out.
+
+        Returns:
+            list: (name, value) byte pairs.
+        """
+        headers = []
+        forwarded_for = None
+        forwarded_proto = False
+        connection = None
+        for pair in scope["headers"]:
+            name = pair[0]
+            if name in HOP_BY_HOP_HEADERS:
+                if name == b"connection":
+                    connection = pair[1]
+                continue
+            if name == b"host" or name == self.request_id_header or name in skip:
+                continue
+            if name == b"x-forwarded-for":
+                forwarded_for = (
+                    pair[1]
+                    if forwarded_for is None
+                    else forwarded_for + b", " + pair[1]
+                )
+                continue
+            if name == b"x-forwarded-proto":
+                forwarded_proto = True
+            headers.append(pair)
+
+        if connection is not None:
+            listed = connection_tokens(connection)
+            if listed:
+                headers = [pair for pair in headers if pair[0] not in listed]
+
+        client = scope.get("client")
+        if client:
+            address = client[0].encode("latin-1")
+            forwarded_for = (
+                address if forwarded_for is None else forwarded_for + b", " + address
+            )
+        if forwarded_for is not None:
+            headers.append((b"x-forwarded-for", forwarded_for))
+        if not forwarded_proto:
+            headers.append(
+                (b"x-forwarded-proto", scope.get("scheme", "http").encode("latin-1"))
+            )
+        headers.append((self.request_id_header, request_id))
+        return headers
+
+    def response_headers(self, raw, drop=HOP_BY_HOP_HEADERS):
+        """
+        Build the headers to return for an upstream response.
+
+        Args:
+            raw (list): (name, value) byte pairs as received from the backend.
+            drop (frozenset): Lowercase header names to leave out.
+
+        Returns:
+            list: (name, value) byte pairs with lowercase names.
+        """
+        headers = []
+        connection = None
+        for name, value in raw:
+            name = name.lower()
+            if name in drop:
+                if name == b"connection":
+                    connection = value
+                continue
+            headers.append((name, value))
+
+        if connection is not None:
+            listed = connection_tokens(connection)
+            if listed:
+                headers = [pair for pair in headers if pair[0] not in listed]
+        return headers
+
+    def set_response_id(self, headers, request_id):
+        """
+        Echo the request ID to the client, in place of any the backend sent.
+
+        Args:
+            headers (list): (name, value) byte pairs with lowercase names, changed
+                in place.
+            request_id (bytes): ID of the request.
+        """
+        name = self.request_id_header
+        if any(pair[0] == name for pair in headers):
+            headers[:] = [pair for pair in headers if pair[0] != name]
+        headers.append((name, request_id))
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import random
+import time
+from src.metrics.histogram import Histogram
+
+
+class BackendHealth:
+    """Probe state for a single backend."""
+
+    def __init__(self, server):
+        self.server = server
+        self.successes = 0  # consecutive successful probes
+        self.failures = 0  # consecutive failed probes
+        self.down = False  # taken out of rotation by the probes
+        self.last_probe_time = 0
+        self.latency = Histogram()
+
+
+class HealthChecker:
+    """
+    Active health checker that probes every backend concurrently.
+
+    Each backend runs its own probe loop on a jittered schedule, so one slow
+    or dead backend never delays the others. A backend is only taken out of
+    rotation after `fall` consecutive failures and only put back after `rise`
+    consecutive successes. While a backend is down, probes back off
+    exponentially up to `max_backoff`.
+    """
+
+    def __init__(
+        self,
+        load_balancer,
+        upstream,
+        path="/health",
+        interval=5.0,
+        timeout=2.0,
+        rise=2,
+        fall=3,
+        jitter=0.2,
+        max_backoff=60.0,
+    ):
+        """
+        Initialize the health checker.
+
+        Args:
+            load_balancer: The load balancer whose servers are probed.
+            upstream (UpstreamClient): Pooled client used to send probes.
+            path (str): Health check path on each backend.
+            interval (float): Seconds between probes of a healthy backend.
+            timeout (float): Timeout for a single probe.
+            rise (int): Consecutive successes needed to mark a backend healthy.
+            fall (int): Consecutive failures needed to mark a backend unhealthy.
+            jitter (float): Fraction by which each delay is randomly spread.
+            max_backoff (float): Upper bound for the delay between probes of a dead backend.
+        """
+        self.load_balancer = load_balancer
+        self.upstream = upstream
+        self.path = path
+        self.interval = interval
+        self.timeout = timeout
+        self.rise = rise
+        self.fall = fall
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.backends = {}
+        self.tasks = {}
+        self.running = False
+        # Called with (server, healthy) whenever a probe changes a server's health
+        self.on_transition = None
+        self.logger = logging.getLogger("HealthChecker")
+
+    async def start(self):
+        """Start a probe loop for every server."""
+        self.running = True
+        for server in self.load_balancer.servers:
+            self.watch(server)
+        self.logger.info(f"Started health checks for {len(self.tasks)} servers")
+
+    async def stop(self):
+        """Cancel all probe loops."""
+        self.running = False
+        tasks, self.tasks = self.tasks, {}
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    def watch(self, server):
+        """Start probing a server if it is not probed already."""
+        if server not in self.tasks:
+            self.backends.setdefault(server, BackendHealth(server))
+            self.tasks[server] = asyncio.create_task(self.probe_loop(server))
+
+    def unwatch(self, server):
+        """Stop probing a server and forget its probe state."""
+        task = self.tasks.pop(server, None)
+        if task is not None:
+            task.cancel()
+        self.backends.pop(server, None)
+
+    def next_delay(self, state):
+        """
+        Get the delay before the next probe of a backend.
+
+        Args:
+            state (BackendHealth): The backend's probe state.
+
+        Returns:
+            float: Seconds to wait, with jitter applied.
+        """
+        delay = self.interval
+        if state.failures > self.fall:
+            # Back off on a dead backend, doubling per extra failure
+            exponent = min(state.failures - self.fall, 16)
+            delay = min(self.interval * (2**exponent), self.max_backoff)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def probe_loop(self, server):
+        """Probe a single server forever."""
+        state = self.backends[server]
+        # Spread the first probes so backends are not checked in lockstep
+        await asyncio.sleep(random.uniform(0, self.interval))
+        while True:
+            await self.probe(server)
+            await asyncio.sleep(self.next_delay(state))
+
+    async def probe(self, server):
+        """
+        Probe a server once and apply the result.
+
+        Args:
+            server (str): The server to probe.
+
+        Returns:
+            bool: True if the probe succeeded.
+        """
+        start_time = time.time()
+        try:
+            client = self.upstream.client_for(server)
+            resp = await client.get(self.path, timeout=self.timeout)
+            ok = resp.status_code < 500
+        except Exception as e:
+            self.logger.debug(f"Health probe to {server} failed: {str(e)}")
+            ok = False
+        response_time = time.time() - start_time
+
+        if ok:
+            # Update response time if using least response time
+            if hasattr(self.load_balancer, "record_response_time"):
+                self.load_balancer.record_response_time(server, response_time)
+
+        self.record_probe(server, ok, response_time)
+        return ok
+
+    def record_probe(self, server, ok, response_time):
+        """
+        Apply a probe result using the rise/fall thresholds.
+
+        Args:
+            server (str): The probed server.
+            ok (bool): Whether the probe succeeded.
+            response_time (float): Probe latency in seconds.
+        """
+        state = self.backends.setdefault(server, BackendHealth(server))
+        state.last_probe_time = time.time()
+        state.latency.observe(response_time)
+
+        # Only servers the probes took down are put back, a server ejected by its
+        # circuit breaker returns through the breaker's own half-open probing
+        if ok:
+            state.successes += 1
+            state.failures = 0
+            if state.down and state.successes >= self.rise:
+                state.down = False
+                self.load_balancer.mark_healthy(server)
+                if self.on_transition:
+                    self.on_transition(server, True)
+        else:
+            state.failures += 1
+            state.successes = 0
+            if not state.down and state.failures >= self.fall:
+                state.down = True
+                self.load_balancer.mark_unhealthy(server)
+                if self.on_transition:
+                    self.on_transition(server, False)
+
+    def get_status(self):
+        """
+        Get the probe state of every backend.
+
+        Returns:
+            dict: Per-server health, consecutive counters and probe latency histogram.
+        """
+        return {
+            server: {
+                "healthy": server in self.load_balancer.healthy_servers,
+                "consecutive_successes": state.successes,
+                "consecutive_failures": state.failures,
+                "last_probe_time": state.last_probe_time,
+                "probe_latency": state.latency.to_dict(),
+            }
+            for server, state in self.backends.items()
+        }
@@ -1,9 +1,25 @@
+import hmac
 import time
+import asyncio
 import logging
-import requests
+from typing import Optional
+from pydantic import BaseModel
 from fastapi import FastAPI, Request, Response
-from fastapi.responses import JSONResponse
-import threading
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+from src.proxy.upstream import UpstreamClient
+from src.proxy.health import HealthChecker
+from src.proxy.retry import RetryPolicy
+from src.proxy.membership import MembershipManager
+from src.proxy.cache import CONDITIONAL_HEADERS
+from src.proxy.routing import current_route
+from src.proxy.headers import (
+    HeaderPipeline,
+    DECODED_ENCODINGS,
+    HOP_BY_HOP_HEADERS,
+    REFRAMED_HEADERS,
+    DECODED_HEADERS,
+)
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -11,10 +27,34 @@ logging.basicConfig(
 logger = logging.getLogger("HTTPProxy")
 
 
+class BackendUpdate(BaseModel):
+    url: str
+    weight: Optional[int] = None
+
+
 class LoadBalancerProxy:
     """HTTP Proxy that uses a load balancer to route requests."""
 
-    def __init__(self, load_balancer, host="0.0.0.0", port=8080):
+    def __init__(
+        self,
+        load_balancer,
+        host="0.0.0.0",
+        port=8080,
+        upstream=None,
+        streaming=False,
+        chunk_size=64 * 1024,
+        health_checker=None,
+        retry_policy=None,
+        membership=None,
+        admin_token=None,
+        cache=None,
+        singleflight=None,
+        admission=None,
+        max_inflight_per_backend=None,
+        routes=None,
+        header_pipeline=None,
+        access_log=None,
+    ):
         """
         Initialize the HTTP proxy.
 
@@ -22,144 +62,710 @@ class LoadBalancerProxy:
             load_balancer: The load balancer to use.
             host (str): Host to bind the proxy to.
             port (int): Port to bind the proxy to.
+            upstream (UpstreamClient): Pooled client for backend requests.
+            streaming (bool): Pipe request and response bodies instead of buffering them.
+            chunk_size (int): Size of response chunks relayed in streaming mode.
+            health_checker (HealthChecker): Active health checker for the backends.
+            retry_policy (RetryPolicy): Retry and hedging settings for idempotent requests.
+            membership (MembershipManager): Runtime changes to the backend pool.
+            admin_token (str): Token required in the x-admin-token header to change
+                the backend pool, or None to leave the admin endpoints open.
+            cache (ResponseCache): Cache for GET responses, or None to forward every
+                request. Only used when responses are buffered.
+            singleflight (Singleflight): Collapses concurrent identical requests into
+                one upstream call, or None. Only used when responses are buffered.
+            admission (AdmissionController): Adaptive limit on requests in flight to
+                the backends, or None for no limit.
+            max_inflight_per_backend (int): Most requests in flight to one backend,
+                or None for no cap.
+            routes (RoutingTable): Routes with their own backend pools. Requests
+                matching no route use `load_balancer`.
+            header_pipeline (HeaderPipeline): Rewrites forwarded request and
+                response headers.
+            access_log (AccessLog): Structured log of served requests, or None.
         """
-        self.load_balancer = load_balancer
+        self.default_balancer = load_balancer
+        self.routes = routes
         self.host = host
         self.port = port
+        self.upstream = upstream or UpstreamClient()
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        self.health_checker = health_checker or HealthChecker(
+            load_balancer, self.upstream
+        )
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.membership = membership or MembershipManager(
+            load_balancer, self.health_checker, self.upstream
+        )
+        self.admin_token = admin_token
+        self.cache = cache if not streaming else None
+        self.singleflight = singleflight if not streaming else None
+        self.admission = admission
+        self.max_inflight_per_backend = max_inflight_per_backend
+        self.backend_full = 0
+        self.header_pipeline = header_pipeline or HeaderPipeline()
+        self.access_log = access_log
+        # Conditional headers as they appear in the ASGI scope
+        self.conditional_headers = frozenset(
+            name.encode("latin-1") for name in CONDITIONAL_HEADERS
+        )
+        # Set by ClusterSupervisor in each worker of a multi-process proxy
+        self.cluster = None
         self.app = FastAPI()
         self.logger = logging.getLogger("LoadBalancerProxy")
         self.setup_routes()
+        self.setup_lifecycle()
 
-        # Start health check thread
-        self.health_check_thread = threading.Thread(
-            target=self.health_check_loop, daemon=True
-        )
-        self.health_check_thread.start()
+    @property
+    def load_balancer(self):
+        """The load balancer of the route being served, or the default one."""
+        route = current_route.get()
+        return route.load_balancer if route is not None else self.default_balancer
 
     def setup_routes(self):
         """Set up the FastAPI routes."""
 
+        # Load balancer endpoints are registered before the catch-all proxy route
+
+        @self.app.get("/lb/stats")
+        async def stats():
+            """Get load balancer statistics."""
+            metrics = self.load_balancer.get_metrics()
+            metrics["retries"] = self.retry_policy.get_metrics()
+            if self.cache is not None:
+                metrics["cache"] = self.cache.get_metrics()
+            if self.singleflight is not None:
+                metrics["singleflight"] = self.singleflight.get_metrics()
+            if self.admission is not None:
+                metrics["admission"] = self.admission.get_metrics()
+            if self.routes is not None:
+                metrics["routes"] = self.routes.get_metrics()
+            metrics["backend_full"] = self.backend_full
+            metrics["upstream"] = self.upstream.get_metrics()
+            if self.access_log is not None:
+                metrics["access_log"] = self.access_log.get_metrics()
+            return metrics
+
+        @self.app.get("/lb/metrics")
+        async def prometheus_metrics():
+            """Get per-backend metrics in the Prometheus text format."""
+            retry_metrics = self.retry_policy.get_metrics()
+            extra = {
+                "lb_retries_total": retry_metrics["retries"],
+                "lb_hedges_total": retry_metrics["hedges"],
+                "lb_retry_budget_exhausted_total": retry_metrics["budget_exhausted"],
+            }
+            if self.cache is not None:
+                cache_metrics = self.cache.get_metrics()
+                extra["lb_cache_hits_total"] = (
+                    cache_metrics["hits"] + cache_metrics["stale_hits"]
+                )
+                extra["lb_cache_misses_total"] = cache_metrics["misses"]
+                extra["lb_cache_bytes_saved_total"] = cache_metrics["bytes_saved"]
+            if self.admission is not None:
+                admission_metrics = self.admission.get_metrics()
+                extra["lb_admission_limit"] = admission_metrics["limit"]
+                extra["lb_admission_queued"] = admission_metrics["queued"]
+                extra["lb_admission_shed_total"] = sum(
+                    admission_metrics["shed"].values()
+                )
+            extra["lb_backend_full_total"] = self.backend_full
+            if self.access_log is not None:
+                access_log_metrics = self.access_log.get_metrics()
+                extra["lb_access_log_written_total"] = access_log_metrics["written"]
+                extra["lb_access_log_dropped_total"] = access_log_metrics["dropped"]
+            if self.upstream.http2:
+                upstream_metrics = self.upstream.get_metrics()
+                extra["lb_upstream_open_streams"] = sum(
+                    sum(streams) for streams in upstream_metrics["streams"].values()
+                )
+                extra["lb_upstream_stream_waits_total"] = upstream_metrics[
+                    "stream_waits"
+                ]
+            text = self.load_balancer.backend_metrics.render(
+                self.load_balancer,
+                extra=extra,
+                routes=self.routes.routes if self.routes is not None else (),
+            )
+            return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+        @self.app.get("/lb/health")
+        async def health():
+            """Get active health check state and probe latencies per backend."""
+            return self.health_checker.get_status()
+
+        @self.app.get("/lb/backends")
+        async def backends():
+            """Get the state of every backend."""
+            return self.membership.get_status()
+
+        @self.app.post("/lb/backends")
+        async def add_backend(update: BackendUpdate, request: Request):
+            """Add a backend, or bring back a draining one."""
+            return self.admin(request, self.membership.add, update.url, update.weight)
+
+        @self.app.post("/lb/backends/drain")
+        async def drain_backend(update: BackendUpdate, request: Request):
+            """Stop sending new requests to a backend."""
+            return self.admin(request, self.membership.drain, update.url)
+
+        @self.app.post("/lb/backends/remove")
+        async def remove_backend(update: BackendUpdate, request: Request):
+            """Remove a backend once its in-flight requests are done."""
+            return self.admin(request, self.membership.remove, update.url)
+
+        @self.app.put("/lb/backends/weight")
+        async def set_backend_weight(update: BackendUpdate, request: Request):
+            """Change the weight of a backend."""
+            if update.weight is None:
+                return JSONResponse(
+                    content={"error": "weight is required"}, status_code=400
+                )
+            return self.admin(
+                request, self.membership.set_weight, update.url, update.weight
+            )
+
         @self.app.api_route(
             "/{path:path}",
             methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "HEAD", "PATCH"],
         )
         async def proxy(path: str, request: Request):
             start_time = time.time()
+            request_id = self.header_pipeline.request_id(request.headers)
+            request.state.request_id = request_id
+            if self.routes is not None:
+                route = self.routes.match(request.headers.get("host"), f"/{path}")
+                if route is not None:
+                    route.requests += 1
+                    # Seen by everything that runs for this request, hedges included
+                    current_route.set(route)
+            try:
+                if self.singleflight is not None and self.singleflight.applies(
+                    request.method, f"/{path}", request.headers
+                ):
+                    response = await self.collapsed_send(path, request)
+                else:
+                    response = await self.respond(path, request)
+            except Exception:
+                self.log_access(request, path, start_time, 500)
+                raise
+            self.header_pipeline.set_response_id(response.raw_headers, request_id)
+            self.log_access(request, path, start_time, response.status_code)
+            return response
+
+    def log_access(self, request, path, start_time, status):
+        """Pass a served request on to the access log."""
+        if self.access_log is None:
+            return
+        route = current_route.get()
+        client = request.client
+        self.access_log.log(
+            start_time,
+            request.state.request_id,
+            request.method,
+            f"/{path}",
+            status,
+            time.time() - start_time,
+            getattr(request.state, "backend", None),
+            route.name if route is not None else None,
+            client.host if client is not None else None,
+        )
 
-            # Get a server from the load balancer
-            server = self.load_balancer.assign_server(request)
+    async def respond(self, path, request):
+        """Answer a request from the cache if it is cacheable, or from a backend."""
+        if self.cache is not None and self.cache.cacheable_request(
+            request.method, request.headers
+        ):
+            return await self.cached_send(path, request)
+        return await self.admitted_send(path, request)
 
-            if not server:
-                self.logger.error("No servers available")
-                return JSONResponse(
-                    content={"error": "No servers available"}, status_code=503
-                )
+    async def collapsed_send(self, path, request):
+        """
+        Answer a request with the response of an identical one already in flight.
 
-            # Forward the request to the selected server
-            try:
-                url = f"{server}/{path}"
-                self.logger.info(f"Forwarding request to {url}")
-
-                # Create the proxied request
-                resp = requests.request(
-                    method=request.method,
-                    url=url,
-                    headers={
-                        key: value
-                        for (key, value) in request.headers.items()
-                        if key != "host"
-                    },
-                    data=await request.body(),
-                    cookies=request.cookies,
-                    allow_redirects=False,
-                    timeout=10,
-                )
+        Args:
+            path (str): Request path without the leading slash.
+            request: The incoming request.
 
-                # Calculate response time
-                response_time = time.time() - start_time
+        Returns:
+            Response: A copy of the shared response.
+        """
+        url = f"/{path}"
+        if request.url.query:
+            url = f"{url}?{request.url.query}"
 
-                # Update load balancer metrics
-                if hasattr(self.load_balancer, "record_response_time"):
-                    self.load_balancer.record_response_time(server, response_time)
+        async def call():
+            response = await self.respond(path, request)
+            return response.status_code, response.raw_headers, response.body
 
-                self.load_balancer.record_request_metrics(
-                    server, response_time, error=resp.status_code >= 500
-                )
+        status, raw_headers, body = await self.singleflight.do(
+            self.singleflight.key(request.method, url, request.headers), call
+        )
+        response = Response(content=body, status_code=status)
+        response.raw_headers = list(raw_headers)
+        return response
 
-                # If using least connections, release the connection
-                if hasattr(self.load_balancer, "release_connection"):
-                    self.load_balancer.release_connection(server)
+    async def cached_send(self, path, request):
+        """
+        Answer a GET request from the response cache, forwarding it on a miss.
 
-                # Log the request
-                self.logger.info(
-                    f"Request completed: {resp.status_code} in {response_time:.4f}s"
-                )
+        Args:
+            path (str): Request path without the leading slash.
+            request: The incoming request.
 
-                # Return the response to the client
-                response = Response(content=resp.content, status_code=resp.status_code)
-                for k, v in resp.headers.items():
+        Returns:
+            Response: The cached or forwarded response.
+        """
+        url = f"/{path}"
+        if request.url.query:
+            url = f"{url}?{request.url.query}"
+        base = f"{request.headers.get('host', '')}{url}"
+        # Read the body now, a background revalidation may run after the response is sent
+        await request.body()
+
+        async def fetch(conditional):
+            # The client's own validators are checked against the cached response
+            headers = self.header_pipeline.request_headers(
+                request.scope, request.state.request_id, self.conditional_headers
+            )
+            headers.extend(conditional.items())
+            response = await self.admitted_send(path, request, headers)
+            return response.status_code, response.headers.items(), response.body
+
+        entry, state = await self.cache.fetch(base, request.headers, fetch)
+        if self.cache.not_modified(entry, request.headers):
+            response = Response(status_code=304)
+            for k, v in entry.headers:
+                if k in ("etag", "last-modified", "cache-control", "expires", "vary"):
                     response.headers[k] = v
-                return response
+        else:
+            response = Response(content=entry.body, status_code=entry.status)
+            # The stored Content-Length is the one just computed for the same body
+            response.raw_headers.extend(
+                (k.encode("latin-1"), v.encode("latin-1"))
+                for k, v in entry.headers
+                if k != "content-length"
+            )
+        if entry.key is not None:
+            response.headers["age"] = str(int(self.cache.age(entry)))
+        response.headers["x-cache"] = state
+        return response
+
+    async def admitted_send(self, path, request, headers=None):
+        """
+        Forward a request once the admission controller has a slot for it.
 
-            except Exception as e:
-                # Handle errors (timeout, connection refused, etc.)
-                error_time = time.time() - start_time
-                self.logger.error(f"Error forwarding request to {server}: {str(e)}")
+        Returns:
+            Response: The backend response, or 503 if the request was shed.
+        """
+        if self.admission is None:
+            return await self.send(path, request, headers)
+        if not await self.admission.acquire(self.admission.priority(request.headers)):
+            return JSONResponse(
+                content={"error": "Overloaded"},
+                status_code=503,
+                headers={"retry-after": "1"},
+            )
+        start_time = time.time()
+        dropped = True
+        try:
+            response = await self.send(path, request, headers)
+            dropped = response.status_code in (502, 503, 504)
+            return response
+        finally:
+            self.admission.release(time.time() - start_time, dropped)
+
+    async def send(self, path, request, headers=None):
+        """
+        Forward a request to a backend, retrying or hedging idempotent requests.
 
-                # Mark the server as unhealthy
-                self.load_balancer.mark_unhealthy(server)
+        Args:
+            path (str): Request path without the leading slash.
+            request: The incoming request.
+            headers (list): (name, value) pairs to forward, or None to forward the
+                request's own.
 
-                # Update metrics
-                self.load_balancer.record_request_metrics(
-                    server, error_time, error=True
+        Returns:
+            Response: The backend response, or an error response.
+        """
+        self.retry_policy.budget.deposit()
+
+        # Get a server from the load balancer
+        server = self.pick_server(request)
+
+        if not server:
+            self.logger.error("No servers available")
+            return JSONResponse(
+                content={"error": "No servers available"}, status_code=503
+            )
+
+        url = f"/{path}"
+        if request.url.query:
+            url = f"{url}?{request.url.query}"
+
+        if headers is None:
+            headers = self.header_pipeline.request_headers(
+                request.scope, request.state.request_id
+            )
+
+        # A streamed request body can only be sent once
+        if self.streaming:
+            has_body = (
+                "content-length" in request.headers
+                or "transfer-encoding" in request.headers
+            )
+            content = request.stream() if has_body else None
+        else:
+            has_body = False
+            content = await request.body()
+        retryable = self.retry_policy.is_retryable(request.method) and not has_body
+
+        self.load_balancer.backend_metrics.record_selection(server, "primary")
+        tried = [server]
+        retries = 0
+        while True:
+            try:
+                if retryable and self.retry_policy.hedging:
+                    server, resp = await self.hedged_forward(
+                        request, server, tried, url, headers, content
+                    )
+                else:
+                    resp = await self.forward(
+                        server, request.method, url, headers, content
+                    )
+                error = None
+            except Exception as e:
+                resp, error = None, e
+
+            failed = error is not None or (
+                resp.status_code in self.retry_policy.retry_statuses
+            )
+            if not (failed and retryable and retries < self.retry_policy.max_retries):
+                break
+
+            next_server = self.pick_server(request, exclude=tried)
+            if not next_server:
+                break
+            if not self.retry_policy.budget.withdraw():
+                self.release(next_server)
+                break
+            if resp is not None and self.streaming:
+                await self.finish_stream(server, resp)
+            retries += 1
+            self.load_balancer.backend_metrics.record_selection(next_server, "retry")
+            self.logger.info(f"Retrying request on {next_server} (retry {retries})")
+            server = next_server
+            tried.append(server)
+
+        request.state.backend = server
+        if error is not None:
+            return JSONResponse(content={"error": str(error)}, status_code=502)
+
+        if self.streaming:
+            # The connection is held until the body has been relayed
+            response = StreamingResponse(
+                resp.aiter_raw(self.chunk_size),
+                status_code=resp.status_code,
+                background=BackgroundTask(self.finish_stream, server, resp),
+            )
+            # The raw body is relayed as is, Content-Length and Content-Encoding still apply
+            response.raw_headers = self.header_pipeline.response_headers(
+                resp.headers.raw, HOP_BY_HOP_HEADERS
+            )
+            return response
+
+        # Return the response to the client
+        response = Response(content=resp.content, status_code=resp.status_code)
+        if request.method == "HEAD":
+            # No body, the backend's Content-Length describes the GET response
+            response.raw_headers = self.header_pipeline.response_headers(
+                resp.headers.raw, HOP_BY_HOP_HEADERS
+            )
+        else:
+            response.raw_headers.extend(
+                self.header_pipeline.response_headers(
+                    resp.headers.raw,
+                    DECODED_HEADERS if self.decoded(resp) else REFRAMED_HEADERS,
                 )
+            )
+        return response
+
+    def decoded(self, resp):
+        """Check whether httpx decompressed a buffered response body."""
+        if "content-encoding" not in resp.headers:
+            return False
+        return any(
+            encoding.strip().lower() in DECODED_ENCODINGS
+            for encoding in resp.headers.get_list("content-encoding", split_commas=True)
+        )
 
-                # Release connection if using least connections
-                if hasattr(self.load_balancer, "release_connection"):
-                    self.load_balancer.release_connection(server)
+    def admin(self, request, action, *args):
+        """
+        Run a backend pool change requested through an admin endpoint.
 
-                return JSONResponse(content={"error": str(e)}, status_code=502)
+        Returns:
+            The new pool state, or an error response.
+        """
+        if self.admin_token and not hmac.compare_digest(
+            request.headers.get("x-admin-token", ""), self.admin_token
+        ):
+            return JSONResponse(content={"error": "Forbidden"}, status_code=403)
+        if self.cluster is not None:
+            # The call only reaches the worker that handles it
+            return JSONResponse(
+                content={
+                    "error": "Backend changes need BACKEND_CONFIG when running several workers"
+                },
+                status_code=409,
+            )
+        try:
+            action(*args)
+        except KeyError as e:
+            return JSONResponse(content={"error": e.args[0]}, status_code=404)
+        except ValueError as e:
+            return JSONResponse(content={"error": str(e)}, status_code=400)
+        return self.membership.get_status()
+
+    def pick_server(self, request, exclude=()):
+        """
+        Get a server from the load balancer that its circuit breaker admits.
 
-        @self.app.get("/lb/stats")
-        async def stats():
-            """Get load balancer statistics."""
-            metrics = self.load_balancer.get_metrics()
-            return metrics
+        Args:
+            request: The request to be handled.
+            exclude: Servers already tried for this request.
 
-    def health_check_loop(self):
-        """Periodically check the health of all servers."""
-        while True:
-            self.health_check()
-            time.sleep(5)  # Check every 5 seconds
+        Returns:
+            str: URL of the selected server or None if no other server is available.
+        """
+        self.load_balancer.refresh_breakers()
+        for _ in range(3):
+            server = self.load_balancer.assign_server(request)
+            if not server:
+                return None
+            self.membership.acquired(server)
+            if (
+                server not in exclude
+                and not self.at_capacity(server)
+                and self.load_balancer.allow_request(server)
+            ):
+                return server
+            self.release(server)
+            if len(self.load_balancer.healthy_servers) <= len(exclude):
+                break
+        return None
+
+    def at_capacity(self, server):
+        """Check whether a backend already has its maximum of requests in flight."""
+        if self.max_inflight_per_backend is None:
+            return False
+        # The count includes the request being placed
+        if self.membership.inflight.get(server, 0) <= self.max_inflight_per_backend:
+            return False
+        self.backend_full += 1
+        return True
+
+    def release(self, server):
+        """Release the connection if using least connections."""
+        if hasattr(self.load_balancer, "release_connection"):
+            self.load_balancer.release_connection(server)
+        self.membership.released(server)
+
+    async def forward(self, server, method, url, headers, content):
+        """
+        Forward a request to a server and record its metrics.
 
-    def health_check(self):
-        """Check the health of all servers."""
-        for server in self.load_balancer.servers:
-            try:
-                # Simple health check - just try to connect
-                start_time = time.time()
-                resp = requests.get(f"{server}/health", timeout=2)
-                response_time = time.time() - start_time
+        Args:
+            server (str): The selected server.
+            method (str): HTTP method.
+            url (str): Path and query string.
+            headers (list): (name, value) pairs to forward.
+            content: Request body bytes, async iterator, or None.
+
+        Returns:
+            httpx.Response: The upstream response.
+        """
+        start_time = time.time()
+        # Requests are logged by the access log, these are only formatted when debugging
+        self.logger.debug("Forwarding request to %s%s", server, url)
+        route = current_route.get()
+        read_timeout = route.timeout if route is not None else None
+        try:
+            # Create the proxied request over the backend's pooled connections
+            if self.streaming:
+                resp = await self.upstream.stream(
+                    server,
+                    method,
+                    url,
+                    headers=headers,
+                    content=content,
+                    read_timeout=read_timeout,
+                )
+            else:
+                resp = await self.upstream.request(
+                    server,
+                    method,
+                    url,
+                    headers=headers,
+                    content=content,
+                    read_timeout=read_timeout,
+                )
+        except asyncio.CancelledError:
+            # Lost a hedge race, the request never completed
+            self.load_balancer.cancel_request(server)
+            self.release(server)
+            raise
+        except Exception as e:
+            # Handle errors (timeout, connection refused, etc.)
+            error_time = time.time() - start_time
+            self.logger.error(f"Error forwarding request to {server}: {str(e)}")
+
+            # Update metrics, the circuit breaker ejects the server if it keeps failing
+            self.load_balancer.record_request_metrics(server, error_time, error=True)
+            self.release(server)
+            raise
+
+        # Calculate response time
+        response_time = time.time() - start_time
+
+        # Update load balancer metrics
+        if hasattr(self.load_balancer, "record_response_time"):
+            self.load_balancer.record_response_time(server, response_time)
+
+        self.load_balancer.record_request_metrics(
+            server,
+            response_time,
+            error=resp.status_code >= 500,
+            status=resp.status_code,
+        )
+        self.retry_policy.observe(response_time)
+
+        self.logger.debug(
+            "Request completed: %s in %.4fs", resp.status_code, response_time
+        )
 
-                # Update response time if using least response time
-                if hasattr(self.load_balancer, "record_response_time"):
-                    self.load_balancer.record_response_time(server, response_time)
+        # Streamed responses hold the connection until the body has been relayed
+        if not self.streaming:
+            self.release(server)
+        return resp
 
-                if resp.status_code < 500:
-                    self.load_balancer.mark_healthy(server)
-                else:
-                    self.load_balancer.mark_unhealthy(server)
+    async def hedged_forward(self, request, server, tried, url, headers, content):
+        """
+        Forward a request, sending a second copy if the first one is slow.
 
-            except:
-                # If we can't connect, mark the server as unhealthy
-                self.load_balancer.mark_unhealthy(server)
+        If no response arrives within the hedge delay, the same request is
+        sent to another server and whichever response arrives first is used.
+
+        Returns:
+            tuple: The server that answered and its response.
+        """
+        attempts = {
+            asyncio.ensure_future(
+                self.forward(server, request.method, url, headers, content)
+            ): server
+        }
+        done, pending = await asyncio.wait(
+            attempts, timeout=self.retry_policy.hedge_delay()
+        )
+        if done:
+            (task,) = done
+            return server, task.result()
+
+        hedge_server = self.pick_server(request, exclude=tried)
+        if hedge_server and not self.retry_policy.budget.withdraw():
+            self.release(hedge_server)
+            hedge_server = None
+        if hedge_server:
+            self.retry_policy.hedges += 1
+            self.load_balancer.backend_metrics.record_selection(hedge_server, "hedge")
+            tried.append(hedge_server)
+            self.logger.info(f"Hedging request to {hedge_server}")
+            hedge = asyncio.ensure_future(
+                self.forward(hedge_server, request.method, url, headers, content)
+            )
+            attempts[hedge] = hedge_server
+            pending.add(hedge)
+
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            winner = next((task for task in done if task.exception() is None), None)
+            if winner is None:
+                error = next(iter(done)).exception()
+                continue
+            for task in pending:
+                task.cancel()
+            for task in done:
+                if task is not winner and task.exception() is None and self.streaming:
+                    await self.finish_stream(attempts[task], task.result())
+            return attempts[winner], winner.result()
+        raise error
+
+    async def finish_stream(self, server, resp):
+        """Close a streamed upstream response once it has been relayed."""
+        await self.upstream.finish(resp)
+        self.release(server)
+
+    def setup_lifecycle(self):
+        """Start and stop the upstream pools and health checks with the application."""
+
+        @self.app.on_event("startup")
+        async def start_upstream():
+            if self.access_log is not None:
+                self.access_log.start()
+            await self.upstream.start(self.load_balancer.servers)
+            # In a cluster only the leader probes, the others follow its results
+            probes = self.cluster is None or self.cluster.leader
+            if probes:
+                await self.health_checker.start()
+            if self.cluster is not None:
+                self.cluster.attach(self.health_checker)
+            # Route pools follow the same rule as the default pool
+            for route in self.routes.routes if self.routes is not None else ():
+                await self.upstream.start(route.load_balancer.servers)
+                if route.health_checker is None:
+                    continue
+                if probes:
+                    await route.health_checker.start()
+                if self.cluster is not None:
+                    self.cluster.attach(route.health_checker, route.load_balancer)
+            if self.cluster is not None:
+                await self.cluster.start()
+            await self.membership.start()
+
+        @self.app.on_event("shutdown")
+        async def close_upstream():
+            await self.membership.stop()
+            for route in self.routes.routes if self.routes is not None else ():
+                if route.health_checker is not None:
+                    await route.health_checker.stop()
+            if self.cluster is not None:
+                await self.cluster.stop()
+            await self.health_checker.stop()
+            await self.upstream.close()
+            if self.access_log is not None:
+                self.access_log.stop()
 
     def run(self):
         """Run the proxy server."""
         import uvicorn
 
         self.logger.info(f"Starting proxy on {self.host}:{self.port}")
-        uvicorn.run(self.app, host=self.host, port=self.port)
+        # X-Forwarded-For is extended by the header pipeline, the client must stay the peer
+        uvicorn.run(self.app, host=self.host, port=self.port, proxy_headers=False)
+
+    def serve(self, sock):
+        """Run the proxy server on an already bound socket, e.g. in a worker process."""
+        import uvicorn
+
+        server = uvicorn.Server(
+            uvicorn.Config(
+                self.app, host=self.host, port=self.port, proxy_headers=False
+            )
+        )
+        server.run(sockets=[sock])
 
 
 # Example usage
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import os
+from urllib.parse import urlsplit
+
+
+class MembershipManager:
+    """
+    Changes the backend pool of a running proxy.
+
+    Backends can be added, drained, removed and reweighted through the admin
+    endpoints or a watched JSON config file. A drained backend gets no new
+    requests, and a removed one is only forgotten once its in-flight requests
+    have finished, or after `drain_timeout`. The algorithms update their
+    indexes per server instead of being rebuilt.
+
+    The config file lists the desired pool; backends missing from it are removed:
+
+        {"backends": [{"url": "http://backend1:5000", "weight": 3},
+                      "http://backend2:5000"],
+         "drain": ["http://backend3:5000"]}
+    """
+
+    def __init__(
+        self,
+        load_balancer,
+        health_checker=None,
+        upstream=None,
+        config_path=None,
+        watch_interval=2.0,
+        drain_timeout=30.0,
+    ):
+        """
+        Initialize the membership manager.
+
+        Args:
+            load_balancer: The load balancer whose pool is managed.
+            health_checker (HealthChecker): Health checker to start and stop probes on.
+            upstream (UpstreamClient): Client whose per-backend pools are closed on removal.
+            config_path (str): JSON file to watch for the desired pool, or None.
+            watch_interval (float): Seconds between checks of the config file.
+            drain_timeout (float): Longest wait for in-flight requests of a removed backend.
+        """
+        self.load_balancer = load_balancer
+        self.health_checker = health_checker
+        self.upstream = upstream
+        self.config_path = config_path
+        self.watch_interval = watch_interval
+        self.drain_timeout = drain_timeout
+        self.inflight = {}
+        # Backends waiting for their in-flight requests before removal
+        self.removing = {}
+        self.config_mtime = None
+        self.task = None
+        self.logger = logging.getLogger("MembershipManager")
+
+    def acquired(self, server):
+        """Count a request the load balancer assigned to a server."""
+        self.inflight[server] = self.inflight.get(server, 0) + 1
+
+    def released(self, server):
+        """Count a finished request, completing a pending removal."""
+        count = self.inflight.get(server, 0) - 1
+        if count > 0:
+            self.inflight[server] = count
+            return
+        self.inflight.pop(server, None)
+        if server in self.removing:
+            self.finish_removal(server)
+
+    def validate(self, server, weight=None):
+        parts = urlsplit(server)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Invalid backend URL: {server}")
+        if weight is not None and (not isinstance(weight, int) or weight < 0):
+            raise ValueError(f"Invalid weight for {server}: {weight}")
+
+    def add(self, server, weight=None):
+        """
+        Add a backend, or bring back a draining one.
+
+        Args:
+            server (str): Backend URL.
+            weight (int): Weight for weighted algorithms, or None to keep the default.
+        """
+        self.validate(server, weight)
+        if weight is not None and not hasattr(self.load_balancer, "update_weight"):
+            raise ValueError("The load balancing algorithm does not use weights")
+        timer = self.removing.pop(server, None)
+        if timer is not None:
+            timer.cancel()
+        if self.load_balancer.add_server(server):
+            if self.health_checker is not None and self.health_checker.running:
+                self.health_checker.watch(server)
+        if weight is not None:
+            self.set_weight(server, weight)
+
+    def drain(self, server):
+        """Stop sending new requests to a backend."""
+        self.known(server)
+        self.load_balancer.drain_server(server)
+
+    def remove(self, server):
+        """Drain a backend and forget it once its in-flight requests are done."""
+        self.drain(server)
+        if server in self.removing:
+            return
+        if not self.inflight.get(server):
+            self.finish_removal(server)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+            timer = loop.call_later(self.drain_timeout, self.finish_removal, server)
+        except RuntimeError:
+            timer = None
+        self.removing[server] = timer
+        self.logger.info(
+            f"Removing {server} after {self.inflight[server]} in-flight requests"
+        )
+
+    def finish_removal(self, server):
+        timer = self.removing.pop(server, None)
+        if timer is not None:
+            timer.cancel()
+        if server not in self.load_balancer.servers:
+            return
+        self.load_balancer.remove_server(server)
+        if self.health_checker is not None:
+            self.health_checker.unwatch(server)
+        if self.upstream is not None:
+            try:
+                asyncio.get_running_loop().create_task(self.upstream.remove(server))
+            except RuntimeError:
+                pass
+
+    def set_weight(self, server, weight):
+        """Change the weight of a backend, for algorithms that use weights."""
+        self.validate(server, weight)
+        self.known(server)
+        if not hasattr(self.load_balancer, "update_weight"):
+            raise ValueError("The load balancing algorithm does not use weights")
+        self.load_balancer.update_weight(server, weight)
+
+    def known(self, server):
+        if server not in self.load_balancer.servers:
+            raise KeyError(f"Unknown backend: {server}")
+
+    def apply(self, config):
+        """
+        Converge the pool to a config.
+
+        Args:
+            config (dict): Desired pool, in the config file format.
+        """
+        desired = {}
+        for entry in config.get("backends", []):
+            if isinstance(entry, str):
+                entry = {"url": entry}
+            desired[entry["url"]] = entry.get("weight")
+        draining = set(config.get("drain", []))
+        for server in list(desired) + list(draining):
+            self.validate(server, desired.get(server))
+
+        for server in list(self.load_balancer.servers):
+            if server not in desired and server not in draining:
+                self.remove(server)
+        for server, weight in desired.items():
+            if server not in self.load_balancer.servers or server in (
+                self.load_balancer.draining
+            ):
+                self.add(server)
+            weights = getattr(self.load_balancer, "weights", None)
+            if weight is not None and weights is not None:
+                if weights.get(server) != weight:
+                    self.set_weight(server, weight)
+        for server in draining:
+            if server not in self.load_balancer.servers:
+                continue
+            self.drain(server)
+
+    def load_config(self):
+        """Apply the config file if it changed since it was last read."""
+        try:
+            mtime = os.stat(self.config_path).st_mtime
+        except OSError as e:
+            self.logger.error(f"Cannot read backend config: {str(e)}")
+            return
+        if mtime == self.config_mtime:
+            return
+        self.config_mtime = mtime
+        try:
+            with open(self.config_path) as f:
+                config = json.load(f)
+            self.apply(config)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.error(f"Invalid backend config {self.config_path}: {str(e)}")
+            return
+        self.logger.info(f"Applied backend config from {self.config_path}")
+
+    async def watch_loop(self):
+        while True:
+            self.load_config()
+            await asyncio.sleep(self.watch_interval)
+
+    async def start(self):
+        """Start watching the config file, if one is configured."""
+        if self.config_path:
+            self.task = asyncio.create_task(self.watch_loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        for timer in self.removing.values():
+            if timer is not None:
+                timer.cancel()
+
+    def get_status(self):
+        """
+        Get the state of every backend.
+
+        Returns:
+            dict: Per-server state, in-flight requests and weight if the algorithm has one.
+        """
+        lb = self.load_balancer
+        weights = getattr(lb, "weights", {})
+        status = {}
+        for server in lb.servers:
+            if server in self.removing:
+                state = "removing"
+            elif server in lb.draining:
+                state = "draining"
+            elif server in lb.healthy_servers:
+                state = "active"
+            else:
+                state = "unhealthy"
+            status[server] = {
+                "state": state,
+                "inflight": self.inflight.get(server, 0),
+            }
+            if server in weights:
+                status[server]["weight"] = weights[server]
+        return status
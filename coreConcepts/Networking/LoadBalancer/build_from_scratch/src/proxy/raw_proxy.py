@@ -0,0 +1,782 @@
+# Lean asyncio engines that bypass FastAPI.
+#
+# RawHttpProxy is an HTTP/1.1 forwarder built on asyncio Protocols. It parses only the request line,
+# the status line and the headers that decide message framing and keep-alive. Everything else is
+# spliced through as raw bytes, and connections are kept alive on both the client and backend side.
+# Both heads go through the HeaderPipeline of the FastAPI engine, but the framing headers are kept
+# as they are since bodies are never re-framed. https backends are reached over TLS.
+# TcpPassthroughProxy is a pure L4 proxy: it picks a backend per TCP connection and pipes bytes both ways.
+#
+# Both reuse the BaseLoadBalancer algorithms, circuit breakers, metrics and health checker of the FastAPI engine.
+
+import asyncio
+import logging
+import ssl
+import time
+from urllib.parse import urlsplit
+from src.proxy.headers import HeaderPipeline
+from src.proxy.membership import MembershipManager
+
+MAX_HEAD_SIZE = 64 * 1024
+CRLF2 = b"\r\n\r\n"
+
+# Body framing modes
+NO_BODY = 0
+LENGTH = 1
+CHUNKED = 2
+UNTIL_CLOSE = 3
+
+# Chunked parser states
+CHUNK_SIZE = 0
+CHUNK_DATA = 1
+CHUNK_DATA_END = 2
+CHUNK_TRAILER = 3
+
+
+class BodyFramer:
+    """Finds where an HTTP/1.1 message body ends, without decoding it."""
+
+    def __init__(self, mode, length=0):
+        self.mode = mode
+        self.remaining = length
+        self.state = CHUNK_SIZE
+        self.line = b""
+        self.done = mode == NO_BODY or (mode == LENGTH and length == 0)
+
+    def consume(self, data):
+        """
+        Advance over the body bytes at the start of `data`.
+
+        Args:
+            data (bytes): Bytes received after the head or previous body bytes.
+
+        Returns:
+            int: Number of leading bytes of `data` that belong to the body.
+        """
+        if self.done:
+            return 0
+        if self.mode == UNTIL_CLOSE:
+            return len(data)
+        if self.mode == LENGTH:
+            n = min(self.remaining, len(data))
+            self.remaining -= n
+            self.done = self.remaining == 0
+            return n
+
+        i = 0
+        size = len(data)
+        while i < size and not self.done:
+            if self.state == CHUNK_DATA:
+                n = min(self.remaining, size - i)
+                i += n
+                self.remaining -= n
+                if self.remaining == 0:
+                    self.state = CHUNK_DATA_END
+                continue
+            j = data.find(b"\n", i)
+            if j < 0:
+                self.line += data[i:]
+                return size
+            line = self.line + data[i:j]
+            self.line = b""
+            i = j + 1
+            if self.state == CHUNK_SIZE:
+                chunk_size = int(line.split(b";", 1)[0].strip(), 16)
+                if chunk_size == 0:
+                    self.state = CHUNK_TRAILER
+                else:
+                    self.remaining = chunk_size
+                    self.state = CHUNK_DATA
+            elif self.state == CHUNK_DATA_END:
+                self.state = CHUNK_SIZE
+            elif not line.strip():
+                self.done = True
+        return i
+
+
+def parse_head(head):
+    """
+    Split a message head into its start line and lower-cased headers.
+
+    Args:
+        head (bytes): Start line and headers, including the final blank line.
+
+    Returns:
+        tuple: (start line parts, list of (name, value) byte pairs).
+    """
+    lines = head[:-4].split(b"\r\n")
+    start = lines[0].split(b" ", 2)
+    headers = []
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        headers.append((name.strip().lower(), value.strip()))
+    return start, headers
+
+
+def body_framing(headers):
+    """Get the framing mode and length declared by a message's headers."""
+    length = None
+    for name, value in headers:
+        if name == b"transfer-encoding" and value.lower().endswith(b"chunked"):
+            return CHUNKED, 0
+        if name == b"content-length":
+            length = int(value)
+    if length is not None:
+        return LENGTH, length
+    return None, 0
+
+
+def framing_headers(headers):
+    """Get the Transfer-Encoding headers of a message, kept since its body is spliced as is."""
+    return [pair for pair in headers if pair[0] == b"transfer-encoding"]
+
+
+def build_head(start, headers):
+    """
+    Build a message head.
+
+    Args:
+        start (list): Start line parts.
+        headers (list): (name, value) byte pairs.
+
+    Returns:
+        bytes: Start line and headers, including the final blank line.
+    """
+    parts = [b" ".join(start), b"\r\n"]
+    for name, value in headers:
+        parts += (name, b": ", value, b"\r\n")
+    parts.append(b"\r\n")
+    return b"".join(parts)
+
+
+def wants_close(version, headers):
+    """Check whether a message ends its connection."""
+    for name, value in headers:
+        if name == b"connection":
+            tokens = value.lower()
+            if b"close" in tokens:
+                return True
+            if b"keep-alive" in tokens:
+                return False
+    return version == b"HTTP/1.0"
+
+
+class RawURL:
+    def __init__(self, target):
+        path, _, query = target.partition("?")
+        self.path = path
+        self.query = query
+
+
+class RawRequest:
+    """Minimal request view for algorithms that inspect the request."""
+
+    def __init__(self, method, target, headers, client):
+        self.method = method
+        self.url = RawURL(target)
+        self.raw_headers = headers
+        self.client = client
+        self._headers = None
+
+    @property
+    def headers(self):
+        if self._headers is None:
+            self._headers = {
+                name.decode("latin-1"): value.decode("latin-1")
+                for name, value in self.raw_headers
+            }
+        return self._headers
+
+    @property
+    def cookies(self):
+        cookies = {}
+        for part in self.headers.get("cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name:
+                cookies[name] = value
+        return cookies
+
+
+class ClientAddress:
+    def __init__(self, peer):
+        self.host = peer[0] if peer else None
+
+
+def error_response(status, reason):
+    body = f'{{"error": "{reason}"}}'.encode()
+    return (
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"content-type: application/json\r\n"
+        f"content-length: {len(body)}\r\n"
+        f"connection: close\r\n\r\n"
+    ).encode() + body
+
+
+class BackendProtocol(asyncio.Protocol):
+    """Keep-alive connection to a backend, relaying one response at a time."""
+
+    def __init__(self, server, engine):
+        self.server = server
+        self.engine = engine
+        self.transport = None
+        self.client = None
+        self.buffer = b""
+        self.framer = None
+        self.closed = False
+        self.keep_alive = True
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def start_response(self, client, method):
+        """Attach the client waiting for the next response."""
+        self.client = client
+        self.method = method
+        self.buffer = b""
+        self.framer = None
+        self.keep_alive = True
+
+    def data_received(self, data):
+        client = self.client
+        if client is None:
+            # Unsolicited bytes on an idle connection
+            self.transport.close()
+            return
+        if self.framer is None:
+            self.buffer += data
+            end = self.buffer.find(CRLF2)
+            if end < 0:
+                if len(self.buffer) > MAX_HEAD_SIZE:
+                    self.transport.close()
+                return
+            head = self.buffer[: end + 4]
+            data = self.buffer[end + 4 :]
+            self.buffer = b""
+            start, headers = parse_head(head)
+            status = int(start[1])
+            if status < 200:
+                # Interim response such as 100 Continue, the real one follows
+                client.transport.write(head)
+                if data:
+                    self.data_received(data)
+                return
+            client.status = status
+            self.keep_alive = not wants_close(start[0], headers)
+            if self.method == b"HEAD" or status in (204, 304):
+                self.framer = BodyFramer(NO_BODY)
+            else:
+                mode, length = body_framing(headers)
+                if mode is None:
+                    mode = UNTIL_CLOSE
+                    self.keep_alive = False
+                self.framer = BodyFramer(mode, length)
+            client.transport.write(client.response_head(start, headers, self.framer))
+            if self.framer.done:
+                self.finish()
+                return
+            if not data:
+                return
+
+        try:
+            n = self.framer.consume(data)
+        except ValueError:
+            # Malformed chunk size, the rest of the response cannot be framed
+            self.client = None
+            self.transport.close()
+            client.backend_failed(self, ValueError("Malformed chunked response"))
+            return
+        if n:
+            client.transport.write(data if n == len(data) else data[:n])
+        if self.framer.done:
+            if n < len(data):
+                # Bytes after the response: the backend is out of sync
+                self.keep_alive = False
+            self.finish()
+
+    def finish(self):
+        client, self.client = self.client, None
+        client.response_complete(self, self.keep_alive)
+
+    def pause_writing(self):
+        if self.client:
+            self.client.transport.pause_reading()
+
+    def resume_writing(self):
+        if self.client:
+            self.client.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        self.closed = True
+        client, self.client = self.client, None
+        if client is None:
+            return
+        if self.framer is not None and self.framer.mode == UNTIL_CLOSE:
+            client.response_complete(self, False)
+        else:
+            client.backend_failed(self, exc or ConnectionError("Backend closed"))
+
+
+class HttpClientProtocol(asyncio.Protocol):
+    """Client connection to the raw HTTP engine, handling one request at a time."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.transport = None
+        self.buffer = b""
+        self.busy = False
+        self.framer = None
+        self.backend = None
+        self.server = None
+        self.status = None
+        self.version = None
+        self.request_id = None
+        self.close_after = False
+        self.response_started = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peer = transport.get_extra_info("peername")
+        self.client = ClientAddress(self.peer)
+
+    def data_received(self, data):
+        if self.framer is not None and not self.framer.done and self.backend:
+            # Request body bytes go straight to the backend
+            try:
+                n = self.framer.consume(data)
+            except ValueError:
+                self.malformed_body()
+                return
+            self.backend.transport.write(data if n == len(data) else data[:n])
+            data = data[n:]
+            if not data:
+                return
+        self.buffer += data
+        if self.busy:
+            # Pipelined request, read it once the current response is done
+            if len(self.buffer) > MAX_HEAD_SIZE:
+                self.transport.pause_reading()
+            return
+        self.next_request()
+
+    def next_request(self):
+        end = self.buffer.find(CRLF2)
+        if end < 0:
+            if len(self.buffer) > MAX_HEAD_SIZE:
+                self.transport.write(
+                    error_response(431, "Request Header Fields Too Large")
+                )
+                self.transport.close()
+            return
+        head = self.buffer[: end + 4]
+        self.buffer = self.buffer[end + 4 :]
+        try:
+            start, headers = parse_head(head)
+            method, target, version = start
+            mode, length = body_framing(headers)
+        except ValueError:
+            self.transport.write(error_response(400, "Bad Request"))
+            self.transport.close()
+            return
+
+        self.busy = True
+        self.status = None
+        self.version = version
+        self.close_after = wants_close(version, headers)
+        self.framer = BodyFramer(mode or NO_BODY, length)
+        self.transport.pause_reading()
+        request = RawRequest(
+            method.decode("latin-1"), target.decode("latin-1"), headers, self.client
+        )
+        asyncio.ensure_future(self.dispatch(self.request_head(start, headers), request))
+
+    def request_head(self, start, headers):
+        """Build the head forwarded to the backend, with the client's Host header."""
+        pipeline = self.engine.header_pipeline
+        self.request_id = pipeline.raw_request_id(headers)
+        scope = {"headers": headers, "client": self.peer, "scheme": "http"}
+        forwarded = [pair for pair in headers if pair[0] == b"host"]
+        forwarded += pipeline.request_headers(scope, self.request_id)
+        forwarded += framing_headers(headers)
+        return build_head(start, forwarded)
+
+    def response_head(self, start, headers, framer):
+        """Build the head returned to the client for a backend's final response."""
+        pipeline = self.engine.header_pipeline
+        forwarded = pipeline.response_headers(headers)
+        forwarded += framing_headers(headers)
+        if self.close_after or framer.mode == UNTIL_CLOSE:
+            forwarded.append((b"connection", b"close"))
+        elif self.version == b"HTTP/1.0":
+            forwarded.append((b"connection", b"keep-alive"))
+        pipeline.set_response_id(forwarded, self.request_id)
+        return build_head(start, forwarded)
+
+    async def dispatch(self, head, request):
+        engine = self.engine
+        self.start_time = time.time()
+        server = engine.pick_server(request)
+        if not server:
+            engine.logger.error("No servers available")
+            self.fail(503, "Service Unavailable")
+            return
+        self.server = server
+        engine.load_balancer.backend_metrics.record_selection(server, "primary")
+
+        try:
+            backend = await engine.acquire(server)
+        except Exception as e:
+            engine.logger.error(f"Error connecting to {server}: {str(e)}")
+            engine.record(server, self.start_time, None, error=True)
+            engine.release(server)
+            self.fail(502, "Bad Gateway")
+            return
+        if self.transport.is_closing():
+            engine.release_backend(server, backend, True)
+            return
+
+        self.backend = backend
+        backend.start_response(self, request.method.encode("latin-1"))
+        backend.transport.write(head)
+        if self.buffer and not self.framer.done:
+            data, self.buffer = self.buffer, b""
+            try:
+                n = self.framer.consume(data)
+            except ValueError:
+                self.malformed_body()
+                return
+            backend.transport.write(data[:n])
+            self.buffer = data[n:]
+        self.transport.resume_reading()
+
+    def malformed_body(self):
+        """Abort a request whose chunked body cannot be framed."""
+        backend, self.backend = self.backend, None
+        if backend is not None:
+            backend.client = None
+            backend.transport.close()
+            self.engine.release(self.server)
+        if self.status is None:
+            self.fail(400, "Bad Request")
+        else:
+            self.transport.close()
+
+    def fail(self, status, reason):
+        self.transport.write(error_response(status, reason))
+        self.transport.close()
+        self.busy = False
+
+    def response_complete(self, backend, keep_alive):
+        engine = self.engine
+        engine.record(self.server, self.start_time, self.status)
+        engine.release_backend(self.server, backend, keep_alive and self.framer.done)
+        self.backend = None
+        self.busy = False
+        if (
+            self.close_after
+            or not self.framer.done
+            or backend.framer.mode == UNTIL_CLOSE
+        ):
+            # The response ended the connection, or came before the whole request body
+            self.transport.close()
+            return
+        self.transport.resume_reading()
+        if self.buffer:
+            self.next_request()
+
+    def backend_failed(self, backend, exc):
+        engine = self.engine
+        engine.logger.error(f"Error forwarding request to {self.server}: {str(exc)}")
+        engine.record(self.server, self.start_time, None, error=True)
+        engine.release(self.server)
+        self.backend = None
+        if self.status is None and backend.framer is None:
+            self.fail(502, "Bad Gateway")
+        else:
+            # Part of the response is already out, all we can do is cut it off
+            self.transport.close()
+
+    def pause_writing(self):
+        if self.backend:
+            self.backend.transport.pause_reading()
+
+    def resume_writing(self):
+        if self.backend:
+            self.backend.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        backend, self.backend = self.backend, None
+        if backend is not None:
+            backend.client = None
+            backend.transport.close()
+            self.engine.release(self.server)
+
+
+class TcpBackendProtocol(asyncio.Protocol):
+    def __init__(self, client):
+        self.client = client
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.client.transport.write(data)
+
+    def pause_writing(self):
+        self.client.transport.pause_reading()
+
+    def resume_writing(self):
+        self.client.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        self.client.transport.close()
+
+
+class TcpClientProtocol(asyncio.Protocol):
+    """Client connection to the TCP engine, piped to one backend."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.transport = None
+        self.backend = None
+        self.server = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.start_time = time.time()
+        # Hold client bytes back until the backend connection is up
+        transport.pause_reading()
+        asyncio.ensure_future(self.connect())
+
+    async def connect(self):
+        engine = self.engine
+        server = engine.pick_server(None)
+        if not server:
+            engine.logger.error("No servers available")
+            self.transport.close()
+            return
+        self.server = server
+        engine.load_balancer.backend_metrics.record_selection(server, "primary")
+        host, port = engine.address(server)
+        try:
+            _, self.backend = await asyncio.wait_for(
+                asyncio.get_running_loop().create_connection(
+                    lambda: TcpBackendProtocol(self), host, port
+                ),
+                engine.connect_timeout,
+            )
+        except Exception as e:
+            engine.logger.error(f"Error connecting to {server}: {str(e)}")
+            engine.record(server, self.start_time, None, error=True)
+            engine.release(server)
+            self.server = None
+            self.transport.close()
+            return
+        if self.transport.is_closing():
+            self.backend.transport.close()
+            return
+        self.transport.resume_reading()
+
+    def data_received(self, data):
+        self.backend.transport.write(data)
+
+    def pause_writing(self):
+        if self.backend:
+            self.backend.transport.pause_reading()
+
+    def resume_writing(self):
+        if self.backend:
+            self.backend.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        if self.backend is not None:
+            self.backend.transport.close()
+        if self.server is not None:
+            self.engine.record(
+                self.server, self.start_time, None, error=exc is not None
+            )
+            self.engine.release(self.server)
+            self.server = None
+
+
+class RawProxyServer:
+    """Shared lifecycle of the raw engines."""
+
+    protocol = None
+
+    def __init__(
+        self,
+        load_balancer,
+        host="0.0.0.0",
+        port=8080,
+        upstream=None,
+        health_checker=None,
+        connect_timeout=2.0,
+        max_idle_per_backend=100,
+        membership=None,
+        header_pipeline=None,
+    ):
+        """
+        Initialize the proxy engine.
+
+        Args:
+            load_balancer: The load balancer to use.
+            host (str): Host to bind the proxy to.
+            port (int): Port to bind the proxy to.
+            upstream (UpstreamClient): Client used for health probes, or None.
+            health_checker (HealthChecker): Active health checker for the backends,
+                or None to rely on circuit breakers alone.
+            connect_timeout (float): Timeout for opening a backend connection.
+            max_idle_per_backend (int): Idle keep-alive connections kept per backend.
+            membership (MembershipManager): Runtime changes to the backend pool.
+            header_pipeline (HeaderPipeline): Rewrites request and response heads of
+                the HTTP engine.
+        """
+        self.load_balancer = load_balancer
+        self.host = host
+        self.port = port
+        self.upstream = upstream
+        self.health_checker = health_checker
+        self.connect_timeout = connect_timeout
+        self.max_idle_per_backend = max_idle_per_backend
+        self.membership = membership or MembershipManager(
+            load_balancer, health_checker, upstream
+        )
+        self.header_pipeline = header_pipeline or HeaderPipeline()
+        # Verifies the certificates of https backends
+        self.ssl_context = ssl.create_default_context()
+        self.idle = {}
+        self.addresses = {}
+        # Set by ClusterSupervisor in each worker of a multi-process proxy
+        self.cluster = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def address(self, server):
+        """Get the (host, port) of a backend URL."""
+        address = self.addresses.get(server)
+        if address is None:
+            parts = urlsplit(server)
+            default_port = 443 if parts.scheme == "https" else 80
+            address = (parts.hostname, parts.port or default_port)
+            self.addresses[server] = address
+        return address
+
+    def pick_server(self, request):
+        """Get a server from the load balancer that its circuit breaker admits."""
+        self.load_balancer.refresh_breakers()
+        server = self.load_balancer.assign_server(request)
+        if server:
+            self.membership.acquired(server)
+        if server and not self.load_balancer.allow_request(server):
+            self.release(server)
+            return None
+        return server
+
+    def release(self, server):
+        """Release the connection if using least connections."""
+        if hasattr(self.load_balancer, "release_connection"):
+            self.load_balancer.release_connection(server)
+        self.membership.released(server)
+
+    def record(self, server, start_time, status, error=False):
+        response_time = time.time() - start_time
+        error = error or (status is not None and status >= 500)
+        if not error and hasattr(self.load_balancer, "record_response_time"):
+            self.load_balancer.record_response_time(server, response_time)
+        self.load_balancer.record_request_metrics(
+            server, response_time, error=error, status=status
+        )
+
+    async def acquire(self, server):
+        """Get an idle keep-alive connection to a backend, or open a new one."""
+        idle = self.idle.get(server)
+        while idle:
+            backend = idle.pop()
+            if not backend.closed and not backend.transport.is_closing():
+                return backend
+        host, port = self.address(server)
+        tls = self.ssl_context if server.startswith("https://") else None
+        _, backend = await asyncio.wait_for(
+            asyncio.get_running_loop().create_connection(
+                lambda: BackendProtocol(server, self), host, port, ssl=tls
+            ),
+            self.connect_timeout,
+        )
+        return backend
+
+    def release_backend(self, server, backend, keep_alive):
+        """Return a backend connection to the pool once its response is done."""
+        self.release(server)
+        idle = self.idle.setdefault(server, [])
+        if keep_alive and not backend.closed and len(idle) < self.max_idle_per_backend:
+            idle.append(backend)
+        else:
+            backend.transport.close()
+
+    async def start(self):
+        if self.upstream is not None:
+            await self.upstream.start(self.load_balancer.servers)
+        # In a cluster only the leader probes, the others follow its results
+        if self.health_checker is not None and (
+            self.cluster is None or self.cluster.leader
+        ):
+            await self.health_checker.start()
+        if self.cluster is not None:
+            if self.health_checker is not None:
+                self.cluster.attach(self.health_checker)
+            await self.cluster.start()
+        await self.membership.start()
+
+    async def stop(self):
+        await self.membership.stop()
+        if self.cluster is not None:
+            await self.cluster.stop()
+        if self.health_checker is not None:
+            await self.health_checker.stop()
+        if self.upstream is not None:
+            await self.upstream.close()
+        for idle in self.idle.values():
+            for backend in idle:
+                backend.transport.close()
+        self.idle = {}
+
+    async def serve_forever(self, sock=None):
+        """Start the engine and serve until cancelled."""
+        loop = asyncio.get_running_loop()
+        if sock is None:
+            server = await loop.create_server(
+                lambda: self.protocol(self), self.host, self.port, reuse_address=True
+            )
+        else:
+            server = await loop.create_server(lambda: self.protocol(self), sock=sock)
+        await self.start()
+        self.logger.info(f"Serving on {self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+    def serve(self, sock):
+        """Run the engine on an already bound socket, e.g. in a worker process."""
+        asyncio.run(self.serve_forever(sock))
+
+    def run(self):
+        """Run the proxy server."""
+        self.logger.info(f"Starting proxy on {self.host}:{self.port}")
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            pass
+
+
+class RawHttpProxy(RawProxyServer):
+    """HTTP/1.1 forwarder with keep-alive on both the client and backend side."""
+
+    protocol = HttpClientProtocol
+
+
+class TcpPassthroughProxy(RawProxyServer):
+    """L4 proxy that balances TCP connections instead of requests."""
+
+    protocol = TcpClientProtocol
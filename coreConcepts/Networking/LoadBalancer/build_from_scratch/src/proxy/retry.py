@@ -0,0 +1,138 @@
+import time
+from src.metrics.histogram import Histogram
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class RetryBudget:
+    """
+    Token bucket that caps retries to a share of regular traffic.
+
+    Every request deposits `ratio` tokens and every retry or hedge withdraws
+    one, so retries can never exceed `ratio` of the traffic. A small
+    per-second allowance lets low-traffic proxies retry at all.
+    """
+
+    def __init__(self, ratio=0.1, min_per_second=10, max_tokens=100):
+        """
+        Initialize the retry budget.
+
+        Args:
+            ratio (float): Retries allowed per request, e.g. 0.1 for 10%.
+            min_per_second (float): Retries allowed per second regardless of traffic.
+            max_tokens (float): Largest balance that can be saved up.
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.balance = min(min_per_second, max_tokens)
+        self.last_refill = time.monotonic()
+        self.retries = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        """Credit the budget for one incoming request."""
+        self.balance = min(self.balance + self.ratio, self.max_tokens)
+
+    def withdraw(self):
+        """
+        Spend one token for a retry.
+
+        Returns:
+            bool: True if the retry fits in the budget.
+        """
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.balance = min(
+            self.balance + elapsed * self.min_per_second, self.max_tokens
+        )
+        if self.balance >= 1:
+            self.balance -= 1
+            self.retries += 1
+            return True
+        self.exhausted += 1
+        return False
+
+
+class RetryPolicy:
+    """Retry and request hedging settings for idempotent requests."""
+
+    def __init__(
+        self,
+        max_retries=2,
+        retry_statuses=(502, 503, 504),
+        budget=None,
+        hedging=False,
+        hedge_quantile=0.95,
+        hedge_min_delay=0.01,
+        latency_window=1000,
+    ):
+        """
+        Initialize the retry policy.
+
+        Args:
+            max_retries (int): Retries per request after the first attempt.
+            retry_statuses (tuple): Upstream status codes that are retried.
+            budget (RetryBudget): Budget shared by retries and hedges.
+            hedging (bool): Send a second copy of slow idempotent requests.
+            hedge_quantile (float): Latency quantile after which a hedge is sent.
+            hedge_min_delay (float): Smallest delay in seconds before hedging.
+            latency_window (int): Latency samples per hedge delay estimate.
+        """
+        self.max_retries = max_retries
+        self.retry_statuses = frozenset(retry_statuses)
+        self.budget = budget or RetryBudget()
+        self.hedging = hedging
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.latency_window = latency_window
+        self.hedges = 0
+
+        # The delay is estimated from the last full window of latencies
+        self.current_latencies = Histogram()
+        self.previous_latencies = None
+        self.delay = None
+
+    def is_retryable(self, method):
+        """Check whether a request method may be sent more than once."""
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def observe(self, response_time):
+        """Record an upstream latency for the hedge delay estimate."""
+        self.current_latencies.observe(response_time)
+        if self.current_latencies.count >= self.latency_window:
+            self.previous_latencies = self.current_latencies
+            self.current_latencies = Histogram()
+            self.delay = None
+
+    def hedge_delay(self):
+        """
+        Get how long to wait for the first attempt before hedging.
+
+        Returns:
+            float: Delay in seconds, at least `hedge_min_delay`.
+        """
+        if self.delay is None:
+            latencies = self.previous_latencies or self.current_latencies
+            estimate = latencies.quantile(self.hedge_quantile)
+            if self.previous_latencies is None:
+                # Don't cache an estimate from a partial window
+                return max(estimate, self.hedge_min_delay)
+            self.delay = max(estimate, self.hedge_min_delay)
+        return self.delay
+
+    def get_metrics(self):
+        """
+        Get retry and hedging counters.
+
+        Returns:
+            dict: Dictionary containing retry metrics.
+        """
+        return {
+            "retries": self.budget.retries - self.hedges,
+            "hedges": self.hedges,
+            "budget_exhausted": self.budget.exhausted,
+            "budget_balance": self.budget.balance,
+            "hedge_delay": self.hedge_delay() if self.hedging else None,
+        }
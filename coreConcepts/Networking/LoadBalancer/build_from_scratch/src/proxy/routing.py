@@ -0,0 +1,167 @@
+import contextvars
+import logging
+
+# Route of the request being served, set by the proxy for the duration of the request
+current_route = contextvars.ContextVar("current_route", default=None)
+
+
+class Route:
+    """A host and path prefix served by its own backend pool."""
+
+    def __init__(
+        self,
+        name,
+        load_balancer,
+        host=None,
+        prefix="/",
+        health_checker=None,
+        timeout=None,
+    ):
+        """
+        Initialize a route.
+
+        Args:
+            name (str): Name of the route in the statistics.
+            load_balancer: Load balancer of the route's backends.
+            host (str): Host header the route applies to, or None for any host.
+            prefix (str): Path prefix, matched on whole path segments.
+            health_checker (HealthChecker): Active health checker of the route's backends.
+            timeout (float): Read timeout for upstream requests in seconds, or None
+                for the proxy default.
+        """
+        self.name = name
+        self.load_balancer = load_balancer
+        self.host = normalize_host(host) if host else None
+        self.prefix = "/" + "/".join(segments(prefix))
+        self.health_checker = health_checker
+        self.timeout = timeout
+        self.requests = 0
+
+    def get_metrics(self):
+        """
+        Get the route's statistics.
+
+        Returns:
+            dict: Match settings, matched requests and the load balancer's metrics.
+        """
+        metrics = {
+            "host": self.host,
+            "prefix": self.prefix,
+            "timeout": self.timeout,
+            "requests": self.requests,
+        }
+        metrics.update(self.load_balancer.get_metrics())
+        if self.health_checker is not None:
+            metrics["health"] = self.health_checker.get_status()
+        return metrics
+
+
+class PrefixNode:
+    """Node of a path prefix trie, one per path segment."""
+
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children = {}
+        self.route = None
+
+
+def segments(path):
+    """Split a path into its non-empty segments."""
+    return [segment for segment in path.split("/") if segment]
+
+
+def normalize_host(host):
+    """Lowercase a Host header and strip its port."""
+    host = host.strip().lower()
+    if host.startswith("["):
+        # IPv6 literal, e.g. [::1]:8080
+        return host.split("]", 1)[0] + "]"
+    return host.split(":", 1)[0]
+
+
+class RoutingTable:
+    """
+    Maps requests to routes by Host header and longest path prefix.
+
+    Every host has a trie of path segments, so a lookup costs one dict access
+    per segment of the request path no matter how many routes there are.
+    Routes without a host are tried when the host's own routes do not match.
+    """
+
+    def __init__(self, routes=()):
+        """
+        Initialize the routing table.
+
+        Args:
+            routes (iterable): Routes to add.
+        """
+        # Trie root per host, None for routes that apply to any host
+        self.hosts = {}
+        self.routes = []
+        self.logger = logging.getLogger("RoutingTable")
+        for route in routes:
+            self.add(route)
+
+    def add(self, route):
+        """
+        Add a route.
+
+        Raises:
+            ValueError: If a route with the same host and prefix exists.
+        """
+        node = self.hosts.setdefault(route.host, PrefixNode())
+        for segment in segments(route.prefix):
+            node = node.children.setdefault(segment, PrefixNode())
+        if node.route is not None:
+            raise ValueError(
+                f"Route {route.name} duplicates {node.route.name}: "
+                f"{route.host or '*'}{route.prefix}"
+            )
+        node.route = route
+        self.routes.append(route)
+        self.logger.info(f"Added route {route.name}: {route.host or '*'}{route.prefix}")
+
+    def lookup(self, root, path):
+        route = root.route
+        node = root
+        for segment in path.split("/"):
+            if not segment:
+                continue
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.route is not None:
+                route = node.route
+        return route
+
+    def match(self, host, path):
+        """
+        Find the route of a request.
+
+        Args:
+            host (str): The request's Host header.
+            path (str): The request path.
+
+        Returns:
+            Route: The route with the longest matching prefix, or None.
+        """
+        route = None
+        if host:
+            root = self.hosts.get(normalize_host(host))
+            if root is not None:
+                route = self.lookup(root, path)
+        if route is None:
+            root = self.hosts.get(None)
+            if root is not None:
+                route = self.lookup(root, path)
+        return route
+
+    def get_metrics(self):
+        """
+        Get the statistics of every route.
+
+        Returns:
+            dict: Route name to the route's metrics.
+        """
+        return {route.name: route.get_metrics() for route in self.routes}
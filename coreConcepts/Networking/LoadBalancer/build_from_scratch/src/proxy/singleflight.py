@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from src.proxy.routing import segments
+
+
+class Singleflight:
+    """
+    Collapses concurrent identical requests into one upstream call.
+
+    The first request for a key becomes the leader and is forwarded as usual.
+    Identical requests arriving while it is in flight wait for its response
+    instead of being assigned a backend of their own. Requests are identical
+    when their method, host, path, query and `key_headers` match.
+
+    Only requests without a body are collapsed, and only under `routes` if
+    given. Once `max_flights` keys are in flight or a flight has `max_waiters`
+    waiting requests, further requests are forwarded on their own.
+    """
+
+    def __init__(
+        self,
+        methods=("GET", "HEAD"),
+        key_headers=("accept", "accept-encoding", "authorization", "cookie"),
+        routes=None,
+        max_flights=10000,
+        max_waiters=1000,
+    ):
+        """
+        Initialize the singleflight stage.
+
+        Args:
+            methods (iterable): HTTP methods whose requests may be collapsed.
+            key_headers (iterable): Request headers that must match for requests to be
+                identical. Anything that changes the response belongs here.
+            routes (iterable): Path prefixes to collapse requests for, matched on whole
+                path segments like the routing table, or None for all paths.
+            max_flights (int): Most distinct keys in flight at once.
+            max_waiters (int): Most requests waiting on one flight.
+        """
+        self.methods = frozenset(method.upper() for method in methods)
+        self.key_headers = tuple(name.lower() for name in key_headers)
+        # Segments of every prefix, so /api covers /api/users but not /apiv2
+        self.routes = (
+            tuple(tuple(segments(route)) for route in routes) if routes else None
+        )
+        self.max_flights = max_flights
+        self.max_waiters = max_waiters
+        # In-flight leaders by key, each a future and its number of waiters
+        self.flights = {}
+        self.logger = logging.getLogger("Singleflight")
+
+        self.leaders = 0
+        self.shared = 0
+        self.bypassed = 0
+
+    def applies(self, method, path, headers):
+        """
+        Check whether a request may be collapsed with identical ones.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Request path, starting with a slash.
+            headers: Request headers with lowercase names.
+
+        Returns:
+            bool: True if the method and route are enabled and the request has no body.
+        """
+        if method not in self.methods:
+            return False
+        if "content-length" in headers or "transfer-encoding" in headers:
+            return False
+        if self.routes is None:
+            return True
+        parts = tuple(segments(path))
+        return any(parts[: len(route)] == route for route in self.routes)
+
+    def key(self, method, url, headers):
+        """Get the key under which identical requests are collapsed."""
+        return (method, headers.get("host", ""), url) + tuple(
+            headers.get(name) for name in self.key_headers
+        )
+
+    async def do(self, key, call):
+        """
+        Run a call once for all concurrent requests with the same key.
+
+        Args:
+            key (tuple): Key of the request.
+            call (callable): Coroutine function forwarding the request.
+
+        Returns:
+            The result of the call, shared with every request waiting on it.
+        """
+        flight = self.flights.get(key)
+        if flight is not None:
+            if flight[1] >= self.max_waiters:
+                self.bypassed += 1
+                return await call()
+            flight[1] += 1
+            self.shared += 1
+            future = flight[0]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader went away, so this request goes upstream itself
+                return await self.do(key, call)
+
+        if len(self.flights) >= self.max_flights:
+            self.bypassed += 1
+            return await call()
+
+        future = asyncio.get_running_loop().create_future()
+        self.flights[key] = [future, 0]
+        self.leaders += 1
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when no other request was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.flights[key]
+
+    def get_metrics(self):
+        """
+        Get singleflight statistics.
+
+        Returns:
+            dict: Upstream calls made, requests that shared one, requests over the limits.
+        """
+        return {
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "bypassed": self.bypassed,
+            "in_flight": len(self.flights),
+        }
@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import httpx
+
+
+class UpstreamClient:
+    """
+    Shared async HTTP client with one keep-alive connection pool per backend.
+
+    With ``http2`` enabled, backends are spoken to in cleartext HTTP/2 with
+    prior knowledge (h2c) instead: every backend gets ``h2_connections``
+    connections and each request is one stream on the connection with the
+    fewest open streams. At most ``max_streams`` streams are open per
+    connection; further requests wait for one to close, up to the pool timeout.
+    """
+
+    def __init__(
+        self,
+        pool_size=100,
+        keepalive_pool_size=20,
+        idle_timeout=30.0,
+        connect_timeout=2.0,
+        read_timeout=10.0,
+        http2=False,
+        max_streams=100,
+        h2_connections=2,
+    ):
+        """
+        Initialize the upstream client.
+
+        Args:
+            pool_size (int): Maximum open connections per backend.
+            keepalive_pool_size (int): Maximum idle connections kept per backend.
+            idle_timeout (float): Seconds an idle connection is kept before closing.
+            connect_timeout (float): Timeout for establishing a connection.
+            read_timeout (float): Timeout for reading the upstream response.
+            http2 (bool): Speak h2c to the backends instead of HTTP/1.1.
+            max_streams (int): Maximum concurrent streams per HTTP/2 connection.
+            h2_connections (int): HTTP/2 connections opened per backend.
+        """
+        self.http2 = http2
+        self.max_streams = max_streams
+        self.h2_connections = h2_connections if http2 else 1
+        if http2:
+            # httpcore sends every request over its first HTTP/2 connection, so each
+            # connection gets a client of its own and streams are spread by hand
+            self.limits = httpx.Limits(
+                max_connections=1,
+                max_keepalive_connections=1,
+                keepalive_expiry=idle_timeout,
+            )
+        else:
+            self.limits = httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=min(keepalive_pool_size, pool_size),
+                keepalive_expiry=idle_timeout,
+            )
+        self.timeout = httpx.Timeout(
+            read_timeout, connect=connect_timeout, pool=connect_timeout
+        )
+        # Clients of every backend, one per HTTP/2 connection or a single pooled one
+        self.clients = {}
+        # Open streams per HTTP/2 connection and the free stream slots of every backend
+        self.streams = {}
+        self.slots = {}
+        # Connection index of every streamed response that is still open
+        self.leases = {}
+        self.stream_waits = 0
+        self.stream_timeouts = 0
+        self.logger = logging.getLogger("UpstreamClient")
+
+    def _create_client(self, server):
+        return httpx.AsyncClient(
+            base_url=server,
+            limits=self.limits,
+            timeout=self.timeout,
+            follow_redirects=False,
+            http1=not self.http2,
+            http2=self.http2,
+        )
+
+    def connections_for(self, server):
+        """
+        Get the clients of a backend, creating them on first use.
+
+        Args:
+            server (str): Backend server URL.
+
+        Returns:
+            list: One client per HTTP/2 connection, or the backend's pooled client.
+        """
+        clients = self.clients.get(server)
+        if clients is None:
+            clients = [self._create_client(server) for _ in range(self.h2_connections)]
+            self.clients[server] = clients
+            if self.http2:
+                self.streams[server] = [0] * len(clients)
+                self.slots[server] = asyncio.Semaphore(self.max_streams * len(clients))
+        return clients
+
+    def client_for(self, server):
+        """
+        Get the pooled client for a backend, creating it on first use.
+
+        Args:
+            server (str): Backend server URL.
+
+        Returns:
+            httpx.AsyncClient: Client bound to the backend's connection pool.
+        """
+        return self.connections_for(server)[0]
+
+    async def open_stream(self, server):
+        """
+        Wait for a free stream on one of a backend's HTTP/2 connections.
+
+        Args:
+            server (str): Backend server URL.
+
+        Returns:
+            int: Index of the connection the stream was opened on.
+
+        Raises:
+            httpx.PoolTimeout: If no stream was freed within the pool timeout.
+        """
+        self.connections_for(server)
+        slots = self.slots[server]
+        if slots.locked():
+            self.stream_waits += 1
+            try:
+                await asyncio.wait_for(slots.acquire(), self.timeout.pool)
+            except asyncio.TimeoutError:
+                self.stream_timeouts += 1
+                raise httpx.PoolTimeout(f"No free HTTP/2 stream to {server}")
+        else:
+            await slots.acquire()
+        # Fewer open streams than the limit in total means one connection has room
+        streams = self.streams[server]
+        index = min(range(len(streams)), key=streams.__getitem__)
+        streams[index] += 1
+        return index
+
+    def close_stream(self, server, index):
+        """Free a stream opened with ``open_stream``."""
+        streams = self.streams.get(server)
+        # The backend may have been removed while the stream was open
+        if streams is not None:
+            streams[index] -= 1
+            self.slots[server].release()
+
+    async def start(self, servers):
+        """Open a pool for every known backend."""
+        for server in servers:
+            self.client_for(server)
+        self.logger.info(f"Opened upstream pools for {len(self.clients)} servers")
+
+    async def remove(self, server):
+        """Close the pool of a backend that left the fleet."""
+        self.streams.pop(server, None)
+        self.slots.pop(server, None)
+        for client in self.clients.pop(server, ()):
+            await client.aclose()
+
+    async def close(self):
+        """Close all pools and their keep-alive connections."""
+        clients, self.clients = self.clients, {}
+        self.streams = {}
+        self.slots = {}
+        for backend_clients in clients.values():
+            for client in backend_clients:
+                await client.aclose()
+        self.logger.info("Closed upstream pools")
+
+    def timeout_for(self, read_timeout):
+        """Get the timeouts for a request, with its own read timeout if given."""
+        if read_timeout is None:
+            return self.timeout
+        return httpx.Timeout(
+            read_timeout, connect=self.timeout.connect, pool=self.timeout.pool
+        )
+
+    async def request(
+        self, server, method, path, headers=None, content=None, read_timeout=None
+    ):
+        """
+        Send a request to a backend over its pooled connections.
+
+        Args:
+            server (str): Backend server URL.
+            method (str): HTTP method.
+            path (str): Request path relative to the backend root.
+            headers (dict): Headers to forward.
+            content (bytes): Request body.
+            read_timeout (float): Read timeout for this request, or None for the default.
+
+        Returns:
+            httpx.Response: The buffered upstream response.
+        """
+        if not self.http2:
+            return await self.client_for(server).request(
+                method,
+                path,
+                headers=headers,
+                content=content,
+                timeout=self.timeout_for(read_timeout),
+            )
+        index = await self.open_stream(server)
+        try:
+            return await self.clients[server][index].request(
+                method,
+                path,
+                headers=headers,
+                content=content,
+                timeout=self.timeout_for(read_timeout),
+            )
+        finally:
+            self.close_stream(server, index)
+
+    async def stream(
+        self, server, method, path, headers=None, content=None, read_timeout=None
+    ):
+        """
+        Send a request to a backend without buffering either body.
+
+        The request body is pulled from ``content`` only as fast as the
+        backend accepts it, and the returned response has not been read yet:
+        the caller iterates it and must close it with ``finish()``, which also
+        frees its HTTP/2 stream.
+
+        Args:
+            server (str): Backend server URL.
+            method (str): HTTP method.
+            path (str): Request path relative to the backend root.
+            headers (dict): Headers to forward.
+            content: Async iterator of request body chunks, or None.
+            read_timeout (float): Read timeout for this request, or None for the default.
+
+        Returns:
+            httpx.Response: The upstream response with its body still open.
+        """
+        index = await self.open_stream(server) if self.http2 else 0
+        try:
+            client = self.connections_for(server)[index]
+            upstream_request = client.build_request(
+                method,
+                path,
+                headers=headers,
+                content=content,
+                timeout=self.timeout_for(read_timeout),
+            )
+            resp = await client.send(upstream_request, stream=True)
+        except BaseException:
+            if self.http2:
+                self.close_stream(server, index)
+            raise
+        if self.http2:
+            self.leases[resp] = (server, index)
+        return resp
+
+    async def finish(self, resp):
+        """Close a streamed response and free its stream."""
+        try:
+            await resp.aclose()
+        finally:
+            lease = self.leases.pop(resp, None)
+            if lease is not None:
+                self.close_stream(*lease)
+
+    def get_metrics(self):
+        """
+        Get upstream transport statistics.
+
+        Returns:
+            dict: Protocol, open streams per backend connection and waits for a free stream.
+        """
+        return {
+            "protocol": "h2c" if self.http2 else "http/1.1",
+            "max_streams": self.max_streams if self.http2 else None,
+            "connections_per_backend": self.h2_connections if self.http2 else None,
+            "streams": {
+                server: list(streams) for server, streams in self.streams.items()
+            },
+            "stream_waits": self.stream_waits,
+            "stream_timeouts": self.stream_timeouts,
+        }
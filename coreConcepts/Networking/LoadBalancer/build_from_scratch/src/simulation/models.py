@@ -0,0 +1,56 @@
+# Seeded service-time models for simulated and stub backends.
+# A model is written as "<kind>:<params>" with times in seconds:
+#   const:X                  every request takes X
+#   uniform:A:B              uniform between A and B
+#   exp:MEAN                 exponential, i.e. an M/M/c server when arrivals are Poisson
+#   lognormal:MEDIAN:SIGMA   log-normal, a common fit for real service times
+#   pareto:SCALE:ALPHA       heavy-tailed, the mean is infinite for ALPHA <= 1
+
+import math
+import random
+
+
+class ServiceTime:
+    """Random service time generator described by a model spec."""
+
+    def __init__(self, spec, seed=None):
+        """
+        Initialize the model.
+
+        Args:
+            spec (str): Model kind and parameters, e.g. "exp:0.01".
+            seed (int): Seed of the model's own random generator.
+        """
+        self.spec = spec
+        rng = random.Random(seed)
+        kind, *params = spec.split(":")
+        try:
+            params = [float(p) for p in params]
+            if kind == "const":
+                (value,) = params
+                self.mean = value
+                self.sample = lambda: value
+            elif kind == "uniform":
+                low, high = params
+                self.mean = (low + high) / 2
+                self.sample = lambda: rng.uniform(low, high)
+            elif kind == "exp":
+                (mean,) = params
+                self.mean = mean
+                self.sample = lambda: rng.expovariate(1 / mean) if mean else 0.0
+            elif kind == "lognormal":
+                median, sigma = params
+                mu = math.log(median)
+                self.mean = median * math.exp(sigma * sigma / 2)
+                self.sample = lambda: rng.lognormvariate(mu, sigma)
+            elif kind == "pareto":
+                scale, alpha = params
+                self.mean = scale * alpha / (alpha - 1) if alpha > 1 else math.inf
+                self.sample = lambda: scale * rng.paretovariate(alpha)
+            else:
+                raise ValueError(f"Unknown service time model: {spec}")
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid service time model {spec!r}: {e}") from None
+
+    def __repr__(self):
+        return f"ServiceTime({self.spec!r})"
@@ -0,0 +1,457 @@
+# Deterministic discrete-event simulator for the load balancing algorithms.
+# The real algorithm classes pick servers on a virtual clock while simulated backends queue and
+# serve requests with seeded service-time models, so millions of requests take seconds instead
+# of hours and every run with the same seed gives the same numbers.
+#
+# Each backend is a FIFO queue in front of `workers` parallel servers. With Poisson arrivals and
+# exponential service times this is an M/M/c queue per backend. Backends can be failed (requests
+# error out fast) or degraded (service times multiplied) for part of the run, and a simulated
+# active health checker probes them through the same HealthChecker logic the proxy uses.
+#
+# Run from the project root, e.g.:
+#   python -m src.simulation.simulator --scenario degraded --requests 1000000
+
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import math
+import random
+import time
+from collections import deque
+from src.algorithms.round_robin import RoundRobinLoadBalancer
+from src.algorithms.weighted_round_robin import WeightedRoundRobinLoadBalancer
+from src.algorithms.least_connection import LeastConnectionsLoadBalancer
+from src.algorithms.least_response_time import LeastResponseTimeLoadBalancer
+from src.algorithms.peak_ewma import PeakEwmaLoadBalancer
+from src.algorithms.consistent_hash import ConsistentHashLoadBalancer
+from src.proxy.health import HealthChecker
+from src.simulation.models import ServiceTime
+
+ALGORITHMS = {
+    "round_robin": RoundRobinLoadBalancer,
+    # Same example weights as src/main.py
+    "weighted_round_robin": lambda servers: WeightedRoundRobinLoadBalancer(
+        servers, {server: i + 1 for i, server in enumerate(servers)}
+    ),
+    "least_connections": LeastConnectionsLoadBalancer,
+    "least_response_time": LeastResponseTimeLoadBalancer,
+    "peak_ewma": PeakEwmaLoadBalancer,
+    "consistent_hash": ConsistentHashLoadBalancer,
+}
+
+# Preset backend models. Failure and degradation windows are fractions of the run.
+SCENARIOS = {
+    "mmc": {"service": ["exp:0.01"]},
+    "heavy_tail": {"service": ["pareto:0.005:1.5"]},
+    "degraded": {"service": ["exp:0.01"], "degrade": ["0:5:0.25:0.75"]},
+    "failure": {"service": ["exp:0.01"], "fail": ["0:0.25:0.5"]},
+}
+
+# Event kinds. Arrivals are generated on the fly and never enter the event heap.
+COMPLETE = 1
+FAIL = 2
+RECOVER = 3
+DEGRADE = 4
+RESTORE = 5
+PROBE = 6
+
+
+class SimBackend:
+    """A simulated backend: a FIFO queue served by parallel workers."""
+
+    __slots__ = (
+        "server",
+        "model",
+        "workers",
+        "busy",
+        "queue",
+        "factor",
+        "down",
+        "requests",
+        "errors",
+        "busy_time",
+    )
+
+    def __init__(self, server, model, workers):
+        self.server = server
+        self.model = model
+        self.workers = workers
+        self.busy = 0
+        self.queue = deque()
+        self.factor = 1.0  # service time multiplier while degraded
+        self.down = False
+        self.requests = 0
+        self.errors = 0
+        self.busy_time = 0.0
+
+
+def summarize(samples):
+    """Get the mean and tail percentiles of a list of durations in milliseconds."""
+    if not samples:
+        return {}
+    samples.sort()
+    count = len(samples)
+
+    def at(q):
+        return round(samples[min(int(q * count), count - 1)] * 1000, 3)
+
+    return {
+        "mean": round(math.fsum(samples) / count * 1000, 3),
+        "p50": at(0.5),
+        "p99": at(0.99),
+        "p999": at(0.999),
+        "max": at(1.0),
+    }
+
+
+class Simulator:
+    """Runs one load balancer against simulated backends on a virtual clock."""
+
+    def __init__(
+        self,
+        load_balancer,
+        models,
+        rate,
+        requests,
+        workers=1,
+        keys=1000,
+        seed=0,
+        failures=(),
+        degradations=(),
+        health_interval=1.0,
+        fail_latency=0.001,
+    ):
+        """
+        Initialize the simulator.
+
+        Args:
+            load_balancer: The load balancer under test, built for the simulated servers.
+            models (list): ServiceTime model of each server, in server order.
+            rate (float): Mean Poisson arrival rate in requests per second.
+            requests (int): Number of requests to simulate.
+            workers (int): Parallel workers per backend (the c in M/M/c).
+            keys (int): Number of distinct request keys, for key-based algorithms.
+            seed (int): Seed of the arrival process and the algorithms' randomness.
+            failures (list): (backend index, start, end) windows during which the
+                backend is down, with start and end in seconds.
+            degradations (list): (backend index, factor, start, end) windows during
+                which the backend's service times are multiplied by factor.
+            health_interval (float): Seconds between simulated health probes,
+                or None to rely on circuit breakers alone.
+            fail_latency (float): Time for a request to a down backend to fail.
+        """
+        self.load_balancer = load_balancer
+        self.backends = [
+            SimBackend(server, model, workers)
+            for server, model in zip(load_balancer.servers, models)
+        ]
+        self.by_server = {backend.server: backend for backend in self.backends}
+        self.rate = rate
+        self.requests = requests
+        self.keys = keys
+        self.seed = seed
+        self.failures = failures
+        self.degradations = degradations
+        self.health_interval = health_interval
+        self.fail_latency = fail_latency
+
+        self.now = 0.0
+        self.events = []
+        self.sequence = itertools.count()
+        self.sent = 0
+        self.finished = 0
+        self.rejected = 0
+        self.errors = 0
+        self.response_times = []
+        self.queueing_delays = []
+
+        self.has_response_time = hasattr(load_balancer, "record_response_time")
+        self.has_release = hasattr(load_balancer, "release_connection")
+        self.health_checker = HealthChecker(load_balancer, None)
+
+    def schedule(self, at, kind, data=None):
+        # The sequence number keeps simultaneous events in scheduling order
+        heapq.heappush(self.events, (at, next(self.sequence), kind, data))
+
+    def arrive(self, key):
+        lb = self.load_balancer
+        lb.refresh_breakers()
+        server = lb.assign_server(key)
+        if server is None:
+            self.rejected += 1
+            self.finished += 1
+            return
+        if not lb.allow_request(server):
+            if self.has_release:
+                lb.release_connection(server)
+            self.rejected += 1
+            self.finished += 1
+            return
+
+        backend = self.by_server[server]
+        backend.requests += 1
+        if backend.down:
+            self.schedule(
+                self.now + self.fail_latency, COMPLETE, (backend, self.now, None)
+            )
+        elif backend.busy < backend.workers:
+            self.start(backend, self.now)
+        else:
+            backend.queue.append(self.now)
+
+    def start(self, backend, arrival):
+        backend.busy += 1
+        service = backend.model.sample() * backend.factor
+        backend.busy_time += service
+        self.queueing_delays.append(self.now - arrival)
+        self.schedule(self.now + service, COMPLETE, (backend, arrival, service))
+
+    def complete(self, backend, arrival, service):
+        if service is not None:
+            backend.busy -= 1
+            if backend.queue:
+                self.start(backend, backend.queue.popleft())
+
+        lb = self.load_balancer
+        server = backend.server
+        response_time = self.now - arrival
+        # Requests served by a backend that went down meanwhile fail too
+        error = service is None or backend.down
+        if error:
+            backend.errors += 1
+            self.errors += 1
+        else:
+            self.response_times.append(response_time)
+            if self.has_response_time:
+                lb.record_response_time(server, response_time)
+        lb.record_request_metrics(
+            server, response_time, error=error, status=None if error else 200
+        )
+        if self.has_release:
+            lb.release_connection(server)
+        self.finished += 1
+
+    def fail(self, backend):
+        backend.down = True
+        # Queued requests are refused at once
+        while backend.queue:
+            arrival = backend.queue.popleft()
+            self.schedule(
+                self.now + self.fail_latency, COMPLETE, (backend, arrival, None)
+            )
+
+    def probe(self):
+        for backend in self.backends:
+            self.health_checker.record_probe(backend.server, not backend.down, 0.0)
+        self.schedule(self.now + self.health_interval, PROBE)
+
+    def run(self):
+        """
+        Simulate all requests.
+
+        Returns:
+            dict: Throughput, latency, queueing delay and per-backend statistics.
+        """
+        wall_start = time.perf_counter()
+        lb = self.load_balancer
+        lb.clock = lambda: self.now
+        # Some algorithms pick with the global random module
+        random.seed(self.seed)
+        rng = random.Random(self.seed)
+        keys = [str(i) for i in range(self.keys)]
+
+        for index, start, end in self.failures:
+            self.schedule(start, FAIL, self.backends[index])
+            self.schedule(end, RECOVER, self.backends[index])
+        for index, factor, start, end in self.degradations:
+            self.schedule(start, DEGRADE, (self.backends[index], factor))
+            self.schedule(end, RESTORE, self.backends[index])
+        if self.health_interval:
+            self.schedule(self.health_interval, PROBE)
+
+        events = self.events
+        heappop = heapq.heappop
+        expovariate = rng.expovariate
+        uniform = rng.random
+        rate = self.rate
+        key_count = self.keys
+        next_arrival = expovariate(rate)
+        while self.finished < self.requests:
+            if self.sent < self.requests and (
+                not events or next_arrival <= events[0][0]
+            ):
+                self.now = next_arrival
+                self.sent += 1
+                self.arrive(keys[int(uniform() * key_count)])
+                next_arrival += expovariate(rate)
+                continue
+            if not events:
+                break
+            self.now, _, kind, data = heappop(events)
+            if kind == COMPLETE:
+                self.complete(*data)
+            elif kind == PROBE:
+                self.probe()
+            elif kind == FAIL:
+                self.fail(data)
+            elif kind == RECOVER:
+                data.down = False
+            elif kind == DEGRADE:
+                data[0].factor = data[1]
+            elif kind == RESTORE:
+                data.factor = 1.0
+
+        duration = self.now
+        served = len(self.response_times)
+        return {
+            "requests": self.requests,
+            "completed": served,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "simulated_seconds": round(duration, 3),
+            "wall_seconds": round(time.perf_counter() - wall_start, 3),
+            "throughput": round(served / duration, 1) if duration else 0,
+            "response_time_ms": summarize(self.response_times),
+            "queueing_delay_ms": summarize(self.queueing_delays),
+            "backends": {
+                backend.server: {
+                    "model": backend.model.spec,
+                    "requests": backend.requests,
+                    "share": round(backend.requests / self.sent, 4),
+                    "errors": backend.errors,
+                    "utilization": round(
+                        backend.busy_time / (backend.workers * duration), 4
+                    ),
+                }
+                for backend in self.backends
+            },
+        }
+
+
+def parse_window(spec, fields):
+    """Split an "a:b:c" command line window into numbers."""
+    parts = spec.split(":")
+    if len(parts) != fields:
+        raise argparse.ArgumentTypeError(f"Expected {fields} fields in {spec!r}")
+    return [int(parts[0])] + [float(p) for p in parts[1:]]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Discrete-event simulation of the load balancing algorithms"
+    )
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="mmc")
+    parser.add_argument(
+        "--algorithms", default=",".join(ALGORITHMS), help="Comma-separated list"
+    )
+    parser.add_argument("--backends", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4, help="Workers per backend")
+    parser.add_argument(
+        "--service",
+        action="append",
+        help="Service time model per backend, cycled over the backends",
+    )
+    parser.add_argument(
+        "--load", type=float, default=0.8, help="Offered load relative to capacity"
+    )
+    parser.add_argument("--rate", type=float, help="Arrival rate, overrides --load")
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--fail",
+        action="append",
+        help="INDEX:START:END, backend down between fractions of the run",
+    )
+    parser.add_argument(
+        "--degrade",
+        action="append",
+        help="INDEX:FACTOR:START:END, backend slowed between fractions of the run",
+    )
+    parser.add_argument("--health-interval", type=float, default=1.0)
+    parser.add_argument(
+        "--slow-start",
+        type=float,
+        default=0.0,
+        help="Seconds over which recovered backends ramp up, 0 to disable",
+    )
+    parser.add_argument("--output", help="Write the JSON report to a file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.disable(logging.WARNING)
+    scenario = SCENARIOS[args.scenario]
+    specs = args.service or scenario["service"]
+    models = [
+        ServiceTime(specs[i % len(specs)], seed=args.seed * 1009 + i)
+        for i in range(args.backends)
+    ]
+    capacity = sum(args.workers / model.mean for model in models)
+    rate = args.rate or args.load * capacity
+    # Windows are given as fractions of the expected run length
+    length = args.requests / rate
+    failures = [
+        (index, start * length, end * length)
+        for index, start, end in (
+            parse_window(spec, 3) for spec in args.fail or scenario.get("fail", [])
+        )
+    ]
+    degradations = [
+        (index, factor, start * length, end * length)
+        for index, factor, start, end in (
+            parse_window(spec, 4)
+            for spec in args.degrade or scenario.get("degrade", [])
+        )
+    ]
+
+    servers = [f"http://backend-{i}:5000" for i in range(args.backends)]
+    report = {
+        "config": {
+            "scenario": args.scenario,
+            "models": [model.spec for model in models],
+            "workers": args.workers,
+            "rate": round(rate, 1),
+            "offered_load": round(rate / capacity, 3) if capacity else None,
+            "requests": args.requests,
+            "seed": args.seed,
+            "failures": failures,
+            "degradations": degradations,
+            "slow_start": args.slow_start,
+        },
+        "results": {},
+    }
+    for algorithm in args.algorithms.split(","):
+        # Fresh models per algorithm so results do not depend on the order of runs
+        models = [
+            ServiceTime(model.spec, seed=args.seed * 1009 + i)
+            for i, model in enumerate(models)
+        ]
+        load_balancer = ALGORITHMS[algorithm](list(servers))
+        load_balancer.configure_slow_start(args.slow_start)
+        simulator = Simulator(
+            load_balancer,
+            models,
+            rate,
+            args.requests,
+            workers=args.workers,
+            keys=args.keys,
+            seed=args.seed,
+            failures=failures,
+            degradations=degradations,
+            health_interval=args.health_interval or None,
+        )
+        report["results"][algorithm] = simulator.run()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
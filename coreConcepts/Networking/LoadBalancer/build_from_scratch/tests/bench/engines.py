@@ -0,0 +1,160 @@
+# Throughput comparison of the proxy engines.
+# Starts in-process stub backends and one proxy engine per run in a child process,
+# then drives it with keep-alive connections from this process and reports requests/sec.
+# Engines that cannot be imported (e.g. FastAPI not installed) are skipped.
+#
+# Run from the project root:
+#   python -m tests.bench.engines
+
+import asyncio
+import logging
+import multiprocessing
+import socket
+import threading
+import time
+from src.algorithms.round_robin import RoundRobinLoadBalancer
+
+BACKENDS = 3
+CONNECTIONS = 50
+DURATION = 5.0
+ENGINES = ["fastapi", "http", "tcp"]
+
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+    b'content-length: 15\r\n\r\n{"status":"ok"}'
+)
+REQUEST = b"GET /api/data HTTP/1.1\r\nhost: localhost\r\n\r\n"
+
+
+class StubBackend(asyncio.Protocol):
+    """Answers every request on a keep-alive connection with a fixed response."""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.buffer = b""
+
+    def data_received(self, data):
+        self.buffer += data
+        count = self.buffer.count(b"\r\n\r\n")
+        if count:
+            self.buffer = self.buffer[self.buffer.rfind(b"\r\n\r\n") + 4 :]
+            self.transport.write(RESPONSE * count)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_proxy(engine, servers, port):
+    load_balancer = RoundRobinLoadBalancer(servers)
+    if engine == "fastapi":
+        from src.proxy.http_proxy import LoadBalancerProxy
+
+        return LoadBalancerProxy(load_balancer, "127.0.0.1", port)
+    from src.proxy.raw_proxy import RawHttpProxy, TcpPassthroughProxy
+
+    proxy_class = RawHttpProxy if engine == "http" else TcpPassthroughProxy
+    return proxy_class(load_balancer, "127.0.0.1", port)
+
+
+def serve(engine, port, backend_ports):
+    logging.disable(logging.WARNING)
+
+    async def backends():
+        loop = asyncio.get_running_loop()
+        for backend_port in backend_ports:
+            await loop.create_server(StubBackend, "127.0.0.1", backend_port)
+
+    # Backends get their own thread and loop so the proxy's loop measures only the proxy
+    backend_loop = asyncio.new_event_loop()
+    backend_loop.run_until_complete(backends())
+    threading.Thread(target=backend_loop.run_forever, daemon=True).start()
+
+    servers = [f"http://127.0.0.1:{p}" for p in backend_ports]
+    make_proxy(engine, servers, port).run()
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return int(head.split(b" ", 2)[1])
+
+
+async def client(port, deadline, counts):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            writer.write(REQUEST)
+            status = await read_response(reader)
+            counts[status] = counts.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def wait_ready(port, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(REQUEST)
+            await asyncio.wait_for(read_response(reader), 1.0)
+            writer.close()
+            return True
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            await asyncio.sleep(0.1)
+    return False
+
+
+async def drive(port):
+    if not await wait_ready(port):
+        return None
+    counts = {}
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(client(port, start + DURATION, counts) for _ in range(CONNECTIONS))
+    )
+    elapsed = time.perf_counter() - start
+    return sum(counts.values()) / elapsed, counts
+
+
+def bench(engine):
+    try:
+        make_proxy(engine, ["http://127.0.0.1:1"], 0)
+    except ImportError as e:
+        print(f"{engine:>8}: skipped ({e})")
+        return
+    port = free_port()
+    backend_ports = [free_port() for _ in range(BACKENDS)]
+    process = multiprocessing.Process(
+        target=serve, args=(engine, port, backend_ports), daemon=True
+    )
+    process.start()
+    try:
+        result = asyncio.run(drive(port))
+    finally:
+        process.terminate()
+        process.join()
+    if result is None:
+        print(f"{engine:>8}: did not start")
+        return
+    rps, counts = result
+    print(f"{engine:>8}: {rps:10.0f} req/s  statuses {counts}")
+
+
+def main():
+    logging.disable(logging.WARNING)
+    print(f"{CONNECTIONS} keep-alive connections, {DURATION:.0f}s per engine")
+    for engine in ENGINES:
+        bench(engine)
+
+
+if __name__ == "__main__":
+    main()
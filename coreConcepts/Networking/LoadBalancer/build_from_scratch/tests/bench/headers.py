@@ -0,0 +1,120 @@
+# Header handling per proxied request: the previous dict based copies against HeaderPipeline.
+# Each round turns a typical browser request into the headers handed to httpx and a typical
+# backend response into the headers of the Starlette response, the way the proxy does.
+# Reports time and peak memory allocated per request.
+#
+# Run from the project root:
+#   python -m tests.bench.headers
+
+import time
+import tracemalloc
+import httpx
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from src.proxy.headers import HeaderPipeline, REFRAMED_HEADERS
+
+ROUNDS = 100000
+MEMORY_ROUNDS = 2000
+
+SCOPE = {
+    "type": "http",
+    "scheme": "http",
+    "client": ("10.0.0.7", 51234),
+    "headers": [
+        (b"host", b"shop.example.com"),
+        (b"connection", b"keep-alive"),
+        (
+            b"user-agent",
+            b"Mozilla/5.0 (X11; Linux x86_64) Gecko/20100101 Firefox/118.0",
+        ),
+        (b"accept", b"text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"),
+        (b"accept-language", b"en-US,en;q=0.5"),
+        (b"accept-encoding", b"gzip, deflate, br"),
+        (b"referer", b"https://shop.example.com/products"),
+        (b"cookie", b"session=8f14e45fceea167a5a36dedd4bea2543"),
+        (b"cookie", b"cart=3; theme=dark"),
+        (b"upgrade-insecure-requests", b"1"),
+        (b"sec-fetch-dest", b"document"),
+        (b"sec-fetch-mode", b"navigate"),
+        (b"sec-fetch-site", b"same-origin"),
+        (b"x-forwarded-for", b"203.0.113.9"),
+        (b"x-forwarded-proto", b"https"),
+    ],
+}
+UPSTREAM_HEADERS = httpx.Headers(
+    [
+        (b"Date", b"Wed, 18 Oct 2023 10:00:00 GMT"),
+        (b"Server", b"uvicorn"),
+        (b"Content-Type", b"application/json"),
+        (b"Content-Length", b"15"),
+        (b"Connection", b"keep-alive"),
+        (b"Keep-Alive", b"timeout=5"),
+        (b"Cache-Control", b"private, max-age=0"),
+        (b"Set-Cookie", b"session=8f14e45fceea167a5a36dedd4bea2543; HttpOnly"),
+        (b"Set-Cookie", b"cart=3; Path=/"),
+        (b"Vary", b"Accept-Encoding"),
+    ]
+)
+BODY = b'{"status":"ok"}'
+
+
+def dict_headers():
+    """Header handling of the proxy before the header pipeline."""
+    request_headers = Headers(scope=SCOPE)
+    headers = {key: value for (key, value) in request_headers.items() if key != "host"}
+    httpx.Headers(headers)
+    response = Response(content=BODY, status_code=200)
+    for k, v in UPSTREAM_HEADERS.items():
+        response.headers[k] = v
+    return response
+
+
+def pipeline_headers(pipeline=HeaderPipeline()):
+    """Header handling of the proxy with the header pipeline."""
+    request_headers = Headers(scope=SCOPE)
+    request_id = pipeline.request_id(request_headers)
+    httpx.Headers(pipeline.request_headers(SCOPE, request_id))
+    response = Response(content=BODY, status_code=200)
+    response.raw_headers.extend(
+        pipeline.response_headers(UPSTREAM_HEADERS.raw, REFRAMED_HEADERS)
+    )
+    pipeline.set_response_id(response.raw_headers, request_id)
+    return response
+
+
+def timed(function):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        function()
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def allocated(function):
+    """Average peak of memory allocated while handling one request."""
+    function()
+    tracemalloc.start()
+    total = 0
+    for _ in range(MEMORY_ROUNDS):
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        function()
+        total += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return total / MEMORY_ROUNDS
+
+
+def main():
+    print(
+        f"{len(SCOPE['headers'])} request headers, "
+        f"{len(UPSTREAM_HEADERS.raw)} response headers"
+    )
+    for name, function in (("dict", dict_headers), ("pipeline", pipeline_headers)):
+        seconds = timed(function)
+        print(
+            f"{name:>8}: {seconds * 1e6:6.2f} us/request  "
+            f"{allocated(function):8.0f} bytes allocated/request"
+        )
+
+
+if __name__ == "__main__":
+    main()
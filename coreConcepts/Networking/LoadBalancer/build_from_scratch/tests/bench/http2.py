@@ -0,0 +1,148 @@
+# Upstream transport comparison: HTTP/1.1 keep-alive pools against multiplexed h2c.
+# Starts stub backends that speak either protocol on their own thread and loop, then sends
+# CONCURRENCY concurrent requests through UpstreamClient for DURATION seconds per transport.
+# Reports requests/sec and the TCP connections each transport opened to the backends.
+#
+# Run from the project root:
+#   python -m tests.bench.http2
+
+import asyncio
+import logging
+import threading
+import time
+import h2.config
+import h2.connection
+import h2.events
+from src.proxy.upstream import UpstreamClient
+
+BACKENDS = 3
+CONCURRENCY = 300
+DURATION = 5.0
+# Seconds each backend takes to answer, so that requests overlap
+LATENCY = 0.005
+
+BODY = b'{"status":"ok"}'
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+    b"content-length: 15\r\n\r\n" + BODY
+)
+
+
+class Http1Backend(asyncio.Protocol):
+    """Answers every request on a keep-alive connection with a fixed response."""
+
+    connections = 0
+
+    def connection_made(self, transport):
+        Http1Backend.connections += 1
+        self.transport = transport
+        self.buffer = b""
+
+    def data_received(self, data):
+        self.buffer += data
+        count = self.buffer.count(b"\r\n\r\n")
+        if count:
+            self.buffer = self.buffer[self.buffer.rfind(b"\r\n\r\n") + 4 :]
+            asyncio.get_running_loop().call_later(
+                LATENCY, self.transport.write, RESPONSE * count
+            )
+
+
+class H2Backend(asyncio.Protocol):
+    """Answers every stream of a cleartext HTTP/2 connection with a fixed response."""
+
+    connections = 0
+
+    def connection_made(self, transport):
+        H2Backend.connections += 1
+        self.transport = transport
+        self.conn = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False)
+        )
+        self.conn.initiate_connection()
+        self.transport.write(self.conn.data_to_send())
+
+    def data_received(self, data):
+        for event in self.conn.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                asyncio.get_running_loop().call_later(
+                    LATENCY, self.respond, event.stream_id
+                )
+            elif isinstance(event, h2.events.DataReceived):
+                self.conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id
+                )
+        self.transport.write(self.conn.data_to_send())
+
+    def respond(self, stream_id):
+        if self.transport.is_closing():
+            return
+        self.conn.send_headers(
+            stream_id,
+            [
+                (":status", "200"),
+                ("content-type", "application/json"),
+                ("content-length", str(len(BODY))),
+            ],
+        )
+        self.conn.send_data(stream_id, BODY, end_stream=True)
+        self.transport.write(self.conn.data_to_send())
+
+
+def start_backends(protocol):
+    """Serve BACKENDS stub backends on a loop in a daemon thread."""
+    loop = asyncio.new_event_loop()
+
+    async def serve():
+        servers = []
+        for _ in range(BACKENDS):
+            servers.append(await loop.create_server(protocol, "127.0.0.1", 0))
+        return [server.sockets[0].getsockname()[1] for server in servers]
+
+    ports = loop.run_until_complete(serve())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return [f"http://127.0.0.1:{port}" for port in ports]
+
+
+async def drive(upstream, servers):
+    counts = {}
+    deadline = time.perf_counter() + DURATION
+
+    async def worker(index):
+        server = servers[index % len(servers)]
+        while time.perf_counter() < deadline:
+            try:
+                resp = await upstream.request(server, "GET", "/api/data")
+                status = resp.status_code
+            except Exception as e:
+                status = type(e).__name__
+            counts[status] = counts.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    await upstream.close()
+    return sum(counts.values()) / elapsed, counts
+
+
+def bench(name, protocol, upstream):
+    servers = start_backends(protocol)
+    rps, counts = asyncio.run(drive(upstream, servers))
+    print(
+        f"{name:>8}: {rps:10.0f} req/s  "
+        f"{protocol.connections:4d} connections  statuses {counts}"
+    )
+
+
+def main():
+    logging.disable(logging.WARNING)
+    print(
+        f"{CONCURRENCY} concurrent requests to {BACKENDS} backends, "
+        f"{LATENCY * 1000:.0f}ms backend latency, {DURATION:.0f}s per transport"
+    )
+    bench("http/1.1", Http1Backend, UpstreamClient())
+    bench("h2c", H2Backend, UpstreamClient(http2=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Concurrency check and microbenchmark for LeastConnectionsLoadBalancer.
+# Threads and asyncio tasks acquire and release connections concurrently while
+# servers flap in and out of rotation; every count must return to zero.
+#
+# Run from the project root:
+#   python -m tests.bench.least_connection
+
+import asyncio
+import logging
+import random
+import threading
+import timeit
+from src.algorithms.least_connection import LeastConnectionsLoadBalancer
+
+THREADS = 8
+TASKS = 200
+ITERATIONS = 2000
+POOL_SIZES = [3, 100, 10000]
+
+
+def thread_worker(load_balancer, iterations):
+    held = []
+    for _ in range(iterations):
+        server = load_balancer.assign_server()
+        if server:
+            held.append(server)
+        # Hold a few connections at a time so counts differ between servers
+        if len(held) > 3 or (held and random.random() < 0.5):
+            load_balancer.release_connection(held.pop(random.randrange(len(held))))
+    for server in held:
+        load_balancer.release_connection(server)
+
+
+async def task_worker(load_balancer, iterations):
+    for _ in range(iterations):
+        server = load_balancer.assign_server()
+        if server:
+            await asyncio.sleep(0)
+            load_balancer.release_connection(server)
+
+
+def flapper(load_balancer, stop):
+    while not stop.is_set():
+        server = random.choice(load_balancer.servers)
+        load_balancer.mark_unhealthy(server)
+        load_balancer.mark_healthy(server)
+
+
+async def run_tasks(load_balancer):
+    await asyncio.gather(
+        *(task_worker(load_balancer, ITERATIONS // 10) for _ in range(TASKS))
+    )
+
+
+def check_concurrency():
+    servers = [f"http://backend-{i}:5000" for i in range(5)]
+    load_balancer = LeastConnectionsLoadBalancer(servers)
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=thread_worker, args=(load_balancer, ITERATIONS))
+        for _ in range(THREADS)
+    ]
+    threads.append(threading.Thread(target=flapper, args=(load_balancer, stop)))
+    for thread in threads:
+        thread.start()
+    asyncio.run(run_tasks(load_balancer))
+    for thread in threads[:-1]:
+        thread.join()
+    stop.set()
+    threads[-1].join()
+
+    assert all(
+        count == 0 for count in load_balancer.connections.values()
+    ), load_balancer.connections
+    assert sorted(load_balancer.heap) == sorted(load_balancer.healthy_servers)
+    print(f"connections after concurrent run: {load_balancer.connections}")
+
+
+def bench(pool_size, calls=100_000):
+    """Return the mean cost of one acquire/release pair in nanoseconds."""
+    servers = [f"http://backend-{i}:5000" for i in range(pool_size)]
+    load_balancer = LeastConnectionsLoadBalancer(servers)
+
+    def acquire_release():
+        load_balancer.release_connection(load_balancer.assign_server())
+
+    seconds = min(timeit.repeat(acquire_release, number=calls, repeat=3))
+    return seconds / calls * 1e9
+
+
+def main():
+    logging.disable(logging.INFO)
+    check_concurrency()
+    print(f"{'backends':>10} {'ns/acquire+release':>20}")
+    for pool_size in POOL_SIZES:
+        print(f"{pool_size:>10} {bench(pool_size):>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
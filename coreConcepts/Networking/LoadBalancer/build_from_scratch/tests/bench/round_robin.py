@@ -0,0 +1,34 @@
+# Microbenchmark for RoundRobinLoadBalancer.assign_server.
+# Selection cost should stay flat as the number of backends grows.
+#
+# Run from the project root:
+#   python -m tests.bench.round_robin
+
+import logging
+import timeit
+from src.algorithms.round_robin import RoundRobinLoadBalancer
+
+POOL_SIZES = [3, 10, 100, 1000, 10000]
+CALLS = 200_000
+
+
+def bench(pool_size, calls=CALLS):
+    """Return the mean cost of one selection in nanoseconds."""
+    servers = [f"http://backend-{i}:5000" for i in range(pool_size)]
+    load_balancer = RoundRobinLoadBalancer(servers)
+    # Flip one server so the snapshot has been rebuilt at least once
+    load_balancer.mark_unhealthy(servers[0])
+    load_balancer.mark_healthy(servers[0])
+    seconds = min(timeit.repeat(load_balancer.assign_server, number=calls, repeat=3))
+    return seconds / calls * 1e9
+
+
+def main():
+    logging.disable(logging.INFO)
+    print(f"{'backends':>10} {'ns/select':>10}")
+    for pool_size in POOL_SIZES:
+        print(f"{pool_size:>10} {bench(pool_size):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Statistical check and microbenchmark for WeightedRoundRobinLoadBalancer.
+# Over 1M picks the observed share of each server must match its configured
+# weight within 1%, also after a weight is changed at runtime.
+#
+# Run from the project root:
+#   python -m tests.bench.weighted_round_robin
+
+import logging
+import timeit
+from collections import Counter
+from src.algorithms.weighted_round_robin import WeightedRoundRobinLoadBalancer
+
+PICKS = 1_000_000
+TOLERANCE = 0.01
+
+
+def check_shares(load_balancer, picks=PICKS):
+    counts = Counter(load_balancer.assign_server() for _ in range(picks))
+    total_weight = sum(
+        load_balancer.weights[server] for server in load_balancer.healthy_servers
+    )
+    for server in sorted(load_balancer.healthy_servers):
+        expected = load_balancer.weights[server] / total_weight
+        observed = counts[server] / picks
+        print(f"{server:>10} expected {expected:.4f} observed {observed:.4f}")
+        assert abs(observed - expected) <= TOLERANCE, (server, expected, observed)
+
+
+def main():
+    logging.disable(logging.INFO)
+    servers = ["server-1", "server-2", "server-3", "server-4"]
+    weights = {"server-1": 5, "server-2": 3, "server-3": 1, "server-4": 1}
+    load_balancer = WeightedRoundRobinLoadBalancer(servers, weights)
+
+    print("configured weights")
+    check_shares(load_balancer)
+
+    print("after update_weight(server-3, 4)")
+    load_balancer.update_weight("server-3", 4)
+    check_shares(load_balancer)
+
+    print("with server-1 unhealthy")
+    load_balancer.mark_unhealthy("server-1")
+    check_shares(load_balancer)
+
+    seconds = min(timeit.repeat(load_balancer.assign_server, number=100_000, repeat=3))
+    print(f"{seconds / 100_000 * 1e9:.1f} ns/select")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+# Reproducible load-generation harness that runs entirely on localhost.
+# Starts in-process stub backends with configurable latency distributions and one proxy per algorithm,
+# drives each with a closed-loop (max throughput) and/or open-loop (constant rate) workload,
+# and prints throughput, p50/p99/p999 latency and the per-backend distribution as JSON.
+#
+# Run from the project root, e.g.:
+#   python -m tests.load.harness --latency exp:0.005 --latency exp:0.02 --duration 10
+#
+# Latency specs use the service time models of src/simulation/models.py, e.g. exp:0.005 or pareto:0.002:1.5.
+# Open-loop latency is measured from each request's scheduled send time, so a saturated proxy
+# shows up as queueing delay instead of a silently lower request rate.
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import random
+import socket
+import sys
+import time
+from src.algorithms.round_robin import RoundRobinLoadBalancer
+from src.algorithms.weighted_round_robin import WeightedRoundRobinLoadBalancer
+from src.algorithms.least_connection import LeastConnectionsLoadBalancer
+from src.algorithms.least_response_time import LeastResponseTimeLoadBalancer
+from src.algorithms.peak_ewma import PeakEwmaLoadBalancer
+from src.algorithms.consistent_hash import ConsistentHashLoadBalancer
+from src.simulation.models import ServiceTime
+
+ALGORITHMS = {
+    "round_robin": RoundRobinLoadBalancer,
+    # Same example weights as src/main.py
+    "weighted_round_robin": lambda servers: WeightedRoundRobinLoadBalancer(
+        servers, {server: i + 1 for i, server in enumerate(servers)}
+    ),
+    "least_connections": LeastConnectionsLoadBalancer,
+    "least_response_time": LeastResponseTimeLoadBalancer,
+    "peak_ewma": PeakEwmaLoadBalancer,
+    "consistent_hash": ConsistentHashLoadBalancer,
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def content_length(head):
+    for line in head.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            return int(value)
+    return 0
+
+
+async def stub_connection(reader, writer, index, sampler):
+    """Serve requests on one keep-alive connection, in order."""
+    body = b'{"backend": %d}' % index
+    response = (
+        b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+        b"x-backend: %d\r\ncontent-length: %d\r\n\r\n%s" % (index, len(body), body)
+    )
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = content_length(head)
+            if length:
+                await reader.readexactly(length)
+            delay = sampler()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            writer.write(response)
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def run_backends(ports, specs, seed):
+    logging.disable(logging.WARNING)
+
+    async def serve():
+        servers = []
+        for i, port in enumerate(ports):
+            sampler = ServiceTime(specs[i % len(specs)], seed + i).sample
+            servers.append(
+                await asyncio.start_server(
+                    lambda r, w, i=i, s=sampler: stub_connection(r, w, i, s),
+                    "127.0.0.1",
+                    port,
+                )
+            )
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+
+    asyncio.run(serve())
+
+
+def run_proxy(engine, algorithm, port, servers):
+    logging.disable(logging.WARNING)
+    load_balancer = ALGORITHMS[algorithm](servers)
+    if engine == "fastapi":
+        from src.proxy.http_proxy import LoadBalancerProxy
+
+        proxy = LoadBalancerProxy(load_balancer, "127.0.0.1", port)
+    else:
+        from src.proxy.raw_proxy import RawHttpProxy
+
+        proxy = RawHttpProxy(load_balancer, "127.0.0.1", port)
+    proxy.run()
+
+
+class Stats:
+    """Latencies, statuses and backend shares of one workload run."""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.backends = {}
+        self.errors = 0
+
+    def record(self, latency, status, backend):
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if backend is not None:
+            self.backends[backend] = self.backends.get(backend, 0) + 1
+
+    def percentile(self, ordered, q):
+        if not ordered:
+            return None
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def summary(self, elapsed):
+        ordered = sorted(self.latencies)
+        total = len(ordered)
+        return {
+            "requests": total,
+            "errors": self.errors,
+            "throughput": total / elapsed if elapsed else 0,
+            "latency_ms": {
+                name: (
+                    round(self.percentile(ordered, q) * 1000, 3) if ordered else None
+                )
+                for name, q in (
+                    ("p50", 0.5),
+                    ("p99", 0.99),
+                    ("p999", 0.999),
+                    ("max", 1.0),
+                )
+            },
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "backends": {
+                str(k): {"requests": v, "share": round(v / total, 4)}
+                for k, v in sorted(self.backends.items())
+            },
+        }
+
+
+REQUEST = b"GET /api/data HTTP/1.1\r\nhost: localhost\r\nx-user-id: %d\r\n\r\n"
+
+
+async def send(connection, key):
+    """Send one request on a connection and read its response."""
+    reader, writer = connection
+    writer.write(REQUEST % key)
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = content_length(head)
+    if length:
+        await reader.readexactly(length)
+    status = int(head.split(b" ", 2)[1])
+    backend = None
+    for line in head.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"x-backend":
+            backend = int(value)
+    return status, backend
+
+
+async def wait_ready(port, timeout=15.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            connection = await asyncio.open_connection("127.0.0.1", port)
+            status, _ = await asyncio.wait_for(send(connection, 0), 1.0)
+            connection[1].close()
+            if status == 200:
+                return True
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        await asyncio.sleep(0.1)
+    return False
+
+
+async def closed_loop(port, concurrency, duration, keys):
+    """Each of `concurrency` connections sends its next request as soon as the last returns."""
+    stats = Stats()
+    deadline = time.perf_counter() + duration
+
+    async def worker(seed):
+        rng = random.Random(seed)
+        connection = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status, backend = await send(connection, rng.randrange(keys))
+                except (OSError, asyncio.IncompleteReadError):
+                    stats.errors += 1
+                    connection = await asyncio.open_connection("127.0.0.1", port)
+                    continue
+                stats.record(time.perf_counter() - start, status, backend)
+        finally:
+            connection[1].close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return stats.summary(time.perf_counter() - start)
+
+
+async def open_loop(port, rate, duration, max_connections, keys):
+    """Send requests at a constant rate regardless of how fast responses come back."""
+    stats = Stats()
+    idle = []
+    slots = asyncio.Semaphore(max_connections)
+    rng = random.Random(0)
+
+    async def one(scheduled, key):
+        async with slots:
+            connection = idle.pop() if idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.open_connection("127.0.0.1", port)
+                status, backend = await send(connection, key)
+            except (OSError, asyncio.IncompleteReadError):
+                stats.errors += 1
+                if connection is not None:
+                    connection[1].close()
+                return
+            idle.append(connection)
+            stats.record(time.perf_counter() - scheduled, status, backend)
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(int(rate * duration)):
+        scheduled = start + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(scheduled, rng.randrange(keys))))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    for connection in idle:
+        connection[1].close()
+    return stats.summary(elapsed)
+
+
+def run_algorithm(args, algorithm, backend_ports):
+    port = free_port()
+    servers = [f"http://127.0.0.1:{p}" for p in backend_ports]
+    proxy = multiprocessing.Process(
+        target=run_proxy, args=(args.engine, algorithm, port, servers), daemon=True
+    )
+    proxy.start()
+    results = {}
+    try:
+        if not asyncio.run(wait_ready(port)):
+            return {"error": "proxy did not start"}
+        if "closed" in args.workloads:
+            results["closed_loop"] = asyncio.run(
+                closed_loop(port, args.concurrency, args.duration, args.keys)
+            )
+        if "open" in args.workloads:
+            results["open_loop"] = asyncio.run(
+                open_loop(
+                    port, args.rate, args.duration, args.max_connections, args.keys
+                )
+            )
+    finally:
+        proxy.terminate()
+        proxy.join()
+    return results
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Localhost load balancer benchmark")
+    parser.add_argument("--backends", type=int, default=3)
+    parser.add_argument(
+        "--latency",
+        action="append",
+        help="Latency spec per backend, cycled over the backends (default: exp:0.005)",
+    )
+    parser.add_argument(
+        "--algorithms", default=",".join(ALGORITHMS), help="Comma-separated list"
+    )
+    parser.add_argument("--workloads", default="closed,open")
+    parser.add_argument("--engine", choices=["http", "fastapi"], default="http")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=1000.0)
+    parser.add_argument("--max-connections", type=int, default=500)
+    parser.add_argument(
+        "--keys", type=int, default=1000, help="Distinct x-user-id values"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to a file")
+    args = parser.parse_args(argv)
+    args.latency = args.latency or ["exp:0.005"]
+    args.workloads = args.workloads.split(",")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.disable(logging.WARNING)
+    backend_ports = [free_port() for _ in range(args.backends)]
+    backends = multiprocessing.Process(
+        target=run_backends, args=(backend_ports, args.latency, args.seed), daemon=True
+    )
+    backends.start()
+
+    report = {
+        "config": {
+            "engine": args.engine,
+            "backends": [
+                args.latency[i % len(args.latency)] for i in range(args.backends)
+            ],
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+    try:
+        for algorithm in args.algorithms.split(","):
+            report["results"][algorithm] = run_algorithm(args, algorithm, backend_ports)
+            print(f"finished {algorithm}", file=sys.stderr)
+    finally:
+        backends.terminate()
+        backends.join()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,4 +5,4 @@ class BasicScenario:
     def run(self):
         self.client.get("/")
         self.client.get("/health")
-        self.client.get("/stats")
\ No newline at end of file
+        self.client.get("/lb/stats")
\ No newline at end of file
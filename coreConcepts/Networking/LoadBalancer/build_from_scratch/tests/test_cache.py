@@ -0,0 +1,57 @@
+# Run from the project root:
+#   python -m pytest tests/test_cache.py
+
+import asyncio
+import unittest
+from src.proxy.cache import ResponseCache, MISS
+
+
+class PrivateBackend:
+    """Answers with a private response that sets the cookie it was sent."""
+
+    def __init__(self):
+        self.fetches = 0
+        self.release = asyncio.Event()
+
+    def fetcher(self, cookie):
+        async def fetch(conditional):
+            self.fetches += 1
+            # Hold the first response so that the other request arrives during the miss
+            await self.release.wait()
+            return (
+                200,
+                [("cache-control", "private, max-age=60"), ("set-cookie", cookie)],
+                f"account of {cookie}".encode(),
+            )
+
+        return fetch
+
+
+class ConcurrentMissTest(unittest.IsolatedAsyncioTestCase):
+    async def test_private_response_is_not_shared_with_waiters(self):
+        cache = ResponseCache(default_ttl=60)
+        backend = PrivateBackend()
+        requests = [
+            asyncio.ensure_future(
+                cache.fetch(
+                    "example.com/account",
+                    {"cookie": cookie},
+                    backend.fetcher(cookie),
+                )
+            )
+            for cookie in ("session=alice", "session=bob")
+        ]
+        await asyncio.sleep(0)
+        backend.release.set()
+        (alice, alice_state), (bob, bob_state) = await asyncio.gather(*requests)
+
+        self.assertEqual(backend.fetches, 2)
+        self.assertEqual(alice.body, b"account of session=alice")
+        self.assertEqual(bob.body, b"account of session=bob")
+        self.assertIn(("set-cookie", "session=bob"), bob.headers)
+        self.assertEqual((alice_state, bob_state), (MISS, MISS))
+        self.assertEqual(cache.get_metrics()["coalesced"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()